@@ -1,5 +1,6 @@
 import streamlit as st
-from data_manager import add_subject, get_all_subjects, delete_subject
+import json
+from data_manager import add_subject, add_subjects_bulk, get_all_subjects, delete_subject
 from datetime import datetime
 
 def render_admin_page(user_id):
@@ -30,6 +31,29 @@ def render_admin_page(user_id):
                 st.error(f"Failed to add subject: {result['error']}")
         elif submitted:
             st.warning("Please enter a Subject Name.")
+
+    with st.expander("📂 Import Subjects from JSON"):
+        st.write("Upload a file in the same format as `data/syllabus.json`: a list of `{\"name\": ..., \"topics\": [...]}` objects.")
+        syllabus_file = st.file_uploader("Syllabus JSON", type=["json"], key="admin_syllabus_import")
+        if syllabus_file and st.button("Import Subjects", key="admin_import_subjects_button"):
+            try:
+                imported = json.load(syllabus_file)
+                subjects_list = [
+                    {"name": str(entry["name"]), "topics": [str(t) for t in entry.get("topics", [])]}
+                    for entry in imported if isinstance(entry, dict) and entry.get("name")
+                ]
+            except Exception as e:
+                st.error(f"Could not read syllabus file: {e}")
+                subjects_list = []
+            if subjects_list:
+                result = add_subjects_bulk(user_id, subjects_list) # All-or-nothing import
+                if result["success"]:
+                    st.success(f"Imported {len(result['ids'])} subjects!")
+                    st.rerun()
+                else:
+                    st.error(f"Failed to import subjects: {result['error']}")
+            else:
+                st.warning("No subjects found in the uploaded file.")
     
     st.markdown("---")
     st.header("Your Current Subjects")
@@ -4,7 +4,8 @@ from agents.summarizer_agent import SummarizerAgent
 from agents.flashcard_agent import FlashcardAgent
 from agents.planner_agent import PlannerAgent
 from agents.tracker_agent import TrackerAgent
-from data_manager import get_all_subjects, get_tasks
+from data_manager import get_all_subjects, get_tasks, add_tasks_bulk, record_activity, save_artifact
+from document_ingest import queue_document, get_user_documents, remove_document
 from datetime import datetime
 from collections import defaultdict
 
@@ -22,6 +23,7 @@ def render_agents_tools_page(user_id):
         "🧠 Flashcard Generator": "flashcard",
         "📅 Study Planner": "planner",
         "📊 Progress Tracker": "tracker",
+        "📚 My Documents": "library",
     }
     
     # Initialize session state for selected tool if not present
@@ -45,13 +47,15 @@ def render_agents_tools_page(user_id):
     if st.session_state.selected_ai_tool == "quiz":
         render_quiz_tool(user_id)
     elif st.session_state.selected_ai_tool == "summarizer":
-        render_summarizer_tool()
+        render_summarizer_tool(user_id)
     elif st.session_state.selected_ai_tool == "flashcard":
-        render_flashcard_tool()
+        render_flashcard_tool(user_id)
     elif st.session_state.selected_ai_tool == "planner":
         render_planner_tool(user_id) # Planner needs user_id for context
     elif st.session_state.selected_ai_tool == "tracker":
         render_tracker_tool(user_id)
+    elif st.session_state.selected_ai_tool == "library":
+        render_library_tool(user_id)
 
 # --- Individual Tool Rendering Functions (Adapted and cleaned for unified page) ---
 
@@ -61,7 +65,7 @@ def render_quiz_tool(user_id):
     st.markdown("#### ❓ Quiz Master") # Smaller header for section within tool page
     st.write("Generate custom quizzes on any topic from your syllabus or general knowledge! You'll get explanations for every answer. ✨")
 
-    quiz_agent = QuizAgent()
+    quiz_agent = QuizAgent(user_id)
 
     # Initialize quiz_questions and current_score in session state (specific to quiz tool)
     if 'quiz_questions_tool' not in st.session_state: # Changed key to avoid conflicts
@@ -187,7 +191,7 @@ def render_quiz_tool(user_id):
                 st.session_state.current_score_data_tool = quiz_agent.calculate_score(
                     st.session_state.quiz_questions_tool, user_answers
                 )
-                quiz_agent.save_quiz_performance( # This saves to general quiz_history
+                quiz_agent.save_quiz_performance( # Persists the attempt in SQLite
                     st.session_state.quiz_topic_tool, 
                     st.session_state.current_score_data_tool
                 )
@@ -220,7 +224,7 @@ def render_quiz_tool(user_id):
     # --- Quiz History Section ---
     st.markdown("---")
     st.subheader("Quiz History")
-    quiz_history = quiz_agent.get_quiz_history() # Retrieves from st.session_state.quiz_history
+    quiz_history = quiz_agent.get_quiz_history() # Retrieves this user's attempts from SQLite
 
     if quiz_history:
         for i, record in enumerate(quiz_history):
@@ -232,7 +236,7 @@ def render_quiz_tool(user_id):
     else:
         st.info("You haven't taken any quizzes yet. Generate one above to get started! 🚀")
 
-def render_summarizer_tool():
+def render_summarizer_tool(user_id):
     st.markdown("#### 📝 Document Summarizer") # Smaller header
     st.write("Upload a document (PDF or DOCX) to get a quick summary of its key points!")
 
@@ -241,6 +245,7 @@ def render_summarizer_tool():
     uploaded_file = st.file_uploader("Upload Document", type=["pdf", "docx"], key="summarizer_uploader")
 
     if uploaded_file:
+        add_to_library = st.checkbox("Also add it to My Documents so I can chat about it", key="summarizer_add_to_library")
         summary_length = st.selectbox(
             "Summary Length:",
             ["Brief (3-5 key points)", "Detailed (7-10 key points)", "Comprehensive (10+ key points)"],
@@ -257,6 +262,9 @@ def render_summarizer_tool():
                 try:
                     summary_text = summarizer_agent.summarize_document(uploaded_file, summary_length, focus_area)
                     st.markdown(summary_text)
+                    save_artifact(user_id, "summary", summary_text, title=f"Summary: {uploaded_file.name}") # Searchable later
+                    if add_to_library:
+                        add_upload_to_library(user_id, uploaded_file)
                     st.download_button(
                         label="Download Summary",
                         data=summary_text,
@@ -267,7 +275,7 @@ def render_summarizer_tool():
                 except Exception as e:
                     st.error(f"Error generating summary: {e}")
 
-def render_flashcard_tool():
+def render_flashcard_tool(user_id):
     st.markdown("#### 🧠 Flashcard Generator") # Smaller header
     st.write("Upload a document (PDF or DOCX) or enter text to instantly create flashcards for effective memorization!")
 
@@ -275,6 +283,8 @@ def render_flashcard_tool():
 
     # Option 1: Document upload
     uploaded_file = st.file_uploader("Upload Document for Flashcards", type=["pdf", "docx"], key="flashcard_uploader")
+    add_to_library = uploaded_file is not None and st.checkbox("Also add it to My Documents so I can chat about it",
+                                                               key="flashcard_add_to_library")
 
     # Option 2: Manual entry
     manual_text = st.text_area("Or enter text/content for flashcards (e.g., notes, Q&A, etc.):", key="flashcard_manual_text")
@@ -293,26 +303,44 @@ def render_flashcard_tool():
                     flashcards = flashcard_agent.generate_flashcards_from_text(manual_text, num_cards, difficulty, shuffle)
                 else:
                     st.warning("Please upload a document or enter text to generate flashcards.")
+                if add_to_library:
+                    add_upload_to_library(user_id, uploaded_file)
                 if flashcards:
-                    st.session_state.current_flashcards_tool = flashcards # Store for display (unique key)
-                    st.subheader("Your New Flashcards!")
-                    for i, card in enumerate(st.session_state.current_flashcards_tool):
-                        with st.expander(f"Card {i+1}: {card['term'][:50]}..."):
-                            st.markdown(f"**Term:** {card['term']}")
-                            st.markdown(f"**Definition:** {card['definition']}")
-                            st.markdown("---")
-                    st.download_button(
-                        label="Download Flashcards (Printable)",
-                        data=flashcard_agent.format_flashcards_for_print(flashcards, uploaded_file.name if uploaded_file else "manual_text"),
-                        file_name=f"flashcards_{uploaded_file.name.split('.')[0] if uploaded_file else 'manual_text'}.txt",
-                        mime="text/plain",
-                        key="download_flashcards_button"
-                    )
+                    # Store for display (unique keys); the set stays on screen until the next one is generated
+                    st.session_state.current_flashcards_tool = flashcards
+                    st.session_state.flashcards_tool_source = uploaded_file.name if uploaded_file else "manual_text"
+                    st.session_state.flashcards_tool_reviewed = False
+                    save_artifact(user_id, "flashcards", "\n".join(f"{card['term']}: {card['definition']}" for card in flashcards),
+                                  title=f"Flashcards: {uploaded_file.name if uploaded_file else 'manual text'}")
                 else:
                     st.info("No flashcards generated. Try adjusting parameters or using a different input.")
             except Exception as e:
                 st.error(f"Error generating flashcards: {e}")
 
+    flashcards = st.session_state.get("current_flashcards_tool")
+    if flashcards:
+        source = st.session_state.get("flashcards_tool_source", "manual_text")
+        st.subheader("Your New Flashcards!")
+        for i, card in enumerate(flashcards):
+            with st.expander(f"Card {i+1}: {card['term'][:50]}..."):
+                st.markdown(f"**Term:** {card['term']}")
+                st.markdown(f"**Definition:** {card['definition']}")
+                st.markdown("---")
+        st.download_button(
+            label="Download Flashcards (Printable)",
+            data=flashcard_agent.format_flashcards_for_print(flashcards, source),
+            file_name=f"flashcards_{source.split('.')[0]}.txt",
+            mime="text/plain",
+            key="download_flashcards_button"
+        )
+        if st.session_state.get("flashcards_tool_reviewed"):
+            st.caption("✅ Reviewed: counted towards your streak.")
+        elif st.button("✅ I've Reviewed These Cards", key="flashcards_reviewed_button"):
+            # Reviewing, not generating, is study activity: counts towards streak/heatmap once per set
+            record_activity(user_id, "flashcards_reviewed", value=len(flashcards))
+            st.session_state.flashcards_tool_reviewed = True
+            st.rerun()
+
 def render_planner_tool(user_id):
     st.markdown("#### 📅 Study Planner") # Smaller header
     st.write("Get a personalized study plan generated just for you!")
@@ -363,6 +391,17 @@ def render_planner_tool(user_id):
             key="download_plan_button"
         )
 
+        if st.button("📥 Add Plan Tasks to My Task List", key="import_plan_tasks_button"):
+            plan_tasks = planner_agent.extract_plan_tasks(st.session_state.current_study_plan)
+            if not plan_tasks:
+                st.warning("No day-by-day tasks could be found in this plan.")
+            else:
+                result = add_tasks_bulk(user_id, plan_tasks) # One transaction for the whole plan
+                if result["success"]:
+                    st.success(f"Added {result['count']} tasks from your study plan to the Dashboard!")
+                else:
+                    st.error(f"Failed to import plan tasks: {result['error']}")
+
     # Optional: Display current study plan if one exists in session state
     if 'current_study_plan' in st.session_state and st.session_state.current_study_plan:
         st.markdown("---")
@@ -374,5 +413,56 @@ def render_tracker_tool(user_id):
     st.markdown("#### 📊 Progress Tracker") # Smaller header
     st.write("Monitor your overall academic progress, task completion, and quiz performance.")
 
-    tracker_agent = TrackerAgent()
+    tracker_agent = TrackerAgent(user_id)
     tracker_agent.display_tracker_interface()
+
+
+def add_upload_to_library(user_id, uploaded_file):
+    """Queues an uploaded file for background ingestion into the user's searchable documents."""
+    result = queue_document(user_id, uploaded_file.name, uploaded_file.getvalue())
+    if not result["success"]:
+        st.error(f"Could not add '{uploaded_file.name}' to My Documents: {result['error']}")
+    elif result["duplicate"]:
+        st.info(f"'{uploaded_file.name}' is already in My Documents.")
+    else:
+        st.success(f"'{uploaded_file.name}' is being added to My Documents. Track its progress there.")
+
+
+DOCUMENT_STATUS_LABELS = {
+    "queued": "⏳ Waiting", "extracting": "📄 Extracting text", "embedding": "🧮 Embedding",
+    "indexing": "🗂️ Indexing", "ready": "✅ Ready for chat", "failed": "❌ Failed",
+}
+
+def render_library_tool(user_id):
+    st.markdown("#### 📚 My Documents") # Smaller header
+    st.write("Upload textbooks and notes (PDF or DOCX). They are processed in the background, and the AI Chatbot can then answer questions from them.")
+
+    uploaded_files = st.file_uploader("Upload Documents", type=["pdf", "docx"], accept_multiple_files=True, key="library_uploader")
+    if uploaded_files and st.button("Add to My Documents", key="library_add_button"):
+        for uploaded_file in uploaded_files:
+            add_upload_to_library(user_id, uploaded_file)
+
+    documents = get_user_documents(user_id)
+    if not documents:
+        st.info("No documents yet.")
+        return
+    if any(document["status"] not in ("ready", "failed") for document in documents):
+        st.button("🔄 Refresh progress", key="library_refresh_button") # Any click reruns the page with fresh progress
+    for document in documents:
+        col1, col2 = st.columns([5, 1])
+        with col1:
+            status = DOCUMENT_STATUS_LABELS.get(document["status"], document["status"])
+            if document["status"] == "embedding":
+                status += f" ({document['chunks_done']}/{document['chunks_total']} chunks)"
+            st.markdown(f"**{document['filename']}** · {status}")
+            if document["status"] == "failed":
+                st.caption(document["error"] or "Unknown error")
+            elif document["status"] != "ready":
+                st.progress(document["progress"])
+        with col2:
+            if st.button("🗑️ Remove", key=f"library_remove_{document['id']}"):
+                result = remove_document(user_id, document["id"])
+                if result["success"]:
+                    st.rerun()
+                else:
+                    st.error(f"Could not remove document: {result['error']}")
@@ -8,7 +8,7 @@ if os.path.abspath(os.path.join(os.path.dirname(__file__), '..')) not in sys.pat
 	sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from chatbot_agent import get_chatbot_response # LLM agent
-from data_manager import get_tasks, get_all_subjects # For passing context to LLM
+from data_manager import get_tasks, get_all_subjects, save_artifact # For passing context to LLM
 
 # Initialize Streamlit session state for messages if not already present
 if 'chatbot_messages' not in st.session_state:
@@ -39,6 +39,7 @@ def render_chatbot_page(user_id):
 	if user_query:
 		# Add user message to history
 		st.session_state.chatbot_messages.append({"role": "user", "content": user_query})
+		save_artifact(user_id, "chat_message", user_query, title="You") # Persisted so past chats are searchable
 
 		# Display user message immediately
 		with st.chat_message("user"):
@@ -53,3 +54,4 @@ def render_chatbot_page(user_id):
         
 		# Add assistant message to history
 		st.session_state.chatbot_messages.append({"role": "assistant", "content": full_response})
+		save_artifact(user_id, "chat_message", full_response, title="EduMate")
@@ -1,5 +1,6 @@
 import streamlit as st
-from data_manager import signup_user_local, login_user_local # Import new local auth functions
+from datetime import datetime
+from data_manager import signup_user_local, login_user_local, create_resume_nonce # Import new local auth functions
 
 def render_login_page():
     """
@@ -106,6 +107,13 @@ def render_login_page():
                     if user and user.get("success"):
                         st.session_state.is_logged_in = True
                         st.session_state.user_id = username
+                        # A one-time resume nonce in the URL (never the session token itself) lets a refresh
+                        # resume without re-checking the password
+                        resume = create_resume_nonce(user["session_token"])
+                        if resume["success"]:
+                            st.session_state.session_token_hash = resume["token_hash"]
+                            st.session_state.resume_nonce_issued_at = datetime.now()
+                            st.query_params["resume"] = resume["nonce"]
                         st.success(f"Welcome back, {username}!")
                         st.rerun()
                     else:
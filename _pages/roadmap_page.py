@@ -1,6 +1,5 @@
 import streamlit as st
-from data_manager import get_all_subjects, get_tasks
-from collections import defaultdict
+from data_manager import get_topic_progress
 
 def render_roadmap_page(user_id):
     """
@@ -10,36 +9,20 @@ def render_roadmap_page(user_id):
     # REMOVED: st.subheader(f"Your personalized learning journey for User: `{user_id}`")
     st.write("Track your subjects and topics here. Progress is automatically calculated based on your completed tasks that are linked to specific topics!")
 
-    # Fetch subjects and tasks for the current user
-    user_subjects = get_all_subjects(user_id)
-    user_tasks = get_tasks(user_id)
+    # Fetch subjects with per-topic completion (computed by an indexed SQL join on topic_id)
+    user_subjects = get_topic_progress(user_id, include_archived=True) # Archived completions still count
 
     if not user_subjects:
         st.info("You haven't added any subjects to your roadmap yet. Visit the Admin Dashboard to add some!")
         return
 
-    # Organize tasks by subject and topic for easy lookup
-    topic_completion_status = defaultdict(lambda: defaultdict(bool)) # {subject_name: {topic_name: is_completed}}
-
-    for task in user_tasks:
-        if task.get('completed') and task.get('subject_name') and task.get('topic_name'):
-            subject_name = task['subject_name']
-            topic_name = task['topic_name']
-            topic_completion_status[subject_name][topic_name] = True
-
     # Render the roadmap
     for subject in user_subjects:
         subject_name = subject['name']
-        topics = subject.get('topics', [])
+        topics = subject['topics']
 
-        completed_topics_count = 0
-        
-        # Determine how many topics within this subject have been "completed" via tasks
-        for topic in topics:
-            if topic_completion_status[subject_name][topic]:
-                completed_topics_count += 1
-        
-        total_topics = len(topics)
+        completed_topics_count = subject['completed_count']
+        total_topics = subject['total_count']
         
         if total_topics > 0:
             progress_percentage = (completed_topics_count / total_topics) * 100
@@ -57,6 +40,5 @@ def render_roadmap_page(user_id):
         with st.expander(f"View Topics for {subject_name}"):
             if topics:
                 for topic in topics:
-                    topic_status = topic_completion_status[subject_name][topic]
-                    status_icon = "✅" if topic_status else "❌"
-                    st.write(f"{status_icon} {topic}")
+                    status_icon = "✅" if topic['completed'] else "❌"
+                    st.write(f"{status_icon} {topic['name']}")
@@ -5,6 +5,7 @@ from datetime import datetime, timedelta
 import ollama # Changed from google.generativeai
 import requests # Needed for Ollama error handling
 import calendar
+import re
 
 class PlannerAgent:
     def __init__(self):
@@ -118,6 +119,30 @@ class PlannerAgent:
         """
         return formatted.strip()
     
+    def extract_plan_tasks(self, study_plan: str, start_date=None) -> list:
+        """
+        Turn the plan's "Day N" sections into task dicts for data_manager.add_tasks_bulk.
+        Day N is due N-1 days after start_date (default: today).
+        """
+        start_date = start_date or datetime.now().date()
+        tasks = []
+        day_number = None
+        
+        for line in study_plan.split('\n'):
+            line = line.strip()
+            day_match = re.search(r'Day\s+(\d+)', line)
+            if day_match and not line.startswith(('-', '•', '*')):
+                day_number = int(day_match.group(1))
+            elif day_number and line.startswith(('-', '•', '*')):
+                task_text = line.lstrip('-•*').strip()
+                if task_text:
+                    tasks.append({
+                        "task": task_text,
+                        "due_date": (start_date + timedelta(days=day_number - 1)).strftime("%Y-%m-%d")
+                    })
+        
+        return tasks
+    
     def get_calendar_view(self, duration: str) -> dict:
         """Generate calendar structure for the study plan duration. (This is a placeholder/example)"""
         # This function might not be directly used for generating the *plan content* itself,
@@ -6,12 +6,14 @@ import ollama # Changed from google.generativeai
 import requests # Needed for Ollama error handling
 import json
 import random
+from data_manager import save_quiz_attempt, get_quiz_history
 
 class QuizAgent:
-    def __init__(self):
+    def __init__(self, user_id=None):
         """Initialize the Quiz Agent with Ollama."""
         # No API key check here as it uses local Ollama server
         self.model_name = "phi3" # Specify Ollama model name
+        self.user_id = user_id or st.session_state.get('user_id')
     
     def create_quiz_prompt(self, topic: str, num_questions: int, difficulty: str, question_types: list) -> str:
         """Create a detailed prompt for generating quiz questions."""
@@ -199,24 +201,14 @@ class QuizAgent:
         }
     
     def save_quiz_performance(self, topic: str, score_data: dict):
-        """Save quiz performance to session state for history tracking."""
-        if 'quiz_history' not in st.session_state:
-            st.session_state.quiz_history = []
-        
-        performance_record = {
-            'topic': topic,
-            'date': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            'score_percentage': score_data['score_percentage'],
-            'grade': score_data['grade'],
-            'total_questions': score_data['total_questions'],
-            'correct_answers': score_data['correct_answers']
-        }
-        
-        st.session_state.quiz_history.append(performance_record)
+        """Save the quiz attempt and per-question results to SQLite for history tracking."""
+        result = save_quiz_attempt(self.user_id, topic, score_data)
+        if not result["success"]:
+            st.warning(f"Your quiz result could not be saved: {result['error']}")
     
     def get_quiz_history(self) -> list:
-        """Retrieve quiz performance history."""
-        return st.session_state.get('quiz_history', [])
+        """Retrieve quiz performance history (oldest first) from SQLite."""
+        return get_quiz_history(self.user_id)
     
     def format_quiz_results(self, topic: str, score_data: dict) -> str:
         """Format quiz results for display or download."""
@@ -8,10 +8,14 @@ import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import pandas as pd
+import hashlib
+from data_manager import (get_quiz_history, get_quiz_stats, get_plan_task_completions, set_plan_task_completion,
+                          get_study_streak, get_activity_heatmap, get_weekly_activity)
 
 class TrackerAgent:
-    def __init__(self):
+    def __init__(self, user_id=None):
         """Initialize the Progress Tracker Agent."""
+        self.user_id = user_id or st.session_state.get('user_id')
         # Initialize session state for tracking data
         if 'study_progress' not in st.session_state:
             st.session_state.study_progress = {
@@ -21,12 +25,17 @@ class TrackerAgent:
                 'achievements': []
             }
         
-        if 'task_completions' not in st.session_state:
-            st.session_state.task_completions = {}
+        # Plan task completions live in SQLite: {task_key: completed_at}, loaded once per render
+        self.task_completions = {}
+    
+    def plan_key(self, study_plan: str) -> str:
+        """Short content hash that namespaces task ids, so 'Day 1_1' of two different plans never collide."""
+        return hashlib.sha1(study_plan.encode('utf-8')).hexdigest()[:12]
     
     def parse_study_plan_tasks(self, study_plan: str, plan_duration: str) -> dict:
         """Extract daily tasks from study plan text."""
         tasks_by_day = {}
+        plan_key = self.plan_key(study_plan)
         
         # Simple parsing logic - look for day patterns
         lines = study_plan.split('\n')
@@ -50,7 +59,7 @@ class TrackerAgent:
                 task_text = line.lstrip('-•*').strip()
                 if task_text:
                     current_tasks.append({
-                        'id': f"{current_day}_{len(current_tasks) + 1}",
+                        'id': f"{plan_key}:{current_day}_{len(current_tasks) + 1}",
                         'description': task_text,
                         'completed': False,
                         'date_completed': None
@@ -82,7 +91,7 @@ class TrackerAgent:
                     task_id = task['id']
                     
                     # Check if task is already completed
-                    is_completed = st.session_state.task_completions.get(task_id, False)
+                    is_completed = task_id in self.task_completions
                     
                     # Display checkbox for task completion
                     completed = st.checkbox(
@@ -93,12 +102,14 @@ class TrackerAgent:
                     
                     # Update completion status
                     if completed != is_completed:
-                        st.session_state.task_completions[task_id] = completed
+                        set_plan_task_completion(self.user_id, task_id, completed)
                         if completed:
                             # Mark completion date
                             task['date_completed'] = datetime.now().isoformat()
+                            self.task_completions[task_id] = task['date_completed']
                         else:
                             task['date_completed'] = None
+                            self.task_completions.pop(task_id, None)
                     
                     day_completion.append(completed)
                 
@@ -119,7 +130,7 @@ class TrackerAgent:
         for day_name, tasks in tasks_by_day.items():
             for task in tasks:
                 total_tasks += 1
-                if st.session_state.task_completions.get(task['id'], False):
+                if task['id'] in self.task_completions:
                     completed_tasks += 1
         
         progress_percentage = (completed_tasks / total_tasks * 100) if total_tasks > 0 else 0
@@ -173,8 +184,8 @@ class TrackerAgent:
             st.markdown(f"**{progress_stats['progress_percentage']:.1f}%**")
     
     def get_quiz_performance_data(self) -> list:
-        """Get quiz performance data from session state."""
-        return st.session_state.get('quiz_history', [])
+        """Get quiz performance data (oldest first) from SQLite."""
+        return get_quiz_history(self.user_id)
     
     def display_quiz_performance_chart(self, quiz_data: list):
         """Display quiz performance trends."""
@@ -212,44 +223,51 @@ class TrackerAgent:
         
         st.plotly_chart(fig, use_container_width=True)
         
-        # Performance summary
+        # Performance summary (aggregated in SQL)
         if len(quiz_data) > 1:
-            avg_score = sum(q['score_percentage'] for q in quiz_data) / len(quiz_data)
-            latest_score = quiz_data[-1]['score_percentage']
-            best_score = max(q['score_percentage'] for q in quiz_data)
+            quiz_stats = get_quiz_stats(self.user_id)
             
             col1, col2, col3 = st.columns(3)
             with col1:
-                st.metric("Average Score", f"{avg_score:.1f}%")
+                st.metric("Average Score", f"{quiz_stats['average_score']:.1f}%")
             with col2:
-                st.metric("Latest Score", f"{latest_score:.1f}%")
+                st.metric("Latest Score", f"{quiz_stats['latest_score']:.1f}%")
             with col3:
-                st.metric("Best Score", f"{best_score:.1f}%")
+                st.metric("Best Score", f"{quiz_stats['best_score']:.1f}%")
     
-    def calculate_study_streak(self, tasks_by_day: dict) -> int:
-        """Calculate current study streak based on daily task completions."""
-        # Get completion dates
-        completion_dates = []
-        
-        for day_name, tasks in tasks_by_day.items():
-            day_completed = False
-            for task in tasks:
-                if st.session_state.task_completions.get(task['id'], False):
-                    day_completed = True
-                    break
-            
-            if day_completed:
-                # For simplicity, use current date - in real app, you'd track actual completion dates
-                completion_dates.append(datetime.now().date())
-        
-        # Calculate streak (simplified version)
-        if not completion_dates:
-            return 0
+    def calculate_study_streak(self) -> int:
+        """Current study streak: consecutive days with any journaled activity (tasks, quizzes, flashcards)."""
+        return get_study_streak(self.user_id)
+    
+    def display_activity_heatmap(self, days: int = 84):
+        """Display a calendar heatmap of daily activity from the journal's daily rollups."""
+        activity = get_activity_heatmap(self.user_id, days=days)
+        if not activity:
+            st.info("No activity recorded yet. Complete tasks or take quizzes to fill your calendar!")
+            return
         
-        # For demo purposes, return a simple count
-        return len(set(completion_dates))
+        # Fill in the days without activity so the grid has no holes
+        events_by_day = {row['day']: row['events'] for row in activity}
+        today = datetime.now().date()
+        start = today - timedelta(days=days - 1)
+        start -= timedelta(days=start.weekday())  # Align the first column to a Monday
+        weeks = (today - start).days // 7 + 1
+        grid = [[None] * weeks for _ in range(7)]
+        for offset in range((today - start).days + 1):
+            day = start + timedelta(days=offset)
+            grid[day.weekday()][offset // 7] = events_by_day.get(day.isoformat(), 0)
+        
+        fig = go.Figure(data=go.Heatmap(
+            z=grid,
+            x=[(start + timedelta(weeks=w)).strftime('%b %d') for w in range(weeks)],
+            y=['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun'],
+            colorscale='Greens',
+            hovertemplate='Week of %{x}, %{y}: %{z} activities<extra></extra>'
+        ))
+        fig.update_layout(title="Study Activity", height=260, yaxis_autorange='reversed')
+        st.plotly_chart(fig, use_container_width=True)
     
-    def display_achievements(self, progress_stats: dict, quiz_data: list, study_streak: int):
+    def display_achievements(self, progress_stats: dict, quiz_stats: dict, study_streak: int):
         """Display achievements and badges."""
         st.markdown("### 🏆 Achievements")
         
@@ -266,16 +284,16 @@ class TrackerAgent:
             achievements.append({"name": "Getting Started", "icon": "🌟", "description": "Completed 25% of study plan"})
         
         # Quiz achievements
-        if quiz_data:
-            avg_score = sum(q['score_percentage'] for q in quiz_data) / len(quiz_data)
+        if quiz_stats['count']:
+            avg_score = quiz_stats['average_score']
             if avg_score >= 90:
                 achievements.append({"name": "Quiz Master", "icon": "🧠", "description": "Average quiz score above 90%"})
             elif avg_score >= 80:
                 achievements.append({"name": "Smart Learner", "icon": "🎓", "description": "Average quiz score above 80%"})
             
-            if len(quiz_data) >= 10:
+            if quiz_stats['count'] >= 10:
                 achievements.append({"name": "Quiz Enthusiast", "icon": "📚", "description": "Completed 10+ quizzes"})
-            elif len(quiz_data) >= 5:
+            elif quiz_stats['count'] >= 5:
                 achievements.append({"name": "Quiz Explorer", "icon": "🔍", "description": "Completed 5+ quizzes"})
         
         # Study streak achievements
@@ -299,37 +317,37 @@ class TrackerAgent:
         else:
             st.info("Complete tasks and take quizzes to earn achievements! 🏆")
     
-    def display_weekly_summary(self, progress_stats: dict, quiz_data: list):
+    def display_weekly_summary(self, progress_stats: dict):
         """Display weekly progress summary."""
         st.markdown("### 📅 Weekly Summary")
         
-        # Get recent quiz data (last 7 days)
-        week_ago = datetime.now() - timedelta(days=7)
-        recent_quizzes = [
-            q for q in quiz_data 
-            if datetime.strptime(q['date'], "%Y-%m-%d %H:%M:%S") > week_ago
-        ]
+        # Last 7 days come straight from the daily activity rollups; the best score (not kept in the
+        # rollups) is aggregated in SQL over the same days
+        weekly_activity = get_weekly_activity(self.user_id)
+        week_start = datetime.combine(datetime.now().date() - timedelta(days=6), datetime.min.time())
+        recent_quiz_stats = get_quiz_stats(self.user_id, since=week_start)
         
         col1, col2 = st.columns(2)
         
         with col1:
             st.markdown("#### 📋 Task Progress")
-            st.write(f"• Tasks completed: {progress_stats['completed_tasks']}")
+            st.write(f"• Tasks completed this week: {weekly_activity['tasks_completed']}")
+            st.write(f"• Plan tasks completed: {progress_stats['completed_tasks']}")
             st.write(f"• Overall progress: {progress_stats['progress_percentage']:.1f}%")
             st.write(f"• Tasks remaining: {progress_stats['remaining_tasks']}")
         
         with col2:
             st.markdown("#### 🎯 Quiz Activity")
-            if recent_quizzes:
-                avg_recent_score = sum(q['score_percentage'] for q in recent_quizzes) / len(recent_quizzes)
-                st.write(f"• Quizzes taken: {len(recent_quizzes)}")
-                st.write(f"• Average score: {avg_recent_score:.1f}%")
-                st.write(f"• Best score: {max(q['score_percentage'] for q in recent_quizzes):.1f}%")
+            if weekly_activity['quizzes_taken']:
+                st.write(f"• Quizzes taken: {weekly_activity['quizzes_taken']}")
+                st.write(f"• Average score: {weekly_activity['average_quiz_score']:.1f}%")
+                st.write(f"• Best score: {recent_quiz_stats['best_score']:.1f}%")
             else:
                 st.write("• No quizzes taken this week")
                 st.write("• Take a quiz to track performance!")
+            st.write(f"• Flashcards reviewed: {weekly_activity['flashcards_reviewed']}")
     
-    def generate_progress_report(self, progress_stats: dict, quiz_data: list, study_streak: int) -> str:
+    def generate_progress_report(self, progress_stats: dict, quiz_stats: dict, quiz_data: list, study_streak: int) -> str:
         """Generate a comprehensive progress report for download."""
         current_date = datetime.now().strftime("%B %d, %Y")
         
@@ -348,16 +366,12 @@ class TrackerAgent:
 #### 🎯 Quiz Performance Summary
 """
         
-        if quiz_data:
-            avg_score = sum(q['score_percentage'] for q in quiz_data) / len(quiz_data)
-            best_score = max(q['score_percentage'] for q in quiz_data)
-            total_quizzes = len(quiz_data)
-            
+        if quiz_stats['count']:
             report += f"""
-• Total Quizzes Taken: {total_quizzes}
-• Average Score: {avg_score:.1f}%
-• Best Score: {best_score:.1f}%
-• Latest Score: {quiz_data[-1]['score_percentage']:.1f}%
+• Total Quizzes Taken: {quiz_stats['count']}
+• Average Score: {quiz_stats['average_score']:.1f}%
+• Best Score: {quiz_stats['best_score']:.1f}%
+• Latest Score: {quiz_stats['latest_score']:.1f}%
 
 #### 📈 Recent Quiz History:
 """
@@ -392,14 +406,20 @@ Generated by EduMate AI Assistant
                 st.session_state.get('plan_duration', '1 Month')
             )
             
+            # Load this plan's completed tasks from SQLite in one range query
+            self.task_completions = dict(get_plan_task_completions(
+                self.user_id, key_prefix=f"{self.plan_key(st.session_state.current_study_plan)}:"
+            ))
+            
             # Calculate progress
             progress_stats = self.calculate_overall_progress(tasks_by_day)
             
             # Get quiz data
             quiz_data = self.get_quiz_performance_data()
+            quiz_stats = get_quiz_stats(self.user_id)
             
             # Calculate study streak
-            study_streak = self.calculate_study_streak(tasks_by_day)
+            study_streak = self.calculate_study_streak()
             
             # Display main components
             self.display_progress_overview(progress_stats)
@@ -416,14 +436,15 @@ Generated by EduMate AI Assistant
                 self.display_quiz_performance_chart(quiz_data)
             
             with tab3:
-                self.display_achievements(progress_stats, quiz_data, study_streak)
+                self.display_achievements(progress_stats, quiz_stats, study_streak)
             
             with tab4:
-                self.display_weekly_summary(progress_stats, quiz_data)
+                self.display_weekly_summary(progress_stats)
+                self.display_activity_heatmap()
                 
                 # Download progress report
                 if st.button("📄 Generate Progress Report"):
-                    report = self.generate_progress_report(progress_stats, quiz_data, study_streak)
+                    report = self.generate_progress_report(progress_stats, quiz_stats, quiz_data, study_streak)
                     st.download_button(
                         label="💾 Download Progress Report",
                         data=report,
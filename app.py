@@ -1,10 +1,14 @@
 # app.py (Student Dashboard)
 import streamlit as st
-from data_manager import get_tasks, add_task, mark_task_completed, delete_task, get_all_subjects, delete_subject
+from data_manager import query_tasks, add_task, mark_task_completed, delete_task, get_all_subjects, delete_subject
+from data_manager import mark_tasks_completed_bulk, delete_tasks_bulk
 from productivity_tools import pomodoro_timer
 from langgraph_flow import run_agent as get_urgent_reminders
 from datetime import datetime
 
+TASKS_PAGE_SIZE = 20
+TASK_FILTER_STATUS = {"All Tasks": None, "Pending Tasks": "pending", "Completed Tasks": "completed"}
+
 def render_student_dashboard(user_id, is_guest, app_id): # is_guest and app_id are unused here now
     """
     Renders the student dashboard with personalized tasks and syllabus.
@@ -41,9 +45,6 @@ def render_student_dashboard(user_id, is_guest, app_id): # is_guest and app_id a
     st.markdown("---")
     st.header("✅ Your Tasks")
 
-    tasks = get_tasks(user_id)
-    st.session_state.tasks = tasks
-
     col_add_task, col_filters = st.columns([2, 1])
 
     with col_add_task:
@@ -107,16 +108,22 @@ def render_student_dashboard(user_id, is_guest, app_id): # is_guest and app_id a
             ("All Tasks", "Pending Tasks", "Completed Tasks"),
             key="task_filter"
         )
+        # Long-completed tasks are moved to the archive; only search it when asked
+        include_archived = task_filter != "Pending Tasks" and st.checkbox("Include archived tasks", key="task_include_archived")
 
     st.markdown("---")
 
-    filtered_tasks = []
-    if task_filter == "Pending Tasks":
-        filtered_tasks = [t for t in tasks if not t.get('completed', False)]
-    elif task_filter == "Completed Tasks":
-        filtered_tasks = [t for t in tasks if t.get('completed', False)]
-    else:
-        filtered_tasks = tasks
+    # Keyset pagination: task_page_cursors[i] is the cursor that starts page i. Reset when the filter changes.
+    if st.session_state.get('task_page_filter') != (task_filter, include_archived):
+        st.session_state.task_page_filter = (task_filter, include_archived)
+        st.session_state.task_page_cursors = [None]
+    page_cursors = st.session_state.task_page_cursors
+
+    # Only the rows on this page are fetched; SQLite does the filtering and sorting
+    page = query_tasks(user_id, status=TASK_FILTER_STATUS[task_filter], order_by="created_at",
+                       limit=TASKS_PAGE_SIZE, after=page_cursors[-1], include_archived=include_archived)
+    filtered_tasks = page["tasks"]
+    st.session_state.tasks = filtered_tasks
 
     if filtered_tasks:
         for i, task in enumerate(filtered_tasks):
@@ -155,6 +162,43 @@ def render_student_dashboard(user_id, is_guest, app_id): # is_guest and app_id a
                     else:
                         st.error(f"Failed to delete task: {result['error']}")
         st.markdown("---")
+
+        col_prev_page, col_page_label, col_next_page = st.columns([1, 2, 1])
+        with col_prev_page:
+            if len(page_cursors) > 1 and st.button("⬅️ Previous", key="tasks_prev_page"):
+                page_cursors.pop()
+                st.rerun()
+        with col_page_label:
+            st.caption(f"Page {len(page_cursors)}")
+        with col_next_page:
+            if page["next_cursor"] is not None and st.button("Next ➡️", key="tasks_next_page"):
+                page_cursors.append(page["next_cursor"])
+                st.rerun()
+
+        # Bulk actions over the tasks currently shown (one transaction each)
+        pending_ids = [t['id'] for t in filtered_tasks if not t.get('completed', False)]
+        completed_ids = [t['id'] for t in filtered_tasks if t.get('completed', False)]
+        col_bulk_complete, col_bulk_clear = st.columns(2)
+        with col_bulk_complete:
+            if pending_ids and st.button(f"Mark All {len(pending_ids)} Pending Completed", key="bulk_complete_tasks"):
+                result = mark_tasks_completed_bulk(user_id, pending_ids)
+                if result["success"]:
+                    st.success(f"Marked {result['count']} tasks completed!")
+                    st.rerun()
+                else:
+                    st.error(f"Failed to mark tasks completed: {result['error']}")
+        with col_bulk_clear:
+            if completed_ids and st.button(f"Clear {len(completed_ids)} Completed Tasks", key="bulk_delete_completed_tasks"):
+                result = delete_tasks_bulk(user_id, completed_ids)
+                if result["success"]:
+                    st.info(f"Cleared {result['count']} completed tasks.")
+                    st.rerun()
+                else:
+                    st.error(f"Failed to clear completed tasks: {result['error']}")
+    elif len(page_cursors) > 1:
+        # The last page emptied out (e.g. its tasks were deleted); step back a page
+        page_cursors.pop()
+        st.rerun()
     else:
         st.info(f"No {task_filter.lower()} found for you. Keep up the great work! ✨")
 
@@ -0,0 +1,109 @@
+# benchmarks/bench_chunking.py
+"""
+Compares the old blank-line splitter with chunking.chunk_text() on the knowledge_base/ files:
+chunk count and size spread, tokens sent to the embedder (index size), indexing time and query
+latency against an in-memory Chroma collection built with each splitter.
+
+Usage:
+    python benchmarks/bench_chunking.py [max_tokens] [overlap_tokens] [query_rounds]
+
+Without chromadb installed only the size comparison is printed.
+"""
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from chunking import chunk_text, count_tokens
+
+KNOWLEDGE_BASE_DIR = os.path.join(os.path.dirname(__file__), '..', 'knowledge_base')
+QUERIES = [
+    "What is photosynthesis?",
+    "Explain Newton's laws of motion",
+    "Ohm's law and Kirchhoff's laws",
+    "Periodic table and chemical bonding",
+    "fundamental rights in the Indian constitution",
+    "Python lists, tuples and dictionaries",
+    "matrices eigenvalues and eigenvectors",
+    "laser principle and applications",
+    "demand and supply in economics",
+    "how to write a technical report",
+]
+
+
+def paragraph_chunks(text):
+    """The splitter vector_rag used before chunking.py."""
+    return [paragraph.strip() for paragraph in text.split("\n\n") if paragraph.strip()]
+
+
+def load_documents():
+    documents = {}
+    for filename in sorted(os.listdir(KNOWLEDGE_BASE_DIR)):
+        if filename.endswith(".txt"):
+            with open(os.path.join(KNOWLEDGE_BASE_DIR, filename), encoding="utf-8") as f:
+                documents[filename] = f.read()
+    return documents
+
+
+def size_stats(chunks):
+    sizes = [count_tokens(chunk) for chunk in chunks]
+    return {
+        "chunks": len(sizes),
+        "tokens": sum(sizes),
+        "mean": statistics.mean(sizes),
+        "stdev": statistics.pstdev(sizes),
+        "min": min(sizes),
+        "max": max(sizes),
+    }
+
+
+def retrieval_stats(name, chunks, rounds):
+    import chromadb
+    collection = chromadb.Client().get_or_create_collection(name=f"bench_{name}_{os.getpid()}")
+    t0 = time.perf_counter()
+    collection.upsert(ids=[f"{name}_{i}" for i in range(len(chunks))], documents=chunks)
+    index_seconds = time.perf_counter() - t0
+    collection.query(query_texts=[QUERIES[0]], n_results=3) # Warm up the embedder
+    latencies = []
+    for _ in range(rounds):
+        for query in QUERIES:
+            t0 = time.perf_counter()
+            collection.query(query_texts=[query], n_results=3)
+            latencies.append(time.perf_counter() - t0)
+    latencies.sort()
+    return index_seconds, statistics.median(latencies) * 1000, latencies[int(len(latencies) * 0.95) - 1] * 1000
+
+
+def main():
+    max_tokens = int(sys.argv[1]) if len(sys.argv) > 1 else 128
+    overlap_tokens = int(sys.argv[2]) if len(sys.argv) > 2 else 24
+    rounds = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+
+    documents = load_documents()
+    splitters = {
+        "paragraphs": [chunk for text in documents.values() for chunk in paragraph_chunks(text)],
+        "chunk_text": [chunk["text"] for text in documents.values() for chunk in chunk_text(text, max_tokens, overlap_tokens)],
+    }
+
+    print(f"{len(documents)} knowledge base files, chunk_text(max_tokens={max_tokens}, overlap_tokens={overlap_tokens})")
+    print(f"{'splitter':>11} | {'chunks':>6}{'tokens':>8}{'mean':>7}{'stdev':>7}{'min':>5}{'max':>5}")
+    for name, chunks in splitters.items():
+        stats = size_stats(chunks)
+        print(f"{name:>11} | {stats['chunks']:>6}{stats['tokens']:>8}{stats['mean']:>7.1f}"
+              f"{stats['stdev']:>7.1f}{stats['min']:>5}{stats['max']:>5}")
+
+    try:
+        import chromadb # noqa: F401
+    except ImportError:
+        print("chromadb is not installed; skipping indexing and query latency.")
+        return
+    print(f"\n{'splitter':>11} | {'index s':>8}{'p50 ms':>8}{'p95 ms':>8}  ({rounds} x {len(QUERIES)} queries, top 3)")
+    for name, chunks in splitters.items():
+        index_seconds, p50, p95 = retrieval_stats(name, chunks, rounds)
+        print(f"{name:>11} | {index_seconds:>8.2f}{p50:>8.2f}{p95:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
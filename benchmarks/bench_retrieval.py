@@ -0,0 +1,99 @@
+# benchmarks/bench_retrieval.py
+"""
+Retrieval quality and latency on the labelled query set in benchmarks/rag_queries.json: each query lists
+the knowledge_base/ files that answer it. For the vector, keyword (BM25) and hybrid (RRF) modes of
+vector_rag.retrieve() this reports recall@k (a relevant file among the top k chunks), MRR, and p50/p95
+latency of retrieve(k=max k). It then times all hybrid queries as one get_relevant_contexts() batch against
+one retrieve() call each, and the latency of the same queries answered from the retrieval cache.
+
+The index is built from knowledge_base/ in a temporary directory (no app database or vector store is touched).
+Query embeddings are cached after a warm-up pass, so latency is retrieval cost rather than model time;
+the retrieval result cache is disabled for the per-mode runs.
+
+Usage:
+    python benchmarks/bench_retrieval.py [num_candidates] [rrf_k]
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, REPO_DIR)
+
+KS = (1, 3, 5)
+MODES = ("vector", "keyword", "hybrid")
+
+
+def main():
+    num_candidates = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    rrf_k = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    with open(os.path.join(REPO_DIR, "benchmarks", "rag_queries.json"), encoding="utf-8") as f:
+        labelled = json.load(f)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # vector_rag and data_manager use paths relative to the working directory
+        os.symlink(os.path.join(REPO_DIR, "knowledge_base"), os.path.join(tmp, "knowledge_base"))
+        os.makedirs(os.path.join(tmp, "data"))
+        os.chdir(tmp)
+        import vector_rag
+        vector_rag.initialize_vector_db()
+        max_entries = vector_rag.retrieval_cache.max_entries
+        vector_rag.retrieval_cache.max_entries = 0
+        for item in labelled: # Warm the query embedding cache
+            vector_rag.retrieve(item["query"], max(KS), mode="vector")
+
+        print(f"{len(labelled)} labelled queries, {vector_rag.get_store().count()} chunks, backend={vector_rag.VECTOR_BACKEND}")
+        print(f"{'mode':>8} | " + "".join(f"{f'R@{k}':>7}" for k in KS) + f"{'MRR':>7} | {'p50 ms':>8}{'p95 ms':>8}")
+        for mode in MODES:
+            hits_at = {k: 0 for k in KS}
+            reciprocal_ranks = 0.0
+            latencies = []
+            for item in labelled:
+                t0 = time.perf_counter()
+                results = vector_rag.retrieve(item["query"], max(KS), mode=mode, num_candidates=num_candidates, rrf_k=rrf_k)
+                latencies.append(time.perf_counter() - t0)
+                sources = [result["metadata"].get("source") for result in results]
+                first = next((rank for rank, source in enumerate(sources, start=1) if source in item["relevant"]), None)
+                if first:
+                    reciprocal_ranks += 1.0 / first
+                    for k in KS:
+                        hits_at[k] += first <= k
+            p50, p95 = percentiles(latencies)
+            print(f"{mode:>8} | " + "".join(f"{hits_at[k] / len(labelled):>7.2f}" for k in KS)
+                  + f"{reciprocal_ranks / len(labelled):>7.2f} | {p50:>8.2f}{p95:>8.2f}")
+
+        queries = [item["query"] for item in labelled]
+        t0 = time.perf_counter()
+        for query in queries:
+            vector_rag.retrieve(query, max(KS), mode="hybrid", num_candidates=num_candidates, rrf_k=rrf_k)
+        sequential = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        vector_rag.get_relevant_contexts(queries, max(KS), mode="hybrid", num_candidates=num_candidates, rrf_k=rrf_k)
+        batched = time.perf_counter() - t0
+        print(f"{'batched':>8} | {len(queries)} queries: {batched * 1000:.2f} ms in one batch, {sequential * 1000:.2f} ms one by one")
+
+        # Repeated questions: the first pass fills the retrieval cache, the second is served from it
+        vector_rag.retrieval_cache.max_entries = max_entries or 1024
+        latencies = []
+        for repeat in range(2):
+            for item in labelled:
+                t0 = time.perf_counter()
+                vector_rag.retrieve(item["query"], max(KS), mode="hybrid", num_candidates=num_candidates, rrf_k=rrf_k)
+                if repeat:
+                    latencies.append(time.perf_counter() - t0)
+        p50, p95 = percentiles(latencies)
+        stats = vector_rag.get_retrieval_cache_stats()
+        print(f"{'cached':>8} | {'':>28} | {p50:>8.2f}{p95:>8.2f}  "
+              f"(hit rate {stats['hit_rate']:.2f}, {stats['saved_ms']:.1f} ms saved)")
+
+
+def percentiles(latencies):
+    """p50 and p95 of a list of durations in seconds, in milliseconds."""
+    latencies = sorted(latencies)
+    return latencies[len(latencies) // 2] * 1000, latencies[max(0, int(len(latencies) * 0.95) - 1)] * 1000
+
+
+if __name__ == "__main__":
+    main()
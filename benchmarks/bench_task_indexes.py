@@ -0,0 +1,78 @@
+# benchmarks/bench_task_indexes.py
+"""
+Compares per-user task/subject query time with and without the v2 indexes.
+
+Usage:
+    python benchmarks/bench_task_indexes.py [num_tasks] [num_users]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from db_pool import ConnectionPool
+from db_migrations import apply_migrations
+
+GET_TASKS_SQL = "SELECT id, task, due_date, completed, created_at, subject_name, topic_name FROM tasks WHERE user_id = ?"
+PENDING_DUE_SQL = "SELECT id FROM tasks WHERE user_id = ? AND completed = 0 AND due_date BETWEEN ? AND ?"
+GET_SUBJECTS_SQL = "SELECT id, name, topics, created_at FROM subjects WHERE user_id = ?"
+
+
+def populate(pool, num_tasks, num_users):
+    users = [f"user{i}" for i in range(num_users)]
+    start = datetime(2025, 1, 1)
+    with pool.transaction() as cursor:
+        cursor.executemany("INSERT INTO users (username, password, created_at) VALUES (?, ?, ?)",
+                           [(u, "pw", start.isoformat()) for u in users])
+        cursor.executemany(
+            "INSERT INTO tasks (user_id, task, due_date, completed, created_at, subject_name, topic_name) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(random.choice(users), f"Task {i}", (start + timedelta(days=random.randint(0, 365))).strftime("%Y-%m-%d"),
+              random.randint(0, 1), (start + timedelta(minutes=i)).isoformat(), "Physics", "Optics")
+             for i in range(num_tasks)])
+        cursor.executemany("INSERT INTO subjects (user_id, name, topics, created_at) VALUES (?, ?, ?, ?)",
+                           [(u, f"Subject {j}", "[]", start.isoformat()) for u in users for j in range(15)])
+    return users
+
+
+def time_queries(pool, users, repeats):
+    timings = {}
+    for label, sql, extra in (("get_tasks", GET_TASKS_SQL, ()),
+                              ("pending due in window", PENDING_DUE_SQL, ("2025-03-01", "2025-03-03")),
+                              ("get_all_subjects", GET_SUBJECTS_SQL, ())):
+        t0 = time.perf_counter()
+        for i in range(repeats):
+            with pool.read() as cursor:
+                cursor.execute(sql, (users[i % len(users)],) + extra)
+                cursor.fetchall()
+        timings[label] = (time.perf_counter() - t0) / repeats * 1000
+    return timings
+
+
+def main():
+    num_tasks = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    num_users = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    random.seed(42)
+    with tempfile.TemporaryDirectory() as tmp:
+        pool = ConnectionPool(os.path.join(tmp, "bench.db"))
+        apply_migrations(pool, target_version=1)
+        users = populate(pool, num_tasks, num_users)
+        pool.connection().execute("ANALYZE")
+
+        before = time_queries(pool, users, repeats=200)
+        apply_migrations(pool)
+        pool.connection().execute("ANALYZE")
+        after = time_queries(pool, users, repeats=200)
+        pool.close_all()
+
+    print(f"{num_tasks} tasks across {num_users} users (ms per query, mean of 200)")
+    print(f"{'query':<24}{'no indexes':>12}{'v2 indexes':>12}{'speedup':>10}")
+    for label in before:
+        print(f"{label:<24}{before[label]:>12.3f}{after[label]:>12.3f}{before[label] / after[label]:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
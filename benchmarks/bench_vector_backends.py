@@ -0,0 +1,120 @@
+# benchmarks/bench_vector_backends.py
+"""
+Compares the vector_backends engines (chroma, numpy) on synthetic 384-dimensional embeddings (the size
+all-MiniLM-L6-v2 produces), half tagged scope=shared and half scope=user like vector_rag's chunks.
+
+For every size the index is built once per backend, then a fresh child process opens it and reports:
+cold start (import + open + first query), peak RSS, and p50/p95 latency of top-3 queries without a
+filter and with vector_rag's scope filter.
+
+Usage:
+    python benchmarks/bench_vector_backends.py [--sizes 1000,100000,1000000] [--backends chroma,numpy] [--queries 200]
+
+1M chunks need about 1.5 GB of disk for the numpy matrix; building them in Chroma takes a long time.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+DIM = 384
+BUILD_BATCH = 5000  # Below Chroma's maximum batch size
+SCOPE_FILTER = {"$or": [{"scope": "shared"}, {"user_id": "user0"}]}
+
+
+def random_vectors(np, rng, count):
+    vectors = rng.standard_normal((count, DIM), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def build(backend_name, path, size):
+    import numpy as np
+    from vector_backends import open_vector_backend
+    rng = np.random.default_rng(0)
+    backend = open_vector_backend(path, backend_name)
+    t0 = time.perf_counter()
+    batches = [(start, min(start + BUILD_BATCH, size)) for start in range(0, size, BUILD_BATCH)]
+    for start, end in batches:
+        ids = [f"chunk_{i}" for i in range(start, end)]
+        metadatas = [{"scope": "shared"} if i % 2 else {"scope": "user", "user_id": f"user{i % 100}"} for i in range(start, end)]
+        backend.upsert(ids, random_vectors(np, rng, end - start).tolist() if backend_name != "numpy" else random_vectors(np, rng, end - start),
+                       [f"document {i}" for i in ids], metadatas)
+    return time.perf_counter() - t0
+
+
+def peak_rss_mb():
+    # VmHWM starts fresh at exec; ru_maxrss can carry over the (large) parent's peak through fork
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KB on Linux, bytes on macOS
+
+
+def probe(backend_name, path, num_queries):
+    """Runs in a fresh process: everything here counts towards cold start and peak memory."""
+    t0 = time.perf_counter()
+    import numpy as np
+    from vector_backends import open_vector_backend
+    backend = open_vector_backend(path, backend_name)
+    queries = random_vectors(np, np.random.default_rng(1), num_queries)
+    backend.query(queries[:1].tolist(), 3)
+    cold_start = time.perf_counter() - t0
+
+    result = {"cold_start_s": cold_start}
+    for label, where in (("all", None), ("filtered", SCOPE_FILTER)):
+        latencies = []
+        for query in queries:
+            t1 = time.perf_counter()
+            backend.query([query.tolist()], 3, where=where)
+            latencies.append(time.perf_counter() - t1)
+        latencies.sort()
+        result[f"{label}_p50_ms"] = latencies[len(latencies) // 2] * 1000
+        result[f"{label}_p95_ms"] = latencies[int(len(latencies) * 0.95) - 1] * 1000
+    result["peak_rss_mb"] = peak_rss_mb()
+    print(json.dumps(result))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the vector search backends.")
+    parser.add_argument("--sizes", default="1000,100000,1000000")
+    parser.add_argument("--backends", default="chroma,numpy")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--probe", nargs=2, metavar=("BACKEND", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.probe:
+        probe(args.probe[0], args.probe[1], args.queries)
+        return
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    backends = args.backends.split(",")
+    print(f"{'chunks':>8} {'backend':>7} | {'build s':>8}{'cold s':>8}{'RSS MB':>8} | "
+          f"{'p50 ms':>8}{'p95 ms':>8} | {'filt p50':>9}{'filt p95':>9}")
+    for size in sizes:
+        for backend_name in backends:
+            with tempfile.TemporaryDirectory() as tmp:
+                try:
+                    build_seconds = build(backend_name, tmp, size)
+                except ImportError as e:
+                    print(f"{size:>8} {backend_name:>7} | skipped ({e})")
+                    continue
+                output = subprocess.run([sys.executable, __file__, "--probe", backend_name, tmp, "--queries", str(args.queries)],
+                                        capture_output=True, text=True, check=True).stdout
+                stats = json.loads(output.strip().splitlines()[-1])
+                print(f"{size:>8} {backend_name:>7} | {build_seconds:>8.1f}{stats['cold_start_s']:>8.2f}{stats['peak_rss_mb']:>8.0f} | "
+                      f"{stats['all_p50_ms']:>8.2f}{stats['all_p95_ms']:>8.2f} | "
+                      f"{stats['filtered_p50_ms']:>9.2f}{stats['filtered_p95_ms']:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
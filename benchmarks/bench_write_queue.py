@@ -0,0 +1,97 @@
+# benchmarks/bench_write_queue.py
+"""
+Load test for concurrent writers: each simulated user is a thread that adds a task and then
+marks it completed, like a Streamlit session would. Compares one transaction per write on the
+caller's thread against the single-writer queue with group commit, for a growing number of users.
+
+Usage:
+    python benchmarks/bench_write_queue.py [writes_per_user] [max_users]
+
+Commit cost dominates the difference; try EDUMATE_DB_SYNCHRONOUS=FULL to see it with an fsync per commit.
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from db_pool import ConnectionPool
+from db_migrations import apply_migrations
+
+INSERT_TASK_SQL = "INSERT INTO tasks (user_id, task, due_date, completed, created_at) VALUES (?, ?, ?, 0, ?)"
+COMPLETE_TASK_SQL = "UPDATE tasks SET completed = 1 WHERE id = ? AND user_id = ?"
+PENDING_SQL = "SELECT COUNT(*) FROM tasks WHERE user_id = ? AND completed = 0"
+
+
+def timed_write(pool, fn, latencies, errors):
+    t0 = time.perf_counter()
+    try:
+        result = pool.write(fn)
+    except Exception as e:
+        errors.append(str(e))
+        return None
+    latencies.append(time.perf_counter() - t0)
+    return result
+
+
+def simulate_user(pool, user, writes, latencies, errors):
+    for i in range(writes // 2):
+        task_id = timed_write(pool, lambda cursor: cursor.execute(
+            INSERT_TASK_SQL, (user, f"Task {i}", "2025-06-01", datetime.now().isoformat())).lastrowid, latencies, errors)
+        if task_id is not None:
+            timed_write(pool, lambda cursor: cursor.execute(COMPLETE_TASK_SQL, (task_id, user)), latencies, errors)
+        # Reads go through the caller's own pooled connection in both modes
+        with pool.read() as cursor:
+            cursor.execute(PENDING_SQL, (user,))
+            cursor.fetchone()
+
+
+def run(db_path, num_users, writes_per_user, use_queue):
+    pool = ConnectionPool(db_path, write_queue=False)
+    apply_migrations(pool)
+    with pool.transaction() as cursor:
+        cursor.execute("DELETE FROM tasks")
+        cursor.executemany("INSERT OR IGNORE INTO users (username, password, created_at) VALUES (?, ?, ?)",
+                           [(f"user{u}", "pw", datetime.now().isoformat()) for u in range(num_users)])
+    if use_queue:
+        pool.start_write_queue()
+
+    latencies, errors = [], []
+    threads = [threading.Thread(target=simulate_user, args=(pool, f"user{u}", writes_per_user, latencies, errors))
+               for u in range(num_users)]
+    t0 = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - t0
+
+    batch = pool._writer.stats()["average_batch"] if use_queue else 1.0
+    pool.stop_write_queue()
+    pool.close_all()
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1] * 1000 if latencies else float("nan")
+    return len(latencies) / elapsed, p95, len(errors), batch
+
+
+def main():
+    writes_per_user = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    max_users = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+    user_counts = [n for n in (1, 2, 4, 8, 16, 32, 64) if n <= max_users]
+
+    print(f"{writes_per_user} writes per simulated user (synchronous={os.getenv('EDUMATE_DB_SYNCHRONOUS', 'NORMAL')})")
+    print(f"{'users':>6} | {'direct w/s':>11}{'p95 ms':>9}{'errors':>8} | {'queue w/s':>10}{'p95 ms':>9}{'errors':>8}{'batch':>7}")
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        for num_users in user_counts:
+            direct = run(db_path, num_users, writes_per_user, use_queue=False)
+            queued = run(db_path, num_users, writes_per_user, use_queue=True)
+            print(f"{num_users:>6} | {direct[0]:>11.0f}{direct[1]:>9.2f}{direct[2]:>8} | "
+                  f"{queued[0]:>10.0f}{queued[1]:>9.2f}{queued[2]:>8}{queued[3]:>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
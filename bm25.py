@@ -0,0 +1,96 @@
+# bm25.py
+import math
+import re
+import threading
+
+_WORD_RE = re.compile(r"\w+")
+# Very common English words carry no signal for keyword retrieval
+STOPWORDS = frozenset("""
+a an and are as at be by can do does for from has have how i in is it its of on or that the their this to
+was what when where which who why will with you your about explain tell me define
+""".split())
+
+
+def tokenize(text):
+    """Lowercased word tokens without stopwords (same rules for documents and queries)."""
+    return [word for word in _WORD_RE.findall(text.lower()) if word not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    In-process Okapi BM25 inverted index over chunks: term -> {chunk id: term frequency}.
+    Chunks are added and removed one by one as the vector index changes, so it never needs a full rebuild.
+    """
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._postings = {} # term -> {chunk_id: tf}
+        self._lengths = {} # chunk_id -> token count
+        self._terms = {} # chunk_id -> its distinct terms, so removal only touches its own postings
+        self._metadatas = {} # chunk_id -> metadata, for where filters
+        self._total_length = 0
+
+    def __len__(self):
+        return len(self._lengths)
+
+    def add(self, chunk_id, text, metadata=None):
+        """Indexes (or re-indexes) one chunk."""
+        tokens = tokenize(text)
+        with self._lock:
+            self._remove(chunk_id)
+            frequencies = {}
+            for token in tokens:
+                frequencies[token] = frequencies.get(token, 0) + 1
+            for term, tf in frequencies.items():
+                self._postings.setdefault(term, {})[chunk_id] = tf
+            self._lengths[chunk_id] = len(tokens)
+            self._terms[chunk_id] = tuple(frequencies)
+            self._metadatas[chunk_id] = metadata or {}
+            self._total_length += len(tokens)
+
+    def set_metadata(self, chunk_id, metadata):
+        with self._lock:
+            if chunk_id in self._metadatas:
+                self._metadatas[chunk_id] = metadata
+
+    def remove(self, chunk_id):
+        with self._lock:
+            self._remove(chunk_id)
+
+    def _remove(self, chunk_id):
+        length = self._lengths.pop(chunk_id, None)
+        if length is None:
+            return
+        self._metadatas.pop(chunk_id, None)
+        self._total_length -= length
+        for term in self._terms.pop(chunk_id, ()):
+            postings = self._postings[term]
+            postings.pop(chunk_id, None)
+            if not postings:
+                del self._postings[term]
+
+    def search(self, query, k, allowed=None):
+        """
+        Returns up to k (chunk_id, score) pairs, best first. allowed(metadata) -> bool restricts the
+        candidates (e.g. vector_backends.metadata_matches with a where filter).
+        """
+        terms = set(tokenize(query))
+        with self._lock:
+            count = len(self._lengths)
+            if not count or not terms:
+                return []
+            average_length = self._total_length / count or 1.0
+            scores = {}
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for chunk_id, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._lengths[chunk_id] / average_length)
+                    scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+            if allowed is not None:
+                scores = {chunk_id: score for chunk_id, score in scores.items() if allowed(self._metadatas[chunk_id])}
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
@@ -1,7 +1,7 @@
 # chatbot_agent.py (Modified for Phi3 and Ultra-Simplified Prompt)
 import requests
-from vector_rag import get_relevant_context
-from data_manager import get_all_subjects, get_tasks
+from vector_rag import get_relevant_context, NO_CONTEXT_MESSAGE
+from data_manager import get_all_subjects, query_tasks, search
 import os
 import ollama
 import streamlit as st
@@ -10,6 +10,9 @@ GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 SEARCH_ENGINE_ID = os.getenv("SEARCH_ENGINE_ID")
 
 OLLAMA_MODEL = "phi3" # Model remains phi3
+CONTEXT_TASK_LIMIT = 20 # Pending tasks (soonest due first) included in the LLM prompt
+TASK_LIST_LIMIT = 50 # Tasks listed per TASKS_* reply
+SEARCH_RESULT_LIMIT = 10 # Hits listed for "find ..." / "search ..." queries
 
 def search_resources(query):
     """
@@ -58,10 +61,10 @@ def get_chatbot_response(query, chat_history=None, user_id=None):
     subjects = get_all_subjects(user_id)
     subject_list = "\n".join([f"- {s['name']}: {', '.join(s['topics'])}" for s in subjects])
 
-    all_tasks = get_tasks(user_id)
+    upcoming_tasks = query_tasks(user_id, status="pending", order_by="due_date", limit=CONTEXT_TASK_LIMIT)["tasks"]
     task_list_for_llm_context = "\n".join([
-        f"- {t['task']} (Due: {t['due_date']}) - {'Completed' if t.get('completed', False) else 'Pending'}"
-        for t in all_tasks
+        f"- {t['task']} (Due: {t['due_date']}) - Pending"
+        for t in upcoming_tasks
     ])
 
     # --- ULTRA-SIMPLIFIED FULL PROMPT ---
@@ -77,7 +80,7 @@ You are EduMate, a friendly and knowledgeable academic assistant. Your core miss
 
 Available Subjects and their topics:
 {subject_list}
-Current Tasks for user {user_id}:
+Upcoming Pending Tasks for user {user_id}:
 {task_list_for_llm_context}
 
 --- Conversation History ---
@@ -146,28 +149,37 @@ Conversation history (most recent last, up to 6 turns for better context):
     elif "all tasks" in query_lower or ("tasks" in query_lower and "pending" not in query_lower and "completed" not in query_lower):
         suggested_tool = "TASKS_ALL"
     
+    # "find X" / "search for X" looks X up in the user's own data through the full-text index
+    search_terms = None
+    for prefix in ("search for ", "search ", "find my ", "find "):
+        if query_lower.startswith(prefix) and not suggested_tool.startswith("TASKS"):
+            search_terms = query[len(prefix):].strip()
+            suggested_tool = "SEARCH"
+            break
+
     if ("code" in query_lower or "program" in query_lower or "script" in query_lower) and \
        ("input" in query_lower or "hardcode" in query_lower or "modify" in query_lower or "change" in query_lower or "different version" in query_lower or "write" in query_lower or "create" in query_lower):
         suggested_tool = "CODE_MODIFICATION"
 
 
     if suggested_tool.startswith("TASKS"):
-        tasks = get_tasks(user_id)
-        pending_tasks = [task for task in tasks if not task.get('completed', False)]
-        completed_tasks = [task for task in tasks if task.get('completed', False)]
+        # Each tool fetches only the rows it lists, already filtered and sorted by SQLite
+        status_filter = {"TASKS_PENDING": "pending", "TASKS_COMPLETED": "completed"}.get(suggested_tool)
+        page = query_tasks(user_id, status=status_filter, order_by="due_date", limit=TASK_LIST_LIMIT)
+        tasks = page["tasks"]
         response_parts = []
 
         if suggested_tool == "TASKS_PENDING":
-            if pending_tasks:
+            if tasks:
                 response_parts.append("Here are your **pending tasks**, ready to be crushed! 💪\n")
-                for task in pending_tasks:
+                for task in tasks:
                     response_parts.append(f"- {task['task']} (Due: {task['due_date']})\n")
             else:
                 response_parts.append("Great news! 🎉 You have **no pending tasks**! You're on top of things! ✨")
         elif suggested_tool == "TASKS_COMPLETED":
-            if completed_tasks:
+            if tasks:
                 response_parts.append("Fantastic job! 🎉 Here are your **completed tasks**:\n")
-                for task in completed_tasks:
+                for task in tasks:
                     response_parts.append(f"- {task['task']} (Due: {task['due_date']})\n")
             else:
                 response_parts.append("You haven't marked any tasks as completed yet. Time to get started! 🎯")
@@ -180,8 +192,21 @@ Conversation history (most recent last, up to 6 turns for better context):
             else:
                 response_parts.append("You currently have no tasks added. Let's set some goals! 🎯")
 
+        if page["next_cursor"] is not None:
+            response_parts.append(f"\n_Showing the first {TASK_LIST_LIMIT}. Visit the Dashboard to browse the rest._")
+
         yield "".join(response_parts)
         return
+    elif suggested_tool == "SEARCH":
+        hits = search(user_id, search_terms, limit=SEARCH_RESULT_LIMIT)
+        if hits:
+            lines = [f"Here's what I found for **{search_terms}** 🔎\n"]
+            for hit in hits:
+                lines.append(f"- [{hit['kind'].replace('_', ' ')}] {hit['title']}\n")
+            yield "".join(lines)
+        else:
+            yield f"I couldn't find anything matching **{search_terms}** in your tasks, subjects or notes. 🤔"
+        return
     elif suggested_tool == "SYLLABUS":
         subjects = get_all_subjects(user_id)
         subject_list_for_response = "\n".join([f"- {s['name']}: {', '.join(s['topics'])}" for s in subjects])
@@ -199,8 +224,8 @@ Conversation history (most recent last, up to 6 turns for better context):
             yield "I searched the web but couldn't find specific information for that query. Would you like to try asking something else? 🤔"
             return
     elif suggested_tool == "RAG":
-        rag_context = get_relevant_context(query)
-        if rag_context and rag_context != "No relevant context found in the syllabus or knowledge base.":
+        rag_context = get_relevant_context(query, user_id=user_id)
+        if rag_context and rag_context != NO_CONTEXT_MESSAGE:
             combined_context += f"Knowledge Base Information: {rag_context}\n\n"
         else:
             web_result = search_resources(query)
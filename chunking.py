@@ -0,0 +1,101 @@
+# chunking.py
+import os
+import re
+
+# --- Tunables (override through environment variables if needed) ---
+# The default Chroma embedder (all-MiniLM-L6-v2) truncates input at 256 word pieces; chunks stay well below that
+CHUNK_MAX_TOKENS = int(os.getenv("EDUMATE_CHUNK_MAX_TOKENS", "128"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("EDUMATE_CHUNK_OVERLAP_TOKENS", "24"))
+
+# Approximate tokens: words and individual punctuation marks (close to word-piece counts for English prose)
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+_PARAGRAPH_BREAK_RE = re.compile(r"\n[ \t]*\n\s*")
+# A sentence ends at . ! ? (plus closing quotes/brackets) before whitespace, or at a line break
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])[\"')\]]*[ \t]+|[ \t]*\n\s*")
+
+
+def count_tokens(text):
+    """Approximate token count used for chunk sizing."""
+    return len(_TOKEN_RE.findall(text))
+
+
+def _sentence_spans(text, start, end):
+    """Yields (start, end) spans of the sentences (or lines) in text[start:end], without surrounding whitespace."""
+    position = start
+    for match in _SENTENCE_END_RE.finditer(text, start, end):
+        segment = text[position:match.start()]
+        if segment.strip():
+            sentence_end = match.start() if match.group().isspace() else match.start() + len(match.group().rstrip())
+            yield position + len(segment) - len(segment.lstrip()), sentence_end
+        position = match.end()
+    segment = text[position:end]
+    if segment.strip():
+        yield position + len(segment) - len(segment.lstrip()), position + len(segment.rstrip())
+
+
+def _split_long_span(text, start, end, max_tokens):
+    """Cuts a single over-long sentence into windows of at most max_tokens tokens."""
+    tokens = list(_TOKEN_RE.finditer(text, start, end))
+    for i in range(0, len(tokens), max_tokens):
+        window = tokens[i:i + max_tokens]
+        yield window[0].start(), window[-1].end(), len(window)
+
+
+def _units(text, max_tokens):
+    """
+    Yields (start, end, tokens, starts_paragraph) for every sentence of text, cutting sentences longer
+    than max_tokens. starts_paragraph marks the first unit after a blank line.
+    """
+    paragraph_start = 0
+    breaks = [(m.start(), m.end()) for m in _PARAGRAPH_BREAK_RE.finditer(text)] + [(len(text), len(text))]
+    for paragraph_end, next_start in breaks:
+        first = True
+        for start, end in _sentence_spans(text, paragraph_start, paragraph_end):
+            tokens = count_tokens(text[start:end])
+            if tokens > max_tokens:
+                for window_start, window_end, window_tokens in _split_long_span(text, start, end, max_tokens):
+                    yield window_start, window_end, window_tokens, first
+                    first = False
+            elif tokens:
+                yield start, end, tokens, first
+                first = False
+        paragraph_start = next_start
+
+
+def chunk_text(text, max_tokens=CHUNK_MAX_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    """
+    Splits text into sentence-aligned chunks of at most max_tokens (approximate) tokens. Consecutive
+    chunks share up to overlap_tokens of trailing sentences, short paragraphs (e.g. headings) are packed
+    together with what follows, and a chunk past half its budget ends at a paragraph break.
+    Returns [{"text", "start", "end", "tokens"}]; text is text[start:end] of the input.
+    """
+    max_tokens = max(1, max_tokens)
+    overlap_tokens = max(0, min(overlap_tokens, max_tokens // 2))
+    chunks = []
+    current = [] # (start, end, tokens) of the sentences in the chunk being built
+    current_tokens = 0
+
+    def emit():
+        start, end = current[0][0], current[-1][1]
+        chunks.append({"text": text[start:end], "start": start, "end": end, "tokens": current_tokens})
+
+    for start, end, tokens, starts_paragraph in _units(text, max_tokens):
+        full = current_tokens + tokens > max_tokens
+        paragraph_break = starts_paragraph and current_tokens >= max_tokens // 2
+        if current and (full or paragraph_break):
+            emit()
+            # Carry the trailing sentences that fit in the overlap budget into the next chunk
+            carried = []
+            carried_tokens = 0
+            if not paragraph_break:
+                for unit in reversed(current):
+                    if carried_tokens + unit[2] > overlap_tokens or carried_tokens + unit[2] + tokens > max_tokens:
+                        break
+                    carried.insert(0, unit)
+                    carried_tokens += unit[2]
+            current, current_tokens = carried, carried_tokens
+        current.append((start, end, tokens))
+        current_tokens += tokens
+    if current and (not chunks or current[-1][1] > chunks[-1]["end"]):
+        emit()
+    return chunks
@@ -1,172 +1,410 @@
 # data_manager.py
 import streamlit as st
 import os
+import base64
+import gzip
+import hashlib
+import hmac
 import json
+import re
+import secrets
 import sqlite3
-from datetime import datetime
+import threading
+from datetime import datetime, timedelta
+from db_pool import ConnectionPool
+from read_cache import UserReadCache
+from password_hashing import hash_password, verify_password, run_kdf, KdfBusyError, DUMMY_PASSWORD_HASH
+from db_migrations import apply_migrations, get_schema_version, DUE_DATE_INPUT_FORMATS, SEARCH_KINDS, SEARCH_KIND_COUNT
 
 # --- SQLite3 Setup for Local Data ---
 DB_DIRECTORY = "data"
 LOCAL_DB_PATH = os.path.join(DB_DIRECTORY, "edumate_offline.db") 
 # UPDATED: Path to your default syllabus file, now in the data directory
 SYLLABUS_FILE_PATH = os.path.join(DB_DIRECTORY, "syllabus.json") 
+UPLOADS_DIR = os.path.join(DB_DIRECTORY, "uploads") # Uploaded documents and their extracted text, named by file hash
+
+# Completed tasks older than TASK_ARCHIVE_AFTER_DAYS are moved to tasks_archive, kept in the main DB
+# unless EDUMATE_TASK_ARCHIVE_DB_PATH names a separate file to ATTACH as the "archive" schema.
+TASK_ARCHIVE_DB_PATH = os.getenv("EDUMATE_TASK_ARCHIVE_DB_PATH")
+TASK_ARCHIVE_AFTER_DAYS = int(os.getenv("EDUMATE_TASK_ARCHIVE_AFTER_DAYS", "90"))
+ARCHIVE_SCHEMA = "archive" if TASK_ARCHIVE_DB_PATH else "main"
+ARCHIVE_TABLE = f"{ARCHIVE_SCHEMA}.tasks_archive"
+SQL_VARIABLE_CHUNK = 500 # Ids bound per IN (...) list, well below SQLite's variable limit
+
+# Shared per-thread connection pool (WAL mode, busy timeout, tuned pragmas) used by every function below.
+# Every write below goes through db.write(), so with EDUMATE_DB_WRITE_QUEUE=1 they are all serialized on one
+# group-committing writer thread (schema migrations run on startup, before any other writer).
+db = ConnectionPool(LOCAL_DB_PATH, attachments={"archive": TASK_ARCHIVE_DB_PATH} if TASK_ARCHIVE_DB_PATH else None)
+# Process-wide LRU cache in front of per-user reads; every write below invalidates the user's entries
+cache = UserReadCache()
+# Callbacks run as fn(user_id) after a user's subjects/topics change (e.g. vector_rag re-embeds that user's syllabus)
+_syllabus_listeners = []
 
 def init_sqlite_db():
     """
     Initializes the SQLite database for local data storage, including user credentials.
-    Ensures the database directory exists.
+    Ensures the database directory exists and upgrades the schema to the latest migration.
     """
     # Create the directory if it doesn't exist
     if not os.path.exists(DB_DIRECTORY):
         os.makedirs(DB_DIRECTORY)
         print(f"DEBUG: Created database directory: {DB_DIRECTORY}")
 
-    conn = sqlite3.connect(LOCAL_DB_PATH)
-    cursor = conn.cursor()
+    applied = apply_migrations(db)
+    _ensure_task_archive()
+    print(f"DEBUG: Local SQLite DB initialized at schema v{get_schema_version(db)} ({len(applied)} migration(s) applied).")
 
-    # Create users table
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE,
-            password TEXT, -- In a real app, store hashed passwords! For demo, plaintext.
-            created_at TEXT
-        )
-    """)
-
-    # Create tasks table
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS tasks (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id TEXT, -- This will be the username from the users table
-            task TEXT,
-            due_date TEXT,
-            completed INTEGER,
-            created_at TEXT,
-            subject_name TEXT, -- New field to link to subject
-            topic_name TEXT, -- New field to link to topic within a subject
-            FOREIGN KEY (user_id) REFERENCES users(username)
-        )
-    """)
-    # Create subjects table
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS subjects (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id TEXT, -- This will be the username from the users table
-            name TEXT,
-            topics TEXT, -- Stored as JSON string
-            created_at TEXT,
-            FOREIGN KEY (user_id) REFERENCES users(username)
-        )
-    """)
-    conn.commit()
-    conn.close()
-    print("DEBUG: Local SQLite DB initialized with users, tasks, and subjects tables.")
+
+def _ensure_task_archive():
+    """
+    Creates the cold tasks_archive table. It lives outside the versioned migrations because it may
+    sit in a separately attached database file, which must be usable from a fresh, empty file.
+    """
+    def _create(cursor):
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {ARCHIVE_TABLE} (
+                id INTEGER PRIMARY KEY, -- Same id the task had in tasks
+                task TEXT,
+                due_date TEXT,
+                completed INTEGER,
+                created_at TEXT,
+                subject_name TEXT,
+                topic_name TEXT,
+                topic_id INTEGER,
+                completed_at TEXT,
+                user_id TEXT NOT NULL,
+                archived_at TEXT
+            )
+        """)
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {ARCHIVE_SCHEMA}.idx_tasks_archive_user_created ON tasks_archive(user_id, created_at)")
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {ARCHIVE_SCHEMA}.idx_tasks_archive_user_due ON tasks_archive(user_id, due_date)")
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {ARCHIVE_SCHEMA}.idx_tasks_archive_topic ON tasks_archive(topic_id)")
+    db.write(_create)
 
 # Initialize SQLite DB on startup
 init_sqlite_db()
 
 # --- Syllabus Loading Function ---
+
+# Parsed syllabus.json, reused until the file's mtime or size changes
+_syllabus_cache = {"key": None, "data": []}
+_syllabus_lock = threading.Lock()
+
 def load_default_syllabus():
-    """Loads the default syllabus from syllabus.json."""
-    if os.path.exists(SYLLABUS_FILE_PATH):
+    """
+    Loads the default syllabus from syllabus.json. The parsed result is cached and only re-read when
+    the file changes on disk; callers must treat it as read-only.
+    """
+    try:
+        stat = os.stat(SYLLABUS_FILE_PATH)
+    except FileNotFoundError:
+        print(f"WARNING: Default syllabus file not found at {SYLLABUS_FILE_PATH}")
+        return []
+    key = (stat.st_mtime_ns, stat.st_size)
+    with _syllabus_lock:
+        if _syllabus_cache["key"] == key:
+            return _syllabus_cache["data"]
         try:
             with open(SYLLABUS_FILE_PATH, 'r', encoding='utf-8') as f:
                 syllabus_data = json.load(f)
-            print(f"DEBUG: Default syllabus loaded from {SYLLABUS_FILE_PATH}")
-            return syllabus_data
         except Exception as e:
             print(f"ERROR: Failed to load default syllabus from {SYLLABUS_FILE_PATH}: {e}")
             return []
-    else:
-        print(f"WARNING: Default syllabus file not found at {SYLLABUS_FILE_PATH}")
-        return []
+        _syllabus_cache["key"] = key
+        _syllabus_cache["data"] = syllabus_data
+        print(f"DEBUG: Default syllabus loaded from {SYLLABUS_FILE_PATH}")
+        return syllabus_data
+
+def register_syllabus_listener(fn):
+    """Registers fn(user_id), called after a user's subjects or topics are added, seeded, imported or deleted."""
+    _syllabus_listeners.append(fn)
+
+def _notify_syllabus_changed(user_id):
+    # Runs after the commit; a failing listener never fails the write that triggered it
+    for listener in _syllabus_listeners:
+        try:
+            listener(user_id)
+        except Exception as e:
+            print(f"ERROR: Syllabus listener failed for user {user_id}: {e}")
 
 # --- Helper function to seed default subjects ---
-def seed_default_subjects_for_user(user_id):
-    """Adds default subjects from syllabus.json to a user's profile if they have none."""
-    existing_subjects = get_all_subjects(user_id) # Fetch existing subjects for the user
-    
-    if not existing_subjects: # ***CRITICAL CHANGE: Only add if the user has NO subjects yet***
-        print(f"DEBUG: User {user_id} has no existing subjects. Attempting to seed default subjects.")
-        default_subjects = load_default_syllabus()
-        if default_subjects:
-            added_count = 0
-            for subject in default_subjects:
-                topics_list = subject.get('topics', [])
-                add_result = add_subject(user_id, subject['name'], topics_list)
-                if add_result["success"]:
-                    added_count += 1
-                else:
-                    print(f"ERROR: Failed to add default subject '{subject['name']}': {add_result['error']}")
-            
-            if added_count > 0:
-                print(f"DEBUG: Successfully seeded {added_count} default subjects for new user: {user_id}")
-            else:
-                print(f"DEBUG: No default subjects found in {SYLLABUS_FILE_PATH} to seed for user: {user_id}")
-        else:
-            print(f"DEBUG: No default syllabus data found in {SYLLABUS_FILE_PATH} to seed for user: {user_id}")
+def _seed_default_subjects(cursor, user_id):
+    """
+    Seeds syllabus.json subjects inside the caller's transaction and stamps users.seeded_at,
+    so a user is only ever seeded once. Returns the number of subjects added.
+    """
+    cursor.execute("SELECT EXISTS (SELECT 1 FROM subjects WHERE user_id = ?)", (user_id,))
+    if cursor.fetchone()[0]: # Only add if the user has NO subjects yet
+        print(f"DEBUG: User {user_id} already has subjects. Skipping default syllabus seeding.")
+        added = 0
     else:
-        print(f"DEBUG: User {user_id} already has {len(existing_subjects)} subjects. Skipping default syllabus seeding.")
+        default_subjects = load_default_syllabus()
+        added = len(_insert_subjects(cursor, user_id, default_subjects)) if default_subjects else 0
+        print(f"DEBUG: Seeded {added} default subjects for user: {user_id}")
+    cursor.execute("UPDATE users SET seeded_at = ? WHERE username = ?", (datetime.now().isoformat(), user_id))
+    return added
+
+def seed_default_subjects_for_user(user_id):
+    """Adds default subjects from syllabus.json to a user's profile if they have none, in one transaction."""
+    try:
+        added = db.write(lambda cursor: _seed_default_subjects(cursor, user_id))
+        cache.invalidate(user_id)
+        if added:
+            _notify_syllabus_changed(user_id)
+    except Exception as e:
+        print(f"ERROR: Failed to seed default subjects for user {user_id}: {e}")
 
 
 # --- Local User Authentication Functions ---
 
 def signup_user_local(username, password):
-    """Signs up a new local user and stores credentials in SQLite."""
-    conn = sqlite3.connect(LOCAL_DB_PATH)
-    cursor = conn.cursor()
+    """Signs up a new local user (password stored as a KDF hash) and seeds their default syllabus, in one transaction. Uses SQLite."""
     try:
         created_at = datetime.now().isoformat()
-        cursor.execute("INSERT INTO users (username, password, created_at) VALUES (?, ?, ?)",
-                       (username, password, created_at))
-        conn.commit()
+        password_hash = run_kdf(hash_password, password) # Hashed before the write lock is taken
+        # The user row and their default syllabus are written atomically
+        def _insert(cursor):
+            cursor.execute("INSERT INTO users (username, password, created_at) VALUES (?, ?, ?)",
+                           (username, password_hash, created_at))
+            _seed_default_subjects(cursor, username)
+        db.write(_insert)
+        cache.invalidate(username)
+        _notify_syllabus_changed(username)
         print(f"DEBUG: Local user '{username}' signed up successfully.")
-        seed_default_subjects_for_user(username) # Call seeding function after successful signup
         return {"success": True, "user_id": username}
     except sqlite3.IntegrityError:
         print(f"ERROR: Username '{username}' already exists.")
         return {"success": False, "error": "Username already exists. Please choose a different one."}
+    except KdfBusyError as e:
+        print(f"WARNING: Signup for '{username}' turned away, password hashing pool is saturated.")
+        return {"success": False, "error": str(e)}
     except Exception as e:
         print(f"ERROR: Failed to sign up user '{username}': {e}")
         return {"success": False, "error": str(e)}
-    finally:
-        conn.close()
 
 def login_user_local(username, password):
-    """Logs in a local user by checking credentials against SQLite."""
-    conn = sqlite3.connect(LOCAL_DB_PATH)
-    cursor = conn.cursor()
+    """
+    Logs in a local user: one lookup on the unique username index, then password verification on the
+    bounded KDF pool. Legacy plaintext (or outdated) hashes are upgraded in place.
+    Returns {"success", "user_id", "session_token"}; the token lets later reconnects skip the KDF (resume_session).
+    """
     try:
-        cursor.execute("SELECT username FROM users WHERE username = ? AND password = ?", (username, password))
-        user_record = cursor.fetchone()
+        with db.read() as cursor:
+            cursor.execute("SELECT username, password, seeded_at FROM users WHERE username = ?", (username,))
+            user_record = cursor.fetchone()
         if user_record:
-            print(f"DEBUG: Local user '{username}' logged in successfully.")
-            seed_default_subjects_for_user(username) # Call seeding function after login
-            return {"success": True, "user_id": user_record[0]}
+            matches, needs_rehash = run_kdf(verify_password, password, user_record[1])
         else:
+            run_kdf(verify_password, password, DUMMY_PASSWORD_HASH) # Unknown username: same KDF cost as a real check
+            matches, needs_rehash = False, False
+        if not matches:
             print(f"DEBUG: Invalid credentials for user '{username}'.")
             return {"success": False, "error": "Invalid username or password."}
+
+        if needs_rehash:
+            new_hash = run_kdf(hash_password, password)
+            # Only replace the exact value we verified, in case it changed concurrently
+            db.write(lambda cursor: cursor.execute("UPDATE users SET password = ? WHERE username = ? AND password = ?",
+                                                   (new_hash, username, user_record[1])))
+            print(f"DEBUG: Upgraded stored password hash for user '{username}'.")
+        if user_record[2] is None:
+            seed_default_subjects_for_user(username) # Accounts created before seeding at signup: seed once
+        print(f"DEBUG: Local user '{username}' logged in successfully.")
+        return {"success": True, "user_id": user_record[0], "session_token": create_session_token(user_record[0])}
+    except KdfBusyError as e:
+        print(f"WARNING: Login for '{username}' turned away, password hashing pool is saturated.")
+        return {"success": False, "error": str(e)}
     except Exception as e:
         print(f"ERROR: Failed to log in user '{username}': {e}")
         return {"success": False, "error": str(e)}
-    finally:
-        conn.close()
+
+
+# --- Signed Session Tokens ---
+
+SESSION_TTL = timedelta(hours=int(os.getenv("EDUMATE_SESSION_TTL_HOURS", "168")))
+# Resume nonces go in page URLs (history, referrers, logs), so they are one-time and short-lived
+RESUME_NONCE_TTL = timedelta(minutes=int(os.getenv("EDUMATE_RESUME_NONCE_TTL_MINUTES", "30")))
+_session_secret = None
+
+def _get_session_secret():
+    """HMAC key for session tokens: EDUMATE_SESSION_SECRET, else a random key generated once and kept in app_meta."""
+    global _session_secret
+    if _session_secret is None:
+        secret = os.getenv("EDUMATE_SESSION_SECRET")
+        if not secret:
+            def _get_or_create(cursor):
+                cursor.execute("INSERT OR IGNORE INTO app_meta (key, value) VALUES ('session_secret', ?)", (secrets.token_hex(32),))
+                cursor.execute("SELECT value FROM app_meta WHERE key = 'session_secret'")
+                return cursor.fetchone()[0]
+            secret = db.write(_get_or_create)
+        _session_secret = secret.encode("utf-8")
+    return _session_secret
+
+
+def _sign(payload):
+    return hmac.new(_get_session_secret(), payload.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+def session_token_hash(token):
+    """The sessions-table key of a token (tokens themselves are never stored)."""
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def create_session_token(user_id):
+    """Issues a signed token "<user>.<expiry>.<nonce>.<signature>" and records its hash in the sessions table."""
+    expires_at = datetime.now() + SESSION_TTL
+    user_part = base64.urlsafe_b64encode(user_id.encode("utf-8")).decode("ascii")
+    payload = f"{user_part}.{int(expires_at.timestamp())}.{secrets.token_urlsafe(16)}"
+    token = f"{payload}.{_sign(payload)}"
+    db.write(lambda cursor: cursor.execute("INSERT INTO sessions (token_hash, user_id, created_at, expires_at) VALUES (?, ?, ?, ?)",
+                                           (session_token_hash(token), user_id, datetime.now().isoformat(), expires_at.isoformat())))
+    return token
+
+
+def resume_session(token):
+    """
+    Returns {"success": True, "user_id"} for a valid, unexpired, unrevoked token without touching the KDF.
+    Forged or expired tokens are rejected from the signature alone; the rest are checked against the sessions
+    table on every call (one primary-key lookup), so a logout in any process takes effect everywhere at once.
+    """
+    try:
+        payload, signature = token.rsplit(".", 1)
+        user_part, expires_ts, _nonce = payload.split(".")
+        if not hmac.compare_digest(signature, _sign(payload)) or float(expires_ts) < datetime.now().timestamp():
+            return {"success": False, "error": "Session expired. Please log in again."}
+        with db.read() as cursor:
+            cursor.execute("SELECT user_id FROM sessions WHERE token_hash = ?", (session_token_hash(token),))
+            row = cursor.fetchone()
+        if row is None:
+            return {"success": False, "error": "Session expired. Please log in again."}
+        if row[0] != base64.urlsafe_b64decode(user_part).decode("utf-8"):
+            return {"success": False, "error": "Invalid session."}
+        return {"success": True, "user_id": row[0]}
+    except (ValueError, TypeError, AttributeError) as e:
+        print(f"WARNING: Rejected malformed session token: {e}")
+        return {"success": False, "error": "Invalid session."}
+    except Exception as e:
+        print(f"ERROR: Failed to resume session: {e}")
+        return {"success": False, "error": str(e)}
+
+
+def _insert_resume_nonce(cursor, token_hash):
+    nonce = secrets.token_urlsafe(24)
+    cursor.execute("INSERT INTO session_resume_nonces (nonce_hash, token_hash, expires_at) VALUES (?, ?, ?)",
+                   (hashlib.sha256(nonce.encode("utf-8")).hexdigest(), token_hash, (datetime.now() + RESUME_NONCE_TTL).isoformat()))
+    return nonce
+
+
+def create_resume_nonce(token):
+    """
+    Issues a one-time nonce that resumes the token's session after a page refresh (see resume_session_from_nonce).
+    Returns {"success", "nonce", "token_hash"}.
+    """
+    resumed = resume_session(token)
+    if not resumed["success"]:
+        return resumed
+    try:
+        token_hash = session_token_hash(token)
+        nonce = db.write(lambda cursor: _insert_resume_nonce(cursor, token_hash))
+        return {"success": True, "nonce": nonce, "token_hash": token_hash}
+    except Exception as e:
+        print(f"ERROR: Failed to create resume nonce: {e}")
+        return {"success": False, "error": str(e)}
+
+
+def resume_session_from_nonce(nonce):
+    """
+    Redeems a resume nonce: it is consumed, its session must still be unrevoked and unexpired, and a fresh nonce
+    for the same session is issued in its place. Returns {"success", "user_id", "token_hash", "nonce"}.
+    """
+    try:
+        now = datetime.now().isoformat()
+        def _redeem(cursor):
+            nonce_hash = hashlib.sha256(nonce.encode("utf-8")).hexdigest()
+            cursor.execute("""
+                SELECT n.token_hash, s.user_id FROM session_resume_nonces n
+                JOIN sessions s ON s.token_hash = n.token_hash
+                WHERE n.nonce_hash = ? AND n.expires_at >= ? AND s.expires_at >= ?
+            """, (nonce_hash, now, now))
+            row = cursor.fetchone()
+            cursor.execute("DELETE FROM session_resume_nonces WHERE nonce_hash = ?", (nonce_hash,))
+            if row is None:
+                return None
+            return {"success": True, "user_id": row[1], "token_hash": row[0], "nonce": _insert_resume_nonce(cursor, row[0])}
+        resumed = db.write(_redeem)
+        return resumed or {"success": False, "error": "Session expired. Please log in again."}
+    except Exception as e:
+        print(f"ERROR: Failed to resume session from nonce: {e}")
+        return {"success": False, "error": str(e)}
+
+
+def revoke_session(token):
+    """Logs a token out everywhere it is used."""
+    return revoke_session_hash(session_token_hash(token))
+
+
+def revoke_session_hash(token_hash):
+    """Logs the session with this token hash out everywhere, including its outstanding resume nonces."""
+    try:
+        def _delete(cursor):
+            cursor.execute("DELETE FROM sessions WHERE token_hash = ?", (token_hash,))
+            cursor.execute("DELETE FROM session_resume_nonces WHERE token_hash = ?", (token_hash,))
+        db.write(_delete)
+        return {"success": True}
+    except Exception as e:
+        print(f"ERROR: Failed to revoke session: {e}")
+        return {"success": False, "error": str(e)}
+
+
+def purge_expired_sessions():
+    """Deletes expired rows from the sessions and resume nonce tables. Returns the number of sessions removed."""
+    try:
+        now = datetime.now().isoformat()
+        def _purge(cursor):
+            cursor.execute("DELETE FROM sessions WHERE expires_at < ?", (now,))
+            removed = cursor.rowcount
+            cursor.execute("DELETE FROM session_resume_nonces WHERE expires_at < ?", (now,))
+            _mark_maintenance_run(cursor, "sessions_purged_at")
+            return removed
+        removed = db.write(_purge)
+        print(f"DEBUG: Purged {removed} expired sessions.")
+        return removed
+    except Exception as e:
+        print(f"ERROR: Failed to purge expired sessions: {e}")
+        return 0
 
 
 # --- Functions for Tasks (SQLite Only) ---
 
+def normalize_due_date(due_date):
+    """
+    Returns a due date (date, datetime or string) in the indexable ISO 'YYYY-MM-DD' form used by the tasks table.
+    None or "" (no due date) becomes None; anything unparseable raises ValueError, so due-date order stays chronological.
+    """
+    if due_date is None or (isinstance(due_date, str) and not due_date.strip()):
+        return None
+    if hasattr(due_date, "strftime"):
+        return due_date.strftime("%Y-%m-%d")
+    if isinstance(due_date, str):
+        for fmt in DUE_DATE_INPUT_FORMATS:
+            try:
+                return datetime.strptime(due_date.strip(), fmt).strftime("%Y-%m-%d")
+            except ValueError:
+                continue
+    raise ValueError(f"Unrecognized due date: {due_date!r}")
+
+
 def add_task(user_id, task_description, due_date_str, subject_name=None, topic_name=None):
     """Adds a new task for a specific user. Uses SQLite."""
     try:
-        conn = sqlite3.connect(LOCAL_DB_PATH)
-        cursor = conn.cursor()
         created_at = datetime.now().isoformat()
-        cursor.execute("INSERT INTO tasks (user_id, task, due_date, completed, created_at, subject_name, topic_name) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                       (user_id, task_description, due_date_str, 0, created_at, subject_name, topic_name))
-        conn.commit()
-        task_id = cursor.lastrowid
-        conn.close()
+        def _insert(cursor):
+            topic_id = _find_topic_id(cursor, user_id, subject_name, topic_name)
+            cursor.execute("INSERT INTO tasks (user_id, task, due_date, completed, created_at, subject_name, topic_name, topic_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                           (user_id, task_description, normalize_due_date(due_date_str), 0, created_at, subject_name, topic_name, topic_id))
+            return cursor.lastrowid
+        task_id = db.write(_insert)
+        cache.invalidate(user_id)
         print(f"DEBUG: SQLite Task added with ID: {task_id} for user: {user_id}")
         return {"success": True, "id": task_id}
     except Exception as e:
@@ -174,26 +412,52 @@ def add_task(user_id, task_description, due_date_str, subject_name=None, topic_n
         return {"success": False, "error": str(e)}
 
 
-def get_tasks(user_id):
-    """Retrieves all tasks for a specific user. Uses SQLite."""
+TASK_COLUMNS = "id, task, due_date, completed, created_at, subject_name, topic_name, topic_id, completed_at"
+
+def _task_from_row(row):
+    """Converts a SELECT TASK_COLUMNS row into the task dict used throughout the app."""
+    return {
+        "id": row[0],
+        "task": row[1],
+        "due_date": row[2],
+        "completed": bool(row[3]),
+        "created_at": datetime.fromisoformat(row[4]) if row[4] else datetime.min,
+        "subject_name": row[5], # New field
+        "topic_name": row[6], # New field
+        "topic_id": row[7],
+        "completed_at": row[8]
+    }
+
+
+def _with_archive(where, params, include_archived):
+    """
+    Returns (FROM-clause body, params) selecting TASK_COLUMNS from tasks, plus tasks_archive when asked.
+    Rows caught mid-archival (present in both tables) are only returned once, from tasks.
+    """
+    hot = f"SELECT {TASK_COLUMNS} FROM tasks WHERE {where}"
+    if not include_archived:
+        return hot, list(params)
+    cold = f"SELECT {TASK_COLUMNS} FROM {ARCHIVE_TABLE} a WHERE {where} AND NOT EXISTS (SELECT 1 FROM tasks t WHERE t.id = a.id)"
+    return f"{hot} UNION ALL {cold}", list(params) * 2
+
+
+@cache.cached
+def _load_tasks(user_id, include_archived):
+    query, params = _with_archive("user_id = ?", [user_id], include_archived)
+    with db.read() as cursor:
+        cursor.execute(f"{query} ORDER BY created_at, id", params)
+        rows = cursor.fetchall()
+    return [_task_from_row(row) for row in rows]
+
+
+def get_tasks(user_id, include_archived=False):
+    """
+    Retrieves all tasks for a specific user, oldest first. Uses SQLite (through the read cache).
+    Archived (long-completed) tasks are only included when include_archived is True.
+    """
     tasks = []
     try:
-        conn = sqlite3.connect(LOCAL_DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute("SELECT id, task, due_date, completed, created_at, subject_name, topic_name FROM tasks WHERE user_id = ?", (user_id,))
-        rows = cursor.fetchall()
-        conn.close()
-        for row in rows:
-            tasks.append({
-                "id": row[0],
-                "task": row[1],
-                "due_date": row[2],
-                "completed": bool(row[3]),
-                "created_at": datetime.fromisoformat(row[4]) if row[4] else datetime.min,
-                "subject_name": row[5], # New field
-                "topic_name": row[6] # New field
-            })
-        tasks.sort(key=lambda x: x.get("created_at", datetime.min), reverse=False)
+        tasks = _load_tasks(user_id, include_archived)
         print(f"DEBUG: Retrieved {len(tasks)} SQLite tasks for user: {user_id}.")
     except Exception as e:
         print(f"ERROR: Failed to get SQLite tasks for user {user_id}: {e}")
@@ -201,14 +465,96 @@ def get_tasks(user_id):
     return tasks
 
 
+TASK_SORT_COLUMNS = ("created_at", "due_date")
+
+def query_tasks(user_id, status=None, due_from=None, due_to=None, subject_name=None, topic_name=None,
+                topic_id=None, order_by="created_at", limit=50, after=None, include_archived=False):
+    """
+    Retrieves a filtered, sorted page of a user's tasks. Filtering, sorting and paging all happen in SQL.
+
+    status: None/"all", "pending" or "completed". due_from/due_to: inclusive due-date window.
+    order_by: "created_at" or "due_date" (ascending, rows without a value last, ties broken by id).
+    limit: page size, or None for every matching row.
+    after: the "next_cursor" returned with the previous page (keyset pagination, no OFFSET scans).
+    include_archived: also search tasks_archive (completed tasks moved out by archive_completed_tasks).
+
+    Returns {"tasks": [...], "next_cursor": cursor or None when there are no more rows}.
+    Pages are served from the read cache until the user's next write.
+    """
+    if order_by not in TASK_SORT_COLUMNS:
+        raise ValueError(f"order_by must be one of {TASK_SORT_COLUMNS}, got {order_by!r}")
+
+    conditions = ["user_id = ?"]
+    params = [user_id]
+    if status == "pending":
+        conditions.append("completed = 0")
+    elif status == "completed":
+        conditions.append("completed = 1")
+    if due_from is not None:
+        conditions.append("due_date >= ?")
+        params.append(normalize_due_date(due_from))
+    if due_to is not None:
+        conditions.append("due_date <= ?")
+        params.append(normalize_due_date(due_to))
+    if subject_name is not None:
+        conditions.append("subject_name = ?")
+        params.append(subject_name)
+    if topic_name is not None:
+        conditions.append("topic_name = ?")
+        params.append(topic_name)
+    if topic_id is not None:
+        conditions.append("topic_id = ?")
+        params.append(topic_id)
+    if after is not None:
+        # Rows sort as ({order_by} IS NULL, {order_by}, id): the NULL tier comes last and is paged by id alone
+        # (a row comparison with NULL is never true)
+        after_value, after_id = after
+        if after_value is None:
+            conditions.append(f"{order_by} IS NULL AND id > ?")
+            params.append(after_id)
+        else:
+            conditions.append(f"({order_by} IS NULL OR ({order_by}, id) > (?, ?))")
+            params.extend((after_value, after_id))
+
+    # Archived tasks are all completed, so a pending-only query never needs the archive
+    query, params = _with_archive(' AND '.join(conditions), params, include_archived and status != "pending")
+    # Wrapped so the ORDER BY expression also works on the archive UNION ALL
+    query = f"SELECT * FROM ({query}) ORDER BY {order_by} IS NULL, {order_by}, id"
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit + 1) # One extra row tells us whether another page exists
+
+    try:
+        return _run_task_query(user_id, query, tuple(params), limit, order_by)
+    except Exception as e:
+        print(f"ERROR: Failed to query SQLite tasks for user {user_id}: {e}")
+        return {"tasks": [], "next_cursor": None}
+
+
+@cache.cached
+def _run_task_query(user_id, query, params, limit, order_by):
+    with db.read() as cursor:
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = (last[4] if order_by == "created_at" else last[2], last[0])
+    return {"tasks": [_task_from_row(row) for row in rows], "next_cursor": next_cursor}
+
+
 def mark_task_completed(user_id, task_id):
-    """Marks a task as completed. Uses SQLite."""
+    """Marks a task as completed and journals the completion. Uses SQLite."""
     try:
-        conn = sqlite3.connect(LOCAL_DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute("UPDATE tasks SET completed = ? WHERE id = ? AND user_id = ?", (1, task_id, user_id))
-        conn.commit()
-        conn.close()
+        def _complete(cursor):
+            cursor.execute("UPDATE tasks SET completed = 1, completed_at = ? WHERE id = ? AND user_id = ? AND completed = 0",
+                           (datetime.now().isoformat(), task_id, user_id))
+            if cursor.rowcount:
+                _record_activity(cursor, user_id, "task_completed", ref=task_id)
+        db.write(_complete)
+        cache.invalidate(user_id)
         print(f"DEBUG: SQLite Task {task_id} marked completed for user: {user_id}.")
         return {"success": True}
     except Exception as e:
@@ -217,13 +563,13 @@ def mark_task_completed(user_id, task_id):
 
 
 def delete_task(user_id, task_id):
-    """Deletes a task. Uses SQLite."""
+    """Deletes a task, whether it is still in tasks or already archived. Uses SQLite."""
     try:
-        conn = sqlite3.connect(LOCAL_DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM tasks WHERE id = ? AND user_id = ?", (task_id, user_id))
-        conn.commit()
-        conn.close()
+        def _delete(cursor):
+            cursor.execute("DELETE FROM tasks WHERE id = ? AND user_id = ?", (task_id, user_id))
+            cursor.execute(f"DELETE FROM {ARCHIVE_TABLE} WHERE id = ? AND user_id = ?", (task_id, user_id))
+        db.write(_delete)
+        cache.invalidate(user_id)
         print(f"DEBUG: SQLite Task {task_id} deleted for user: {user_id}.")
         return {"success": True}
     except Exception as e:
@@ -231,20 +577,86 @@ def delete_task(user_id, task_id):
         return {"success": False, "error": str(e)}
 
 
+def add_tasks_bulk(user_id, tasks_list):
+    """
+    Adds many tasks in one transaction with executemany. Uses SQLite.
+    tasks_list: [{"task", "due_date", "subject_name" (optional), "topic_name" (optional)}]
+    """
+    try:
+        created_at = datetime.now().isoformat()
+        def _insert_all(cursor):
+            topic_ids = {}
+            rows = []
+            for task in tasks_list:
+                key = (task.get("subject_name"), task.get("topic_name"))
+                if key not in topic_ids:
+                    topic_ids[key] = _find_topic_id(cursor, user_id, *key)
+                rows.append((user_id, task["task"], normalize_due_date(task["due_date"]), 0, created_at,
+                             key[0], key[1], topic_ids[key]))
+            cursor.executemany("INSERT INTO tasks (user_id, task, due_date, completed, created_at, subject_name, topic_name, topic_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                               rows)
+            return rows
+        rows = db.write(_insert_all)
+        cache.invalidate(user_id)
+        print(f"DEBUG: {len(rows)} SQLite tasks added in bulk for user: {user_id}")
+        return {"success": True, "count": len(rows)}
+    except Exception as e:
+        print(f"ERROR: Failed to bulk add SQLite tasks for user {user_id}: {e}")
+        return {"success": False, "error": str(e)}
+
+
+def mark_tasks_completed_bulk(user_id, task_ids):
+    """
+    Marks many tasks as completed in one transaction and journals each newly completed one. Uses SQLite.
+    "count" is the number of tasks that were still pending (already completed or unknown ids are skipped).
+    """
+    try:
+        completed_at = datetime.now().isoformat()
+        ids = list(dict.fromkeys(task_ids))
+        def _complete_all(cursor):
+            newly_completed = []
+            # One SELECT + one UPDATE per chunk of ids; already completed or foreign tasks are left alone
+            for i in range(0, len(ids), SQL_VARIABLE_CHUNK):
+                part = ids[i:i + SQL_VARIABLE_CHUNK]
+                condition = f"id IN ({', '.join('?' * len(part))}) AND user_id = ? AND completed = 0"
+                cursor.execute(f"SELECT id FROM tasks WHERE {condition} ORDER BY id", part + [user_id])
+                newly_completed.extend(row[0] for row in cursor.fetchall())
+                cursor.execute(f"UPDATE tasks SET completed = 1, completed_at = ? WHERE {condition}", [completed_at] + part + [user_id])
+            _record_activities(cursor, user_id, "task_completed", [(task_id, None) for task_id in newly_completed])
+            return newly_completed
+        newly_completed = db.write(_complete_all)
+        cache.invalidate(user_id)
+        print(f"DEBUG: {len(newly_completed)} SQLite tasks marked completed in bulk for user: {user_id}.")
+        return {"success": True, "count": len(newly_completed)}
+    except Exception as e:
+        print(f"ERROR: Failed to bulk mark SQLite tasks completed for user {user_id}: {e}")
+        return {"success": False, "error": str(e)}
+
+
+def delete_tasks_bulk(user_id, task_ids):
+    """Deletes many tasks (live or archived) in one transaction. Uses SQLite."""
+    try:
+        def _delete_all(cursor):
+            rows = [(task_id, user_id) for task_id in task_ids]
+            cursor.executemany("DELETE FROM tasks WHERE id = ? AND user_id = ?", rows)
+            cursor.executemany(f"DELETE FROM {ARCHIVE_TABLE} WHERE id = ? AND user_id = ?", rows)
+        db.write(_delete_all)
+        cache.invalidate(user_id)
+        print(f"DEBUG: {len(task_ids)} SQLite tasks deleted in bulk for user: {user_id}.")
+        return {"success": True, "count": len(task_ids)}
+    except Exception as e:
+        print(f"ERROR: Failed to bulk delete SQLite tasks for user {user_id}: {e}")
+        return {"success": False, "error": str(e)}
+
+
 # --- Functions for Subjects (SQLite Only) ---
 
 def add_subject(user_id, subject_name, topics_list):
-    """Adds a new subject. Uses SQLite."""
-    topics_str = json.dumps(topics_list) # Store list as JSON string
+    """Adds a new subject and its topics (one row per topic). Uses SQLite."""
     try:
-        conn = sqlite3.connect(LOCAL_DB_PATH)
-        cursor = conn.cursor()
-        created_at = datetime.now().isoformat()
-        cursor.execute("INSERT INTO subjects (user_id, name, topics, created_at) VALUES (?, ?, ?, ?)",
-                       (user_id, subject_name, topics_str, created_at))
-        conn.commit()
-        subject_id = cursor.lastrowid
-        conn.close()
+        subject_id = db.write(lambda cursor: _insert_subjects(cursor, user_id, [{"name": subject_name, "topics": topics_list}])[0])
+        cache.invalidate(user_id)
+        _notify_syllabus_changed(user_id)
         print(f"DEBUG: SQLite Subject '{subject_name}' added with ID: {subject_id} for user: {user_id}")
         return {"success": True, "id": subject_id}
     except Exception as e:
@@ -252,23 +664,81 @@ def add_subject(user_id, subject_name, topics_list):
         return {"success": False, "error": str(e)}
 
 
-def get_all_subjects(user_id):
-    """Retrieves all subjects. Uses SQLite."""
-    subjects = []
+def _insert_subjects(cursor, user_id, subjects_list):
+    """
+    Inserts subjects (one row each, for cursor.lastrowid) and their topics with one executemany, then links
+    the user's tasks left without a topic (see delete_subject) to matching new topics. Returns the new subject ids.
+    """
+    created_at = datetime.now().isoformat()
+    subject_ids = []
+    for subject in subjects_list:
+        cursor.execute("INSERT INTO subjects (user_id, name, created_at) VALUES (?, ?, ?)",
+                       (user_id, subject["name"], created_at))
+        subject_ids.append(cursor.lastrowid)
+    cursor.executemany("INSERT INTO topics (subject_id, name, position) VALUES (?, ?, ?)",
+                       [(subject_id, topic, position)
+                        for subject_id, subject in zip(subject_ids, subjects_list)
+                        for position, topic in enumerate(subject.get("topics", []))])
+    names = {(subject["name"], topic) for subject in subjects_list for topic in subject.get("topics", [])}
+    for table in ("tasks", ARCHIVE_TABLE):
+        # Same topic _find_topic_id picks for new tasks with these names
+        cursor.executemany(f"""
+            UPDATE {table} SET topic_id = (
+                SELECT t.id FROM subjects s JOIN topics t ON t.subject_id = s.id
+                WHERE s.user_id = ? AND s.name = ? AND t.name = ?
+                ORDER BY t.id LIMIT 1)
+            WHERE user_id = ? AND topic_id IS NULL AND subject_name = ? AND topic_name = ?
+        """, [(user_id, subject_name, topic_name, user_id, subject_name, topic_name) for subject_name, topic_name in names])
+    return subject_ids
+
+
+def add_subjects_bulk(user_id, subjects_list):
+    """
+    Adds many subjects (and their topics) in one transaction. Uses SQLite.
+    subjects_list: [{"name", "topics": [...]}], the same shape as syllabus.json
+    """
     try:
-        conn = sqlite3.connect(LOCAL_DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute("SELECT id, name, topics, created_at FROM subjects WHERE user_id = ?", (user_id,))
+        subject_ids = db.write(lambda cursor: _insert_subjects(cursor, user_id, subjects_list))
+        cache.invalidate(user_id)
+        _notify_syllabus_changed(user_id)
+        print(f"DEBUG: {len(subject_ids)} SQLite subjects added in bulk for user: {user_id}")
+        return {"success": True, "ids": subject_ids}
+    except Exception as e:
+        print(f"ERROR: Failed to bulk add SQLite subjects for user {user_id}: {e}")
+        return {"success": False, "error": str(e)}
+
+
+@cache.cached
+def _load_subjects(user_id):
+    with db.read() as cursor:
+        cursor.execute("""
+            SELECT s.id, s.name, s.created_at, t.id, t.name
+            FROM subjects s LEFT JOIN topics t ON t.subject_id = s.id
+            WHERE s.user_id = ?
+            ORDER BY s.created_at, s.id, t.position
+        """, (user_id,))
         rows = cursor.fetchall()
-        conn.close()
-        for row in rows:
+    subjects = []
+    for subject_id, name, created_at, topic_id, topic_name in rows:
+        if not subjects or subjects[-1]["id"] != subject_id:
             subjects.append({
-                "id": row[0],
-                "name": row[1],
-                "topics": json.loads(row[2]) if row[2] else [], # Parse topics from JSON string
-                "created_at": datetime.fromisoformat(row[3]) if row[3] else datetime.min
+                "id": subject_id,
+                "name": name,
+                "topics": [],
+                "topic_ids": [],
+                "created_at": datetime.fromisoformat(created_at) if created_at else datetime.min
             })
-        subjects.sort(key=lambda x: x.get("created_at", datetime.min), reverse=False)
+        if topic_id is not None:
+            subjects[-1]["topics"].append(topic_name)
+            subjects[-1]["topic_ids"].append(topic_id)
+    return subjects
+
+
+def get_all_subjects(user_id):
+    """Retrieves all subjects with their topics in a single indexed join. Uses SQLite (through the read cache)."""
+    subjects = []
+    try:
+        subjects = _load_subjects(user_id)
         print(f"DEBUG: Retrieved {len(subjects)} SQLite subjects for user: {user_id}.")
     except Exception as e:
         print(f"ERROR: Failed to get SQLite subjects for user {user_id}: {e}")
@@ -276,15 +746,941 @@ def get_all_subjects(user_id):
     return subjects
 
 def delete_subject(user_id, subject_id):
-    """Deletes a subject. Uses SQLite."""
+    """
+    Deletes a subject with its topics; tasks filed under those topics keep their subject/topic names but lose
+    their topic_id until a subject with a matching topic is added again. Uses SQLite. Foreign keys are not enforced on pooled connections, so the cascade is done here.
+    """
     try:
-        conn = sqlite3.connect(LOCAL_DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM subjects WHERE id = ? AND user_id = ?", (subject_id, user_id))
-        conn.commit()
-        conn.close()
+        def _delete(cursor):
+            cursor.execute("DELETE FROM subjects WHERE id = ? AND user_id = ?", (subject_id, user_id))
+            if cursor.rowcount:
+                for table in ("tasks", ARCHIVE_TABLE):
+                    cursor.execute(f"UPDATE {table} SET topic_id = NULL WHERE topic_id IN (SELECT id FROM topics WHERE subject_id = ?)",
+                                   (subject_id,))
+                cursor.execute("DELETE FROM topics WHERE subject_id = ?", (subject_id,))
+        db.write(_delete)
+        cache.invalidate(user_id)
+        _notify_syllabus_changed(user_id)
         print(f"DEBUG: SQLite Subject {subject_id} deleted for user: {user_id}.")
         return {"success": True}
     except Exception as e:
         print(f"ERROR: Failed to delete SQLite subject {subject_id} for user {user_id}: {e}")
-        return {"success": False, "error": str(e)}
\ No newline at end of file
+        return {"success": False, "error": str(e)}
+
+
+# --- Functions for Topics (SQLite Only) ---
+
+def _find_topic_id(cursor, user_id, subject_name, topic_name):
+    """Resolves a (subject name, topic name) pair to the user's topic row id, or None."""
+    if not subject_name or not topic_name:
+        return None
+    cursor.execute("""
+        SELECT t.id FROM subjects s JOIN topics t ON t.subject_id = s.id
+        WHERE s.user_id = ? AND s.name = ? AND t.name = ?
+        ORDER BY t.id LIMIT 1
+    """, (user_id, subject_name, topic_name))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+@cache.cached
+def _load_topic_id(user_id, subject_name, topic_name):
+    with db.read() as cursor:
+        return _find_topic_id(cursor, user_id, subject_name, topic_name)
+
+
+def find_topic(user_id, subject_name, topic_name):
+    """Looks up a single topic of the user's syllabus by subject and topic name. Returns a dict or None."""
+    try:
+        topic_id = _load_topic_id(user_id, subject_name, topic_name)
+        if topic_id is None:
+            return None
+        return {"id": topic_id, "subject_name": subject_name, "name": topic_name}
+    except Exception as e:
+        print(f"ERROR: Failed to look up topic '{topic_name}' for user {user_id}: {e}")
+        return None
+
+
+def get_all_topics(user_id=None):
+    """
+    Retrieves topics joined with their subject, for one user or (user_id=None) every user.
+    Used by RAG indexing so it does not have to parse per-subject topic lists.
+    """
+    topics = []
+    try:
+        query = """
+            SELECT t.id, t.name, s.id, s.name, s.user_id
+            FROM topics t JOIN subjects s ON s.id = t.subject_id
+        """
+        params = ()
+        if user_id is not None:
+            query += " WHERE s.user_id = ?"
+            params = (user_id,)
+        query += " ORDER BY s.user_id, s.created_at, s.id, t.position"
+        with db.read() as cursor:
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+        for topic_id, name, subject_id, subject_name, owner_id in rows:
+            topics.append({
+                "id": topic_id,
+                "name": name,
+                "subject_id": subject_id,
+                "subject_name": subject_name,
+                "user_id": owner_id
+            })
+        print(f"DEBUG: Retrieved {len(topics)} SQLite topics for user: {user_id if user_id is not None else 'all users'}.")
+    except Exception as e:
+        print(f"ERROR: Failed to get SQLite topics for user {user_id}: {e}")
+        topics = []
+    return topics
+
+
+@cache.cached
+def _load_topic_progress(user_id, include_archived):
+    with db.read() as cursor:
+        cursor.execute(f"""
+            SELECT s.id, s.name, t.id, t.name,
+                   EXISTS (SELECT 1 FROM tasks tk WHERE tk.topic_id = t.id AND tk.completed = 1)
+                   OR (? AND EXISTS (SELECT 1 FROM {ARCHIVE_TABLE} ta WHERE ta.topic_id = t.id))
+            FROM subjects s LEFT JOIN topics t ON t.subject_id = s.id
+            WHERE s.user_id = ?
+            ORDER BY s.created_at, s.id, t.position
+        """, (int(include_archived), user_id))
+        rows = cursor.fetchall()
+    subjects = []
+    for subject_id, subject_name, topic_id, topic_name, completed in rows:
+        if not subjects or subjects[-1]["id"] != subject_id:
+            subjects.append({"id": subject_id, "name": subject_name, "topics": [],
+                             "completed_count": 0, "total_count": 0})
+        if topic_id is not None:
+            subjects[-1]["topics"].append({"id": topic_id, "name": topic_name, "completed": bool(completed)})
+            subjects[-1]["total_count"] += 1
+            subjects[-1]["completed_count"] += 1 if completed else 0
+    return subjects
+
+
+def get_topic_progress(user_id, include_archived=False):
+    """
+    Returns the user's subjects with per-topic completion, computed by SQL:
+    a topic counts as completed when at least one completed task is linked to it
+    (including archived tasks when include_archived is True).
+    Format: [{"id", "name", "topics": [{"id", "name", "completed"}], "completed_count", "total_count"}]
+    """
+    try:
+        return _load_topic_progress(user_id, include_archived)
+    except Exception as e:
+        print(f"ERROR: Failed to get topic progress for user {user_id}: {e}")
+        return []
+
+
+# --- Functions for Quiz History (SQLite Only) ---
+
+QUIZ_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+def save_quiz_attempt(user_id, topic, score_data):
+    """Stores a quiz attempt and its per-question results in one transaction. Uses SQLite."""
+    try:
+        taken_at = datetime.now().strftime(QUIZ_DATE_FORMAT)
+        def _insert(cursor):
+            cursor.execute("""
+                INSERT INTO quiz_attempts (user_id, topic, taken_at, score_percentage, grade, total_questions, correct_answers)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (user_id, topic, taken_at, score_data['score_percentage'], score_data['grade'],
+                  score_data['total_questions'], score_data['correct_answers']))
+            attempt_id = cursor.lastrowid
+            cursor.executemany("""
+                INSERT INTO quiz_question_results (attempt_id, question_num, question, user_answer, correct_answer, is_correct, explanation)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, [(attempt_id, r['question_num'], r['question'], str(r['user_answer']), str(r['correct_answer']),
+                   int(r['is_correct']), r.get('explanation', '')) for r in score_data.get('detailed_results', [])])
+            _record_activity(cursor, user_id, "quiz_taken", ref=attempt_id, value=score_data['score_percentage'])
+            return attempt_id
+        attempt_id = db.write(_insert)
+        cache.invalidate(user_id)
+        print(f"DEBUG: Quiz attempt {attempt_id} on '{topic}' saved for user: {user_id}")
+        return {"success": True, "id": attempt_id}
+    except Exception as e:
+        print(f"ERROR: Failed to save quiz attempt for user {user_id}: {e}")
+        return {"success": False, "error": str(e)}
+
+
+@cache.cached
+def _load_quiz_history(user_id, limit):
+    query = """
+        SELECT id, topic, taken_at, score_percentage, grade, total_questions, correct_answers
+        FROM quiz_attempts WHERE user_id = ? ORDER BY taken_at DESC, id DESC
+    """
+    params = (user_id,)
+    if limit is not None:
+        query += " LIMIT ?"
+        params += (limit,)
+    with db.read() as cursor:
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+    rows.reverse() # Oldest first, matching the order attempts were taken in
+    return [{
+        "id": row[0],
+        "topic": row[1],
+        "date": row[2],
+        "score_percentage": row[3],
+        "grade": row[4],
+        "total_questions": row[5],
+        "correct_answers": row[6]
+    } for row in rows]
+
+
+def get_quiz_history(user_id, limit=None):
+    """Retrieves the user's quiz attempts, oldest first (limit keeps only the most recent N). Uses SQLite."""
+    try:
+        return _load_quiz_history(user_id, limit)
+    except Exception as e:
+        print(f"ERROR: Failed to get quiz history for user {user_id}: {e}")
+        return []
+
+
+@cache.cached
+def _load_quiz_stats(user_id, since):
+    query = """
+        SELECT COUNT(*), AVG(score_percentage), MAX(score_percentage),
+               (SELECT score_percentage FROM quiz_attempts WHERE user_id = ?1 AND taken_at >= ?2
+                ORDER BY taken_at DESC, id DESC LIMIT 1)
+        FROM quiz_attempts WHERE user_id = ?1 AND taken_at >= ?2
+    """
+    with db.read() as cursor:
+        cursor.execute(query, (user_id, since or ""))
+        count, average, best, latest = cursor.fetchone()
+    return {"count": count, "average_score": average or 0.0, "best_score": best or 0.0, "latest_score": latest or 0.0}
+
+
+def get_quiz_stats(user_id, since=None):
+    """
+    Aggregates the user's quiz attempts in SQL: {"count", "average_score", "best_score", "latest_score"}.
+    since: optional datetime; only attempts taken at or after it are counted.
+    """
+    try:
+        return _load_quiz_stats(user_id, since.strftime(QUIZ_DATE_FORMAT) if since else None)
+    except Exception as e:
+        print(f"ERROR: Failed to get quiz stats for user {user_id}: {e}")
+        return {"count": 0, "average_score": 0.0, "best_score": 0.0, "latest_score": 0.0}
+
+
+# --- Functions for Study Plan Task Completions (SQLite Only) ---
+
+def set_plan_task_completion(user_id, task_key, completed):
+    """Records whether a study-plan task is completed (upsert). Uses SQLite."""
+    try:
+        completed_at = datetime.now().isoformat() if completed else None
+        def _upsert(cursor):
+            cursor.execute("""
+                INSERT INTO plan_task_completions (user_id, task_key, completed, completed_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT (user_id, task_key) DO UPDATE SET completed = excluded.completed, completed_at = excluded.completed_at
+            """, (user_id, task_key, int(completed), completed_at))
+            if completed:
+                _record_activity(cursor, user_id, "plan_task_completed", ref=task_key)
+        db.write(_upsert)
+        cache.invalidate(user_id)
+        return {"success": True}
+    except Exception as e:
+        print(f"ERROR: Failed to save plan task completion '{task_key}' for user {user_id}: {e}")
+        return {"success": False, "error": str(e)}
+
+
+@cache.cached
+def _load_plan_task_completions(user_id, key_prefix):
+    with db.read() as cursor:
+        # Range scan on the (user_id, task_key) primary key instead of LIKE
+        cursor.execute("""
+            SELECT task_key, completed_at FROM plan_task_completions
+            WHERE user_id = ? AND task_key >= ? AND task_key < ? AND completed = 1
+        """, (user_id, key_prefix, key_prefix + "\uffff"))
+        return dict(cursor.fetchall())
+
+
+def get_plan_task_completions(user_id, key_prefix=""):
+    """Returns {task_key: completed_at} for the user's completed plan tasks whose key starts with key_prefix."""
+    try:
+        return _load_plan_task_completions(user_id, key_prefix)
+    except Exception as e:
+        print(f"ERROR: Failed to get plan task completions for user {user_id}: {e}")
+        return {}
+
+
+# --- Saved Artifacts and Full-Text Search (SQLite Only) ---
+
+ARTIFACT_KINDS = ("summary", "flashcards", "chat_message")
+
+def save_artifact(user_id, kind, content, title=None):
+    """Persists a generated summary, flashcard set or chat message so it shows up in search. Uses SQLite."""
+    if kind not in ARTIFACT_KINDS:
+        raise ValueError(f"Unknown artifact kind: {kind}")
+    try:
+        created_at = datetime.now().isoformat()
+        artifact_id = db.write(lambda cursor: cursor.execute(
+            "INSERT INTO saved_artifacts (user_id, kind, title, content, created_at) VALUES (?, ?, ?, ?, ?)",
+            (user_id, kind, title, content, created_at)).lastrowid)
+        cache.invalidate(user_id)
+        return {"success": True, "id": artifact_id}
+    except Exception as e:
+        print(f"ERROR: Failed to save {kind} artifact for user {user_id}: {e}")
+        return {"success": False, "error": str(e)}
+
+
+def _fts_query(query):
+    """
+    Turns free text into a safe FTS5 MATCH expression: every word must match (quoted, so FTS
+    operators and punctuation in user input are taken literally) and the last word matches as a prefix.
+    """
+    words = re.findall(r"\w+", query)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+@cache.cached
+def _run_search(user_id, match, limit):
+    with db.read() as cursor:
+        # Title hits rank above body hits (bm25 column weights)
+        cursor.execute("""
+            SELECT rowid, kind, title, snippet(search_index, 1, '**', '**', '…', 12)
+            FROM search_index
+            WHERE search_index MATCH ? AND user_id = ?
+            ORDER BY bm25(search_index, 10.0, 1.0)
+            LIMIT ?
+        """, (match, user_id, limit))
+        rows = cursor.fetchall()
+    return [{
+        "id": rowid // SEARCH_KIND_COUNT,
+        "source": SEARCH_KINDS[rowid % SEARCH_KIND_COUNT], # Table the hit came from: task, subject, topic or artifact
+        "kind": kind, # task, subject, topic, or the artifact's kind (summary, flashcards, chat_message)
+        "title": title,
+        "snippet": snippet
+    } for rowid, kind, title, snippet in rows]
+
+
+def search(user_id, query, limit=20):
+    """
+    Full-text search over the user's tasks, subjects, topics and saved artifacts through the FTS5 index.
+    Returns up to `limit` hits, best first: [{"id", "source", "kind", "title", "snippet"}].
+    """
+    match = _fts_query(query or "")
+    if match is None:
+        return []
+    try:
+        return _run_search(user_id, match, limit)
+    except Exception as e:
+        print(f"ERROR: Search for '{query}' failed for user {user_id}: {e}")
+        return []
+
+
+# --- Activity Journal and Daily Rollups (SQLite Only) ---
+
+ACTIVITY_EVENT_TYPES = ("task_completed", "plan_task_completed", "quiz_taken", "flashcards_reviewed")
+ACTIVITY_RETENTION_DAYS = int(os.getenv("EDUMATE_ACTIVITY_RETENTION_DAYS", "180")) # Raw events older than this are compacted away
+ACTIVITY_COMPACTION_INTERVAL = timedelta(days=1)
+
+def _record_activities(cursor, user_id, event_type, refs_and_values, occurred_at=None):
+    """
+    Appends events to the journal and folds them into today's activity_daily row, inside the caller's
+    transaction. refs_and_values: [(ref, value)]. Rollups are updated incrementally, never recomputed.
+    """
+    if event_type not in ACTIVITY_EVENT_TYPES:
+        raise ValueError(f"Unknown activity event type: {event_type}")
+    if not refs_and_values:
+        return
+    occurred_at = occurred_at or datetime.now()
+    timestamp = occurred_at.isoformat()
+    cursor.executemany("INSERT INTO activity_events (user_id, event_type, ref, value, occurred_at) VALUES (?, ?, ?, ?, ?)",
+                       [(user_id, event_type, None if ref is None else str(ref), value, timestamp)
+                        for ref, value in refs_and_values])
+
+    values = [value or 0 for _, value in refs_and_values]
+    count = len(refs_and_values)
+    tasks = count if event_type in ("task_completed", "plan_task_completed") else 0
+    quizzes = count if event_type == "quiz_taken" else 0
+    score_sum = sum(values) if event_type == "quiz_taken" else 0
+    flashcards = int(sum(values)) if event_type == "flashcards_reviewed" else 0
+    cursor.execute("""
+        INSERT INTO activity_daily (user_id, day, tasks_completed, quizzes_taken, quiz_score_sum, flashcards_reviewed, events)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (user_id, day) DO UPDATE SET
+            tasks_completed = tasks_completed + excluded.tasks_completed,
+            quizzes_taken = quizzes_taken + excluded.quizzes_taken,
+            quiz_score_sum = quiz_score_sum + excluded.quiz_score_sum,
+            flashcards_reviewed = flashcards_reviewed + excluded.flashcards_reviewed,
+            events = events + excluded.events
+    """, (user_id, occurred_at.strftime("%Y-%m-%d"), tasks, quizzes, score_sum, flashcards, count))
+
+
+def _record_activity(cursor, user_id, event_type, ref=None, value=None):
+    _record_activities(cursor, user_id, event_type, [(ref, value)])
+
+
+def record_activity(user_id, event_type, ref=None, value=None):
+    """Journals a single activity event (e.g. flashcards_reviewed with value = number of cards). Uses SQLite."""
+    try:
+        db.write(lambda cursor: _record_activity(cursor, user_id, event_type, ref=ref, value=value))
+        cache.invalidate(user_id)
+        return {"success": True}
+    except Exception as e:
+        print(f"ERROR: Failed to record '{event_type}' activity for user {user_id}: {e}")
+        return {"success": False, "error": str(e)}
+
+
+@cache.cached
+def _load_activity_days(user_id, start_day, end_day):
+    with db.read() as cursor:
+        cursor.execute("""
+            SELECT day, tasks_completed, quizzes_taken, quiz_score_sum, flashcards_reviewed, events
+            FROM activity_daily WHERE user_id = ? AND day BETWEEN ? AND ? ORDER BY day
+        """, (user_id, start_day, end_day))
+        rows = cursor.fetchall()
+    return [{
+        "day": row[0],
+        "tasks_completed": row[1],
+        "quizzes_taken": row[2],
+        "average_quiz_score": row[3] / row[2] if row[2] else 0.0,
+        "flashcards_reviewed": row[4],
+        "events": row[5]
+    } for row in rows]
+
+
+def get_activity_heatmap(user_id, days=84, today=None):
+    """Returns the daily rollup rows (only days with activity) for the last `days` days, oldest first."""
+    today = today or datetime.now().date()
+    try:
+        return _load_activity_days(user_id, (today - timedelta(days=days - 1)).isoformat(), today.isoformat())
+    except Exception as e:
+        print(f"ERROR: Failed to get activity heatmap for user {user_id}: {e}")
+        return []
+
+
+def get_weekly_activity(user_id, today=None):
+    """Sums the last 7 days of rollups: {"active_days", "tasks_completed", "quizzes_taken", "average_quiz_score", "flashcards_reviewed"}."""
+    days = get_activity_heatmap(user_id, days=7, today=today)
+    quizzes = sum(d["quizzes_taken"] for d in days)
+    return {
+        "active_days": len(days),
+        "tasks_completed": sum(d["tasks_completed"] for d in days),
+        "quizzes_taken": quizzes,
+        "average_quiz_score": sum(d["average_quiz_score"] * d["quizzes_taken"] for d in days) / quizzes if quizzes else 0.0,
+        "flashcards_reviewed": sum(d["flashcards_reviewed"] for d in days)
+    }
+
+
+@cache.cached
+def _load_study_streak(user_id, today_str):
+    today = datetime.strptime(today_str, "%Y-%m-%d").date()
+    streak = 0
+    expected = None
+    with db.read() as cursor:
+        # Walk active days backwards from today; stops at the first gap, so cost is O(streak length)
+        cursor.execute("SELECT day FROM activity_daily WHERE user_id = ? AND day <= ? ORDER BY day DESC",
+                       (user_id, today_str))
+        for (day_str,) in cursor:
+            day = datetime.strptime(day_str, "%Y-%m-%d").date()
+            if expected is None:
+                # A streak is still alive if the last activity was today or yesterday
+                if day < today - timedelta(days=1):
+                    break
+                expected = day
+            if day != expected:
+                break
+            streak += 1
+            expected = day - timedelta(days=1)
+    return streak
+
+
+def get_study_streak(user_id, today=None):
+    """Number of consecutive days (ending today or yesterday) with at least one journaled activity."""
+    today = today or datetime.now().date()
+    try:
+        return _load_study_streak(user_id, today.isoformat())
+    except Exception as e:
+        print(f"ERROR: Failed to get study streak for user {user_id}: {e}")
+        return 0
+
+
+def compact_activity_journal(retention_days=ACTIVITY_RETENTION_DAYS):
+    """
+    Deletes raw activity events older than the retention window. Daily rollups are kept,
+    so streaks, heatmaps and summaries are unaffected. Returns the number of events removed.
+    """
+    cutoff = (datetime.now() - timedelta(days=retention_days)).isoformat()
+    try:
+        def _compact(cursor):
+            cursor.execute("DELETE FROM activity_events WHERE occurred_at < ?", (cutoff,))
+            removed = cursor.rowcount
+            _mark_maintenance_run(cursor, "activity_compacted_at")
+            return removed
+        removed = db.write(_compact)
+        print(f"DEBUG: Compacted {removed} activity events older than {retention_days} days.")
+        return removed
+    except Exception as e:
+        print(f"ERROR: Failed to compact activity journal: {e}")
+        return 0
+
+
+def maybe_compact_activity_journal():
+    """Runs compact_activity_journal at most once per ACTIVITY_COMPACTION_INTERVAL (checked on startup)."""
+    if not _maintenance_due("activity_compacted_at", ACTIVITY_COMPACTION_INTERVAL):
+        return 0
+    return compact_activity_journal()
+
+
+# --- Hot/Cold Task Archival (SQLite Only) ---
+
+TASK_ARCHIVE_INTERVAL = timedelta(days=1)
+
+def archive_completed_tasks(older_than_days=TASK_ARCHIVE_AFTER_DAYS):
+    """
+    Moves tasks completed more than older_than_days ago from tasks into tasks_archive, so the hot
+    table only holds pending and recently completed work. Returns the number of tasks moved.
+    Archived tasks stay readable through include_archived=True on get_tasks/query_tasks/get_topic_progress.
+    """
+    cutoff = (datetime.now() - timedelta(days=older_than_days)).isoformat()
+    try:
+        # Copy, then delete, in two transactions: with an attached archive in WAL mode a single
+        # transaction is not atomic across both files. A crash in between only leaves duplicates,
+        # which reads skip and the next run removes.
+        db.write(lambda cursor: cursor.execute(f"""
+            INSERT OR IGNORE INTO {ARCHIVE_TABLE} ({TASK_COLUMNS}, user_id, archived_at)
+            SELECT {TASK_COLUMNS}, user_id, ? FROM tasks WHERE completed = 1 AND completed_at < ?
+        """, (datetime.now().isoformat(), cutoff)))
+
+        def _delete_archived(cursor):
+            archived = f"completed = 1 AND completed_at < ? AND EXISTS (SELECT 1 FROM {ARCHIVE_TABLE} a WHERE a.id = tasks.id)"
+            cursor.execute(f"SELECT DISTINCT user_id FROM tasks WHERE {archived}", (cutoff,))
+            user_ids = [row[0] for row in cursor.fetchall()]
+            cursor.execute(f"DELETE FROM tasks WHERE {archived}", (cutoff,))
+            moved = cursor.rowcount
+            _mark_maintenance_run(cursor, "tasks_archived_at")
+            return user_ids, moved
+        user_ids, moved = db.write(_delete_archived)
+        for user_id in user_ids:
+            cache.invalidate(user_id)
+        print(f"DEBUG: Archived {moved} tasks completed more than {older_than_days} days ago.")
+        return moved
+    except Exception as e:
+        print(f"ERROR: Failed to archive completed tasks: {e}")
+        return 0
+
+
+def maybe_archive_completed_tasks():
+    """Runs archive_completed_tasks at most once per TASK_ARCHIVE_INTERVAL (checked on startup)."""
+    if not _maintenance_due("tasks_archived_at", TASK_ARCHIVE_INTERVAL):
+        return 0
+    return archive_completed_tasks()
+
+
+def _mark_maintenance_run(cursor, meta_key):
+    cursor.execute("INSERT OR REPLACE INTO app_meta (key, value) VALUES (?, ?)", (meta_key, datetime.now().isoformat()))
+
+
+def _maintenance_due(meta_key, interval):
+    """True when the maintenance job recorded under meta_key in app_meta last ran more than `interval` ago."""
+    try:
+        with db.read() as cursor:
+            cursor.execute("SELECT value FROM app_meta WHERE key = ?", (meta_key,))
+            row = cursor.fetchone()
+        return not row or datetime.now() - datetime.fromisoformat(row[0]) >= interval
+    except Exception as e:
+        print(f"ERROR: Failed to check last run of '{meta_key}': {e}")
+        return False
+
+
+# Periodic journal compaction, task archival and session cleanup on startup
+maybe_compact_activity_journal()
+maybe_archive_completed_tasks()
+if _maintenance_due("sessions_purged_at", timedelta(days=1)):
+    purge_expired_sessions()
+
+
+# --- Uploaded Documents (SQLite Only) ---
+
+DOCUMENT_COLUMNS = ("id, user_id, file_hash, filename, status, chunks_done, chunks_total, error, created_at, updated_at, "
+                    "claimed_by, claimed_at")
+DOCUMENT_ACTIVE_STATUSES = ("queued", "extracting", "embedding", "indexing") # Waiting for or in the ingestion worker
+# A worker's claim on a document lapses unless a progress update renews it within this time (e.g. the process died)
+DOCUMENT_CLAIM_LEASE = timedelta(seconds=int(os.getenv("EDUMATE_DOCUMENT_CLAIM_LEASE_SECONDS", "600")))
+
+def _document_from_row(row):
+    return dict(zip(DOCUMENT_COLUMNS.split(", "), row))
+
+
+def add_document(user_id, file_hash, filename):
+    """
+    Records an upload as queued for ingestion. If the user already uploaded a file with this hash, nothing
+    is inserted. Returns {"success", "document", "created"}, where "document" is the new or existing row.
+    """
+    try:
+        now = datetime.now().isoformat()
+        def _insert(cursor):
+            cursor.execute("""
+                INSERT INTO documents (user_id, file_hash, filename, status, created_at, updated_at) VALUES (?, ?, ?, 'queued', ?, ?)
+                ON CONFLICT (user_id, file_hash) DO NOTHING
+            """, (user_id, file_hash, filename, now, now))
+            created = cursor.rowcount == 1
+            cursor.execute(f"SELECT {DOCUMENT_COLUMNS} FROM documents WHERE user_id = ? AND file_hash = ?", (user_id, file_hash))
+            return created, _document_from_row(cursor.fetchone())
+        created, document = db.write(_insert)
+        return {"success": True, "document": document, "created": created}
+    except Exception as e:
+        print(f"ERROR: Failed to record uploaded document '{filename}' for user {user_id}: {e}")
+        return {"success": False, "error": str(e)}
+
+
+def update_document(document_id, claimed_by=None, **fields):
+    """
+    Updates a document's status / chunks_done / chunks_total / error (ingestion progress).
+    With claimed_by, only while that worker holds the document's claim (see claim_document), which the
+    update renews; a status outside DOCUMENT_ACTIVE_STATUSES releases it. Returns whether the row was updated.
+    """
+    unknown = set(fields) - {"status", "chunks_done", "chunks_total", "error"}
+    if unknown:
+        raise ValueError(f"Unknown document fields: {sorted(unknown)}")
+    now = datetime.now().isoformat()
+    fields["updated_at"] = now
+    where, params = "id = ?", [document_id]
+    if claimed_by is not None:
+        done = fields.get("status", DOCUMENT_ACTIVE_STATUSES[0]) not in DOCUMENT_ACTIVE_STATUSES
+        fields["claimed_by"], fields["claimed_at"] = (None, None) if done else (claimed_by, now)
+        where, params = "id = ? AND claimed_by = ?", [document_id, claimed_by]
+    def _update(cursor):
+        cursor.execute(f"UPDATE documents SET {', '.join(f'{name} = ?' for name in fields)} WHERE {where}",
+                       list(fields.values()) + params)
+        return cursor.rowcount == 1
+    return db.write(_update)
+
+
+def claim_document(document_id, worker_id):
+    """
+    Atomically claims an active document for one ingestion worker: succeeds only if nobody holds it or
+    the holder's claim lapsed (DOCUMENT_CLAIM_LEASE), so processes that all queued it never ingest it twice.
+    Returns the document (as claimed) or None.
+    """
+    now = datetime.now()
+    def _claim(cursor):
+        cursor.execute(f"""
+            UPDATE documents SET claimed_by = ?, claimed_at = ?
+            WHERE id = ? AND status IN ({', '.join('?' * len(DOCUMENT_ACTIVE_STATUSES))})
+              AND (claimed_by IS NULL OR claimed_at < ?)
+        """, (worker_id, now.isoformat(), document_id, *DOCUMENT_ACTIVE_STATUSES, (now - DOCUMENT_CLAIM_LEASE).isoformat()))
+        if cursor.rowcount != 1:
+            return None
+        cursor.execute(f"SELECT {DOCUMENT_COLUMNS} FROM documents WHERE id = ?", (document_id,))
+        return _document_from_row(cursor.fetchone())
+    try:
+        return db.write(_claim)
+    except Exception as e:
+        print(f"ERROR: Failed to claim document {document_id} for {worker_id}: {e}")
+        return None
+
+
+def get_unclaimed_document_ids():
+    """Ids of active documents no worker holds (or whose claim lapsed), oldest first."""
+    try:
+        with db.read() as cursor:
+            cursor.execute(f"""
+                SELECT id FROM documents
+                WHERE status IN ({', '.join('?' * len(DOCUMENT_ACTIVE_STATUSES))}) AND (claimed_by IS NULL OR claimed_at < ?)
+                ORDER BY id
+            """, (*DOCUMENT_ACTIVE_STATUSES, (datetime.now() - DOCUMENT_CLAIM_LEASE).isoformat()))
+            return [row[0] for row in cursor.fetchall()]
+    except Exception as e:
+        print(f"ERROR: Failed to get unclaimed documents: {e}")
+        return []
+
+
+def document_file_in_use(file_hash):
+    """Whether any document row (of any user) still refers to this uploaded file."""
+    with db.read() as cursor:
+        cursor.execute("SELECT 1 FROM documents WHERE file_hash = ? LIMIT 1", (file_hash,))
+        return cursor.fetchone() is not None
+
+
+def get_document(document_id):
+    """Returns one document row as a dict, or None."""
+    try:
+        with db.read() as cursor:
+            cursor.execute(f"SELECT {DOCUMENT_COLUMNS} FROM documents WHERE id = ?", (document_id,))
+            row = cursor.fetchone()
+        return _document_from_row(row) if row else None
+    except Exception as e:
+        print(f"ERROR: Failed to get document {document_id}: {e}")
+        return None
+
+
+def get_documents(user_id=None, statuses=None):
+    """
+    Returns uploaded documents (newest first), for one user or (user_id=None) everyone, optionally only
+    those in the given statuses. Not cached: the ingestion worker updates progress continuously.
+    """
+    try:
+        where, params = [], []
+        if user_id is not None:
+            where.append("user_id = ?")
+            params.append(user_id)
+        if statuses:
+            where.append(f"status IN ({', '.join('?' * len(statuses))})")
+            params.extend(statuses)
+        with db.read() as cursor:
+            cursor.execute(f"SELECT {DOCUMENT_COLUMNS} FROM documents {'WHERE ' + ' AND '.join(where) if where else ''} ORDER BY id DESC",
+                           params)
+            return [_document_from_row(row) for row in cursor.fetchall()]
+    except Exception as e:
+        print(f"ERROR: Failed to get documents for user {user_id}: {e}")
+        return []
+
+
+def delete_document(user_id, document_id):
+    """Deletes a user's document row. Returns {"success", "file_hash", "hash_in_use"} (another row still uses the file)."""
+    try:
+        def _delete(cursor):
+            cursor.execute("SELECT file_hash FROM documents WHERE id = ? AND user_id = ?", (document_id, user_id))
+            row = cursor.fetchone()
+            if row is None:
+                return None, False
+            cursor.execute("DELETE FROM documents WHERE id = ?", (document_id,))
+            cursor.execute("SELECT 1 FROM documents WHERE file_hash = ? LIMIT 1", (row[0],))
+            return row[0], cursor.fetchone() is not None
+        file_hash, hash_in_use = db.write(_delete)
+        if file_hash is None:
+            return {"success": False, "error": "Document not found."}
+        return {"success": True, "file_hash": file_hash, "hash_in_use": hash_in_use}
+    except Exception as e:
+        print(f"ERROR: Failed to delete document {document_id} for user {user_id}: {e}")
+        return {"success": False, "error": str(e)}
+
+
+# --- Persisted Session State (SQLite Only) ---
+
+def load_session_values(user_id, keys):
+    """Returns {key: value} for the requested session-state keys stored for a user (missing keys are left out)."""
+    keys = list(keys)
+    if not keys:
+        return {}
+    try:
+        with db.read() as cursor:
+            cursor.execute(f"SELECT key, value FROM user_session_state WHERE user_id = ? AND key IN ({', '.join('?' * len(keys))})",
+                           [user_id] + keys)
+            return {key: json.loads(value) for key, value in cursor.fetchall()}
+    except Exception as e:
+        print(f"ERROR: Failed to load session state for user {user_id}: {e}")
+        return {}
+
+
+def save_session_values(entries):
+    """Upserts [(user_id, key, value_json)] session-state entries in one transaction."""
+    updated_at = datetime.now().isoformat()
+    db.write(lambda cursor: cursor.executemany("""
+        INSERT INTO user_session_state (user_id, key, value, updated_at) VALUES (?, ?, ?, ?)
+        ON CONFLICT (user_id, key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at
+    """, [(user_id, key, value_json, updated_at) for user_id, key, value_json in entries]))
+
+
+def delete_session_values(user_id, keys=None):
+    """Deletes a user's stored session state (only `keys` if given)."""
+    if keys is None:
+        db.write(lambda cursor: cursor.execute("DELETE FROM user_session_state WHERE user_id = ?", (user_id,)))
+    else:
+        db.write(lambda cursor: cursor.executemany("DELETE FROM user_session_state WHERE user_id = ? AND key = ?",
+                                                   [(user_id, key) for key in keys]))
+
+
+# --- Bulk Export / Import (SQLite Only) ---
+
+EXPORT_FORMAT_VERSION = 1
+IMPORT_BATCH_SIZE = int(os.getenv("EDUMATE_IMPORT_BATCH_SIZE", "500")) # Records per import transaction
+_OWN_SUBJECTS = "subject_id IN (SELECT id FROM subjects WHERE user_id = ?)"
+_OWN_ATTEMPTS = "attempt_id IN (SELECT id FROM quiz_attempts WHERE user_id = ?)"
+
+# Tables with an integer id, in dependency order: (record type, table, columns, rows-of-user filter,
+# owner column, {column: record type whose exported id it references}). On import, a row keeps its
+# exported id unless that id already belongs to another owner, in which case it gets a new one.
+EXPORT_ID_TABLES = (
+    ("subject", "subjects", ("id", "user_id", "name", "created_at"), "user_id = ?", "user_id", {}),
+    ("topic", "topics", ("id", "subject_id", "name", "position"), _OWN_SUBJECTS, "subject_id", {"subject_id": "subject"}),
+    ("task", "tasks", tuple(TASK_COLUMNS.split(", ")) + ("user_id",), "user_id = ?", "user_id", {"topic_id": "topic"}),
+    ("archived_task", ARCHIVE_TABLE, tuple(TASK_COLUMNS.split(", ")) + ("user_id", "archived_at"), "user_id = ?", "user_id",
+     {"topic_id": "topic"}),
+    ("quiz_attempt", "quiz_attempts", ("id", "user_id", "topic", "taken_at", "score_percentage", "grade", "total_questions",
+                                       "correct_answers"), "user_id = ?", "user_id", {}),
+    ("quiz_question_result", "quiz_question_results", ("id", "attempt_id", "question_num", "question", "user_answer",
+                                                       "correct_answer", "is_correct", "explanation"),
+     _OWN_ATTEMPTS, "attempt_id", {"attempt_id": "quiz_attempt"}),
+    ("activity_event", "activity_events", ("id", "user_id", "event_type", "ref", "value", "occurred_at"), "user_id = ?",
+     "user_id", {}),
+    ("artifact", "saved_artifacts", ("id", "user_id", "kind", "title", "content", "created_at"), "user_id = ?", "user_id", {}),
+)
+# Tables keyed by (user_id, ...) instead of an id: (record type, table, columns, conflict target)
+EXPORT_KEYED_TABLES = (
+    ("plan_task", "plan_task_completions", ("user_id", "task_key", "completed", "completed_at"), "user_id, task_key"),
+    ("activity_day", "activity_daily", ("user_id", "day", "tasks_completed", "quizzes_taken", "quiz_score_sum",
+                                        "flashcards_reviewed", "events"), "user_id, day"),
+    ("session_value", "user_session_state", ("user_id", "key", "value", "updated_at"), "user_id, key"),
+)
+
+
+def open_export_file(path, mode="r"):
+    """Opens an NDJSON export for text reading/writing; paths ending in .gz are gzip-compressed."""
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def _export_header():
+    return json.dumps({"type": "export", "format": EXPORT_FORMAT_VERSION, "schema": get_schema_version(db),
+                       "exported_at": datetime.now().isoformat()}) + "\n"
+
+
+def _export_user_rows(cursor, user_id):
+    cursor.execute("SELECT username, password, created_at, seeded_at FROM users WHERE username = ?", (user_id,))
+    row = cursor.fetchone()
+    if row is None:
+        raise ValueError(f"Unknown user: {user_id}")
+    yield json.dumps({"type": "user", "username": row[0], "password": row[1], "created_at": row[2], "seeded_at": row[3]}) + "\n"
+    for record_type, table, columns, scope, _, _ in EXPORT_ID_TABLES:
+        cursor.execute(f"SELECT {', '.join(columns)} FROM {table} WHERE {scope} ORDER BY id", (user_id,))
+        for row in cursor: # Rows are streamed from SQLite one at a time, never collected in a list
+            yield json.dumps({"type": record_type, **dict(zip(columns, row))}, ensure_ascii=False) + "\n"
+    for record_type, table, columns, _ in EXPORT_KEYED_TABLES:
+        cursor.execute(f"SELECT {', '.join(columns)} FROM {table} WHERE user_id = ?", (user_id,))
+        for row in cursor:
+            yield json.dumps({"type": record_type, **dict(zip(columns, row))}, ensure_ascii=False) + "\n"
+
+
+def export_user(user_id, include_header=True):
+    """
+    Streams one user's tasks (live and archived), subjects, topics, quiz history, plan progress, activity
+    and saved artifacts as newline-delimited JSON lines, parents before children. Reads come from one
+    consistent snapshot and memory use does not grow with the size of the history.
+    """
+    if include_header:
+        yield _export_header()
+    with db.snapshot() as cursor:
+        yield from _export_user_rows(cursor, user_id)
+
+
+def export_all_users():
+    """Streams every user's data (see export_user) under a single header, from one snapshot."""
+    yield _export_header()
+    with db.snapshot() as cursor:
+        cursor.execute("SELECT username FROM users ORDER BY id")
+        usernames = [row[0] for row in cursor.fetchall()]
+        for username in usernames:
+            yield from _export_user_rows(cursor, username)
+
+
+def _import_record(cursor, record, remapped):
+    """Upserts one exported record. remapped holds only ids that had to change: (record type, old id) -> new id."""
+    record_type = record.pop("type")
+    if record_type == "user":
+        cursor.execute("""
+            INSERT INTO users (username, password, created_at, seeded_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT (username) DO UPDATE SET password = excluded.password, created_at = excluded.created_at,
+                                                 seeded_at = excluded.seeded_at
+        """, (record["username"], record["password"], record["created_at"], record["seeded_at"]))
+        return record["username"]
+
+    for keyed_type, table, columns, conflict in EXPORT_KEYED_TABLES:
+        if keyed_type == record_type:
+            updates = ", ".join(f"{c} = excluded.{c}" for c in columns if c not in conflict)
+            cursor.execute(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+                           f"ON CONFLICT ({conflict}) DO UPDATE SET {updates}", [record[c] for c in columns])
+            return record["user_id"]
+
+    for id_type, table, columns, _, owner, references in EXPORT_ID_TABLES:
+        if id_type != record_type:
+            continue
+        for column, referenced_type in references.items():
+            record[column] = remapped.get((referenced_type, record[column]), record[column])
+        if record_type in ("task", "archived_task"):
+            _claim_task_id(cursor, record)
+        values = [record[c] for c in columns]
+        updates = ", ".join(f"{c} = excluded.{c}" for c in columns if c != "id")
+        cursor.execute(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+                       f"ON CONFLICT (id) DO UPDATE SET {updates} WHERE {table.split('.')[-1]}.{owner} = excluded.{owner}",
+                       values)
+        if cursor.rowcount == 0:
+            # The id is taken by someone else's row in this database: insert under a fresh id
+            cursor.execute(f"INSERT INTO {table} ({', '.join(columns[1:])}) VALUES ({', '.join('?' * (len(columns) - 1))})",
+                           values[1:])
+            remapped[(record_type, record["id"])] = cursor.lastrowid
+        return record.get("user_id")
+    raise ValueError(f"Unknown record type in import: {record_type}")
+
+
+def _claim_task_id(cursor, record):
+    """
+    Live and archived tasks share one id space (reads and archival match rows across both tables by id).
+    Moves an imported task to a fresh id if another user's task already uses its id in either table,
+    and keeps the tasks AUTOINCREMENT sequence ahead of every id in use.
+    """
+    cursor.execute(f"SELECT user_id FROM tasks WHERE id = ? UNION ALL SELECT user_id FROM {ARCHIVE_TABLE} WHERE id = ?",
+                   (record["id"], record["id"]))
+    if any(owner != record["user_id"] for (owner,) in cursor.fetchall()):
+        cursor.execute(f"SELECT max(coalesce((SELECT seq FROM sqlite_sequence WHERE name = 'tasks'), 0), "
+                       f"coalesce((SELECT max(id) FROM {ARCHIVE_TABLE}), 0)) + 1")
+        record["id"] = cursor.fetchone()[0] # No other record refers to task ids, so nothing needs remapping
+    cursor.execute("UPDATE sqlite_sequence SET seq = max(seq, ?) WHERE name = 'tasks'", (record["id"],))
+    if cursor.rowcount == 0:
+        cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('tasks', ?)", (record["id"],))
+
+
+def import_user(stream):
+    """
+    Restores data written by export_user/export_all_users from an iterable of NDJSON lines (e.g. an open
+    file from open_export_file). Records are upserted in transactions of IMPORT_BATCH_SIZE, so memory
+    stays flat; importing the same export twice leaves the data unchanged.
+    Returns {"success", "records", "users"} or {"success": False, "error", "records"} (records applied so far).
+    """
+    remapped = {}
+    users = set()
+    batch = []
+    applied = 0
+
+    def _apply(cursor):
+        for record in batch:
+            user_id = _import_record(cursor, record, remapped)
+            if user_id is not None:
+                users.add(user_id)
+
+    def flush():
+        db.write(_apply)
+        return len(batch)
+
+    try:
+        for line_number, line in enumerate(stream, start=1):
+            if isinstance(line, bytes):
+                line = line.decode("utf-8")
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if record.get("type") == "export":
+                if record.get("format") != EXPORT_FORMAT_VERSION:
+                    raise ValueError(f"Unsupported export format {record.get('format')} (line {line_number})")
+                continue
+            batch.append(record)
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                applied += flush()
+                batch = []
+        if batch:
+            applied += flush()
+        print(f"DEBUG: Imported {applied} records for {len(users)} user(s).")
+        return {"success": True, "records": applied, "users": sorted(users)}
+    except Exception as e:
+        print(f"ERROR: Import failed after {applied} records: {e}")
+        return {"success": False, "error": str(e), "records": applied}
+    finally:
+        for user_id in users:
+            cache.invalidate(user_id)
+            _notify_syllabus_changed(user_id)
+
+
+# --- Read Cache Stats ---
+
+def get_cache_stats():
+    """Returns hit/miss/eviction counters of the per-user read cache."""
+    return cache.stats()
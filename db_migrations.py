@@ -0,0 +1,436 @@
+# db_migrations.py
+import json
+from datetime import datetime
+
+# Each migration is (version, description, function(cursor)). Versions must only ever be appended;
+# an existing edumate_offline.db is upgraded in place by running every version it has not seen yet.
+
+
+def _create_base_tables(cursor):
+    """v1: users, tasks and subjects tables (the original schema)."""
+    # Create users table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE,
+            password TEXT, -- scrypt/PBKDF2 hash (see password_hashing.py); legacy plaintext rows are upgraded on login
+            created_at TEXT
+        )
+    """)
+
+    # Create tasks table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS tasks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT, -- This will be the username from the users table
+            task TEXT,
+            due_date TEXT,
+            completed INTEGER,
+            created_at TEXT,
+            subject_name TEXT, -- New field to link to subject
+            topic_name TEXT, -- New field to link to topic within a subject
+            FOREIGN KEY (user_id) REFERENCES users(username)
+        )
+    """)
+    # Create subjects table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS subjects (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT, -- This will be the username from the users table
+            name TEXT,
+            topics TEXT, -- Stored as JSON string
+            created_at TEXT,
+            FOREIGN KEY (user_id) REFERENCES users(username)
+        )
+    """)
+
+
+def _add_user_indexes(cursor):
+    """v2: composite indexes so per-user task and subject reads stop scanning the whole table."""
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tasks_user_completed_due ON tasks(user_id, completed, due_date)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tasks_user_created ON tasks(user_id, created_at)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_subjects_user_created ON subjects(user_id, created_at)")
+
+
+def _normalize_topics(cursor):
+    """v3: move subject topics out of the JSON column into a topics table and link tasks by topic_id."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS topics (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            subject_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            position INTEGER NOT NULL, -- Keeps the order the topics were entered in
+            FOREIGN KEY (subject_id) REFERENCES subjects(id) ON DELETE CASCADE
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_topics_subject_position ON topics(subject_id, position)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_topics_subject_name ON topics(subject_id, name)")
+    cursor.execute("ALTER TABLE tasks ADD COLUMN topic_id INTEGER REFERENCES topics(id) ON DELETE SET NULL")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tasks_topic_completed ON tasks(topic_id, completed)")
+
+    # Copy existing JSON topic lists into rows
+    cursor.execute("SELECT id, topics FROM subjects WHERE topics IS NOT NULL AND topics != ''")
+    topic_rows = []
+    for subject_id, topics_json in cursor.fetchall():
+        try:
+            topics = json.loads(topics_json)
+        except ValueError:
+            print(f"WARNING: Skipping unparseable topics for subject {subject_id} during migration.")
+            continue
+        topic_rows.extend((subject_id, str(name), position) for position, name in enumerate(topics))
+    cursor.executemany("INSERT INTO topics (subject_id, name, position) VALUES (?, ?, ?)", topic_rows)
+    cursor.execute("UPDATE subjects SET topics = NULL")
+
+    # Link existing tasks to their topic rows by (user, subject name, topic name)
+    cursor.execute("""
+        UPDATE tasks SET topic_id = (
+            SELECT t.id FROM topics t JOIN subjects s ON s.id = t.subject_id
+            WHERE s.user_id = tasks.user_id AND s.name = tasks.subject_name AND t.name = tasks.topic_name
+            ORDER BY t.id LIMIT 1
+        )
+        WHERE subject_name IS NOT NULL AND topic_name IS NOT NULL
+    """)
+
+
+DUE_DATE_INPUT_FORMATS = ("%Y-%m-%d", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M:%S", "%d-%m-%Y", "%d/%m/%Y", "%Y/%m/%d")
+
+
+def _normalize_due_dates(cursor):
+    """v4: store every parseable due date as ISO YYYY-MM-DD so range filters and ORDER BY can use the indexes."""
+    cursor.execute("SELECT id, due_date FROM tasks WHERE due_date IS NOT NULL")
+    updates = []
+    for task_id, due_date in cursor.fetchall():
+        for fmt in DUE_DATE_INPUT_FORMATS:
+            try:
+                normalized = datetime.strptime(due_date.strip(), fmt).strftime("%Y-%m-%d")
+            except (ValueError, AttributeError):
+                continue
+            if normalized != due_date:
+                updates.append((normalized, task_id))
+            break
+        else:
+            print(f"WARNING: Leaving unparseable due date {due_date!r} on task {task_id} as-is.")
+    cursor.executemany("UPDATE tasks SET due_date = ? WHERE id = ?", updates)
+    # Keyset pagination ordered by due date across all statuses
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tasks_user_due ON tasks(user_id, due_date)")
+
+
+def _add_quiz_and_plan_tables(cursor):
+    """v5: quiz attempts, per-question results and study-plan task completions (previously session-only)."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS quiz_attempts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            topic TEXT,
+            taken_at TEXT NOT NULL, -- ISO timestamp
+            score_percentage REAL,
+            grade TEXT,
+            total_questions INTEGER,
+            correct_answers INTEGER,
+            FOREIGN KEY (user_id) REFERENCES users(username)
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_quiz_attempts_user_taken ON quiz_attempts(user_id, taken_at)")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS quiz_question_results (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            attempt_id INTEGER NOT NULL,
+            question_num INTEGER,
+            question TEXT,
+            user_answer TEXT,
+            correct_answer TEXT,
+            is_correct INTEGER,
+            explanation TEXT,
+            FOREIGN KEY (attempt_id) REFERENCES quiz_attempts(id) ON DELETE CASCADE
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_quiz_question_results_attempt ON quiz_question_results(attempt_id, question_num)")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS plan_task_completions (
+            user_id TEXT NOT NULL,
+            task_key TEXT NOT NULL, -- "<plan hash>:<day>_<n>" as produced by TrackerAgent
+            completed INTEGER NOT NULL,
+            completed_at TEXT,
+            PRIMARY KEY (user_id, task_key),
+            FOREIGN KEY (user_id) REFERENCES users(username)
+        ) WITHOUT ROWID
+    """)
+
+
+def _add_activity_journal(cursor):
+    """v6: append-only activity journal plus per-day rollups maintained on write, backfilled from v5 tables."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS activity_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            event_type TEXT NOT NULL, -- task_completed, plan_task_completed, quiz_taken, flashcards_reviewed
+            ref TEXT, -- Id of the task/quiz/plan task the event is about
+            value REAL, -- Quiz score or number of flashcards
+            occurred_at TEXT NOT NULL, -- ISO timestamp
+            FOREIGN KEY (user_id) REFERENCES users(username)
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_activity_events_user_time ON activity_events(user_id, occurred_at)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_activity_events_time ON activity_events(occurred_at)")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS activity_daily (
+            user_id TEXT NOT NULL,
+            day TEXT NOT NULL, -- YYYY-MM-DD
+            tasks_completed INTEGER NOT NULL DEFAULT 0,
+            quizzes_taken INTEGER NOT NULL DEFAULT 0,
+            quiz_score_sum REAL NOT NULL DEFAULT 0,
+            flashcards_reviewed INTEGER NOT NULL DEFAULT 0,
+            events INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, day)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS app_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+    """)
+
+    # Backfill history that already exists
+    cursor.execute("""
+        INSERT INTO activity_events (user_id, event_type, ref, value, occurred_at)
+        SELECT user_id, 'quiz_taken', CAST(id AS TEXT), score_percentage, replace(taken_at, ' ', 'T')
+        FROM quiz_attempts
+    """)
+    cursor.execute("""
+        INSERT INTO activity_events (user_id, event_type, ref, value, occurred_at)
+        SELECT user_id, 'plan_task_completed', task_key, NULL, completed_at
+        FROM plan_task_completions WHERE completed = 1 AND completed_at IS NOT NULL
+    """)
+    cursor.execute("""
+        INSERT INTO activity_daily (user_id, day, tasks_completed, quizzes_taken, quiz_score_sum, flashcards_reviewed, events)
+        SELECT user_id, substr(occurred_at, 1, 10),
+               SUM(event_type IN ('task_completed', 'plan_task_completed')),
+               SUM(event_type = 'quiz_taken'),
+               SUM(CASE WHEN event_type = 'quiz_taken' THEN value ELSE 0 END),
+               SUM(CASE WHEN event_type = 'flashcards_reviewed' THEN value ELSE 0 END),
+               COUNT(*)
+        FROM activity_events GROUP BY user_id, substr(occurred_at, 1, 10)
+    """)
+
+
+def _add_task_completed_at(cursor):
+    """v7: record when a task was completed so old completed tasks can be archived by age."""
+    cursor.execute("ALTER TABLE tasks ADD COLUMN completed_at TEXT")
+    # Best known completion time: the journaled completion event, else the creation time
+    cursor.execute("""
+        UPDATE tasks SET completed_at = COALESCE(
+            (SELECT MAX(e.occurred_at) FROM activity_events e
+             WHERE e.user_id = tasks.user_id AND e.event_type = 'task_completed' AND e.ref = CAST(tasks.id AS TEXT)),
+            created_at)
+        WHERE completed = 1
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tasks_completed_at ON tasks(completed, completed_at)")
+
+
+# FTS rowids encode the source row: rowid = source id * SEARCH_KIND_COUNT + kind code,
+# so triggers can update/delete index entries by rowid instead of scanning the index.
+SEARCH_KINDS = ("task", "subject", "topic", "artifact")
+SEARCH_KIND_COUNT = len(SEARCH_KINDS)
+
+
+def _add_search_index(cursor):
+    """v8: saved artifacts (summaries, flashcards, chat messages) and an FTS5 index over everything searchable."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS saved_artifacts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            kind TEXT NOT NULL, -- summary, flashcards, chat_message
+            title TEXT,
+            content TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users(username)
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_saved_artifacts_user_kind_created ON saved_artifacts(user_id, kind, created_at)")
+    cursor.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+            title, body, user_id UNINDEXED, kind UNINDEXED,
+            tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+        )
+    """)
+
+    def rowid(column, kind):
+        return f"{column} * {SEARCH_KIND_COUNT} + {SEARCH_KINDS.index(kind)}"
+
+    # One INSERT per searchable table, used by the insert/update triggers (NEW row) and the backfill
+    documents = {
+        "tasks": ("task", "task, subject_name, topic_name", """
+            INSERT INTO search_index (rowid, title, body, user_id, kind)
+            SELECT {rowid}, {src}.task, coalesce({src}.subject_name, '') || ' ' || coalesce({src}.topic_name, ''), {src}.user_id, 'task'
+            FROM {from_clause}"""),
+        "subjects": ("subject", "name", """
+            INSERT INTO search_index (rowid, title, body, user_id, kind)
+            SELECT {rowid}, {src}.name, '', {src}.user_id, 'subject'
+            FROM {from_clause}"""),
+        "topics": ("topic", "name", """
+            INSERT INTO search_index (rowid, title, body, user_id, kind)
+            SELECT {rowid}, {src}.name, s.name, s.user_id, 'topic'
+            FROM {from_clause} JOIN subjects s ON s.id = {src}.subject_id"""),
+        "saved_artifacts": ("artifact", "title, content", """
+            INSERT INTO search_index (rowid, title, body, user_id, kind)
+            SELECT {rowid}, coalesce({src}.title, ''), {src}.content, {src}.user_id, {src}.kind
+            FROM {from_clause}"""),
+    }
+    for table, (kind, watched, document) in documents.items():
+        # Inside a trigger, select the NEW row from a one-row subquery so the same INSERT works for both
+        new_row = document.format(rowid=rowid("NEW.id", kind), src="NEW", from_clause="(SELECT 1)")
+        old_rowid = rowid("OLD.id", kind)
+        cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {table}_search_insert AFTER INSERT ON {table} BEGIN {new_row}; END")
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_search_update AFTER UPDATE OF {watched} ON {table} BEGIN
+                DELETE FROM search_index WHERE rowid = {old_rowid};
+                {new_row};
+            END
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_search_delete AFTER DELETE ON {table} BEGIN
+                DELETE FROM search_index WHERE rowid = {old_rowid};
+            END
+        """)
+        # Index what already exists
+        cursor.execute(document.format(rowid=rowid("src.id", kind), src="src", from_clause=f"{table} src"))
+
+
+def _add_user_seeded_at(cursor):
+    """v9: users.seeded_at marks that the default syllabus was seeded, so login no longer re-checks subjects."""
+    cursor.execute("ALTER TABLE users ADD COLUMN seeded_at TEXT")
+    # Anyone who already has subjects was seeded (or built their own syllabus) at some point
+    cursor.execute("""
+        UPDATE users SET seeded_at = coalesce(created_at, ?)
+        WHERE EXISTS (SELECT 1 FROM subjects s WHERE s.user_id = users.username)
+    """, (datetime.now().isoformat(),))
+
+
+def _add_sessions(cursor):
+    """v10: server-side record of issued session tokens (hash only), so reconnects skip password checks and logout can revoke."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sessions (
+            token_hash TEXT PRIMARY KEY, -- sha256 of the token; the token itself is never stored
+            user_id TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            expires_at TEXT NOT NULL
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions(expires_at)")
+
+
+def _add_user_session_state(cursor):
+    """v11: per-user UI session state (chat, study plan, quiz/flashcard progress) shared by every app process."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS user_session_state (
+            user_id TEXT NOT NULL,
+            key TEXT NOT NULL, -- st.session_state key
+            value TEXT NOT NULL, -- JSON
+            updated_at TEXT NOT NULL,
+            PRIMARY KEY (user_id, key)
+        ) WITHOUT ROWID
+    """)
+
+
+def _add_documents(cursor):
+    """v12: uploaded PDF/DOCX documents ingested into the user's searchable knowledge base, with ingestion progress."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS documents (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            file_hash TEXT NOT NULL, -- sha256 of the uploaded bytes; a re-upload of the same file is a no-op
+            filename TEXT NOT NULL,
+            status TEXT NOT NULL, -- queued, extracting, embedding, indexing, ready or failed
+            chunks_done INTEGER NOT NULL DEFAULT 0,
+            chunks_total INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL,
+            UNIQUE (user_id, file_hash)
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_documents_status ON documents(status)")
+
+
+def _add_session_resume_nonces(cursor):
+    """v13: one-time resume nonces, so page URLs carry a short-lived nonce instead of the session token itself."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS session_resume_nonces (
+            nonce_hash TEXT PRIMARY KEY, -- sha256 of the nonce; the nonce itself is never stored
+            token_hash TEXT NOT NULL, -- the session (sessions.token_hash) it resumes
+            expires_at TEXT NOT NULL
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_session_resume_nonces_token ON session_resume_nonces(token_hash)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_session_resume_nonces_expires ON session_resume_nonces(expires_at)")
+
+
+def _add_document_claims(cursor):
+    """v14: which ingestion worker holds a document and since when, so only one process ingests it at a time."""
+    cursor.execute("ALTER TABLE documents ADD COLUMN claimed_by TEXT") # Worker id; NULL when not being ingested
+    cursor.execute("ALTER TABLE documents ADD COLUMN claimed_at TEXT") # Renewed with every progress update
+
+
+MIGRATIONS = [
+    (1, "create users, tasks and subjects tables", _create_base_tables),
+    (2, "add per-user indexes on tasks and subjects", _add_user_indexes),
+    (3, "normalize subject topics into a topics table", _normalize_topics),
+    (4, "normalize task due dates to ISO format", _normalize_due_dates),
+    (5, "add quiz history and plan task completion tables", _add_quiz_and_plan_tables),
+    (6, "add activity journal and daily rollups", _add_activity_journal),
+    (7, "add tasks.completed_at for archival", _add_task_completed_at),
+    (8, "add saved artifacts and FTS5 search index", _add_search_index),
+    (9, "add users.seeded_at", _add_user_seeded_at),
+    (10, "add sessions table for signed session tokens", _add_sessions),
+    (11, "add user_session_state table", _add_user_session_state),
+    (12, "add documents table for knowledge base uploads", _add_documents),
+    (13, "add session_resume_nonces table", _add_session_resume_nonces),
+    (14, "add documents.claimed_by and claimed_at", _add_document_claims),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(pool):
+    """Returns the highest migration version applied to the database (0 for a fresh file)."""
+    with pool.read() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'schema_migrations'")
+        if cursor.fetchone() is None:
+            return 0
+        cursor.execute("SELECT MAX(version) FROM schema_migrations")
+        row = cursor.fetchone()
+    return row[0] or 0
+
+
+def apply_migrations(pool, target_version=None):
+    """
+    Brings the database up to target_version (default: latest), one transaction per migration.
+    Returns the list of versions that were applied.
+    """
+    target_version = LATEST_VERSION if target_version is None else target_version
+    with pool.transaction() as cursor:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                description TEXT,
+                applied_at TEXT
+            )
+        """)
+
+    current_version = get_schema_version(pool)
+    applied = []
+    for version, description, migrate in MIGRATIONS:
+        if version <= current_version or version > target_version:
+            continue
+        with pool.transaction() as cursor:
+            # Re-check under the write lock in case another process migrated meanwhile
+            cursor.execute("SELECT 1 FROM schema_migrations WHERE version = ?", (version,))
+            if cursor.fetchone():
+                continue
+            migrate(cursor)
+            cursor.execute("INSERT INTO schema_migrations (version, description, applied_at) VALUES (?, ?, ?)",
+                           (version, description, datetime.now().isoformat()))
+        applied.append(version)
+        print(f"DEBUG: Applied schema migration v{version}: {description}")
+    return applied
@@ -0,0 +1,265 @@
+# db_pool.py
+import atexit
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+# --- Tunables (override through environment variables if needed) ---
+BUSY_TIMEOUT_MS = int(os.getenv("EDUMATE_DB_BUSY_TIMEOUT_MS", "5000"))
+CACHE_SIZE_KB = int(os.getenv("EDUMATE_DB_CACHE_SIZE_KB", "20000"))  # ~20MB page cache per connection
+MMAP_SIZE_BYTES = int(os.getenv("EDUMATE_DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+SYNCHRONOUS = os.getenv("EDUMATE_DB_SYNCHRONOUS", "NORMAL")  # NORMAL is safe with WAL
+WRITE_QUEUE_ENABLED = os.getenv("EDUMATE_DB_WRITE_QUEUE", "0") == "1"  # Serialize writes through one writer thread
+GROUP_COMMIT_MAX_WRITES = int(os.getenv("EDUMATE_DB_GROUP_COMMIT_MAX", "64"))  # Writes per commit at most
+GROUP_COMMIT_WAIT_MS = float(os.getenv("EDUMATE_DB_GROUP_COMMIT_WAIT_MS", "0"))  # Extra wait for a batch to fill (0: take what is queued)
+
+
+class ConnectionPool:
+    """
+    Hands out one SQLite connection per thread for a single database file.
+    Every connection is opened in WAL mode with a busy timeout and tuned pragmas,
+    so concurrent Streamlit sessions can read while another one writes.
+    """
+
+    def __init__(self, db_path, write_queue=WRITE_QUEUE_ENABLED, attachments=None):
+        self.db_path = db_path
+        self.attachments = dict(attachments or {})  # schema name -> database file ATTACHed on every connection
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = {}  # thread ident -> (thread, connection)
+        self._writer = None
+        if write_queue:
+            self.start_write_queue()
+
+    def _open_connection(self):
+        # isolation_level=None puts the driver in autocommit mode; transaction() issues BEGIN/COMMIT itself.
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            isolation_level=None,
+            check_same_thread=False,  # Only so dead threads' connections can be closed by the sweeper
+        )
+        for schema, path in self.attachments.items():
+            conn.execute(f"ATTACH DATABASE ? AS {schema}", (path,))
+        conn.execute("PRAGMA journal_mode=WAL")  # Applies to attached databases too
+        conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        conn.execute(f"PRAGMA synchronous={SYNCHRONOUS}")
+        conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KB}")
+        conn.execute(f"PRAGMA mmap_size={MMAP_SIZE_BYTES}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    def _sweep_dead_threads(self):
+        """Closes connections owned by threads that have finished (Streamlit starts a new thread per rerun)."""
+        for ident, (thread, conn) in list(self._connections.items()):
+            if not thread.is_alive():
+                try:
+                    conn.close()
+                except Exception as e:
+                    print(f"WARNING: Failed to close pooled SQLite connection: {e}")
+                del self._connections[ident]
+
+    def connection(self):
+        """Returns the calling thread's connection, opening it on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._open_connection()
+            self._local.conn = conn
+            self._local.depth = 0
+            with self._lock:
+                self._sweep_dead_threads()
+                self._connections[threading.get_ident()] = (threading.current_thread(), conn)
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """
+        Yields a cursor inside a write transaction that commits on success and rolls back on error.
+        Nested transaction() blocks on the same thread join the outermost transaction.
+        """
+        conn = self.connection()
+        if self._local.depth > 0:
+            self._local.depth += 1
+            try:
+                yield conn.cursor()
+            finally:
+                self._local.depth -= 1
+            return
+
+        # BEGIN IMMEDIATE takes the write lock up front, so busy_timeout applies here
+        # instead of failing later with "database is locked" on lock upgrade.
+        conn.execute("BEGIN IMMEDIATE")
+        self._local.depth = 1
+        try:
+            yield conn.cursor()
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            self._local.depth = 0
+
+    @contextmanager
+    def read(self):
+        """Yields a cursor for read-only queries. WAL readers never block the writer."""
+        cursor = self.connection().cursor()
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+
+    @contextmanager
+    def snapshot(self):
+        """
+        Yields a cursor on a separate, short-lived connection inside one read transaction, so long
+        multi-query reads (e.g. exports) see a single consistent state without blocking writers.
+        """
+        conn = self._open_connection()
+        try:
+            conn.execute("BEGIN")
+            yield conn.cursor()
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    def close_all(self):
+        """Closes every pooled connection (e.g. before replacing the database file)."""
+        with self._lock:
+            for thread, conn in self._connections.values():
+                try:
+                    conn.close()
+                except Exception as e:
+                    print(f"WARNING: Failed to close pooled SQLite connection: {e}")
+            self._connections.clear()
+        self._local = threading.local()
+
+    def start_write_queue(self, max_batch=GROUP_COMMIT_MAX_WRITES, wait_ms=GROUP_COMMIT_WAIT_MS):
+        """Routes write() / submit_write() through a single writer thread that group-commits batches."""
+        if self._writer is None:
+            self._writer = WriteQueue(self, max_batch=max_batch, wait_ms=wait_ms)
+        return self._writer
+
+    def stop_write_queue(self):
+        """Drains and stops the writer thread; later writes run directly on the caller's thread again."""
+        writer, self._writer = self._writer, None
+        if writer is not None:
+            writer.stop()
+
+    def submit_write(self, fn):
+        """
+        Schedules fn(cursor) to run inside a write transaction and returns a Future with its result.
+        The future resolves only after the transaction holding fn has committed.
+        """
+        writer = self._writer
+        # Inside an open transaction (including on the writer thread itself) queueing would deadlock: run inline
+        if writer is None or getattr(self._local, "depth", 0) > 0:
+            future = Future()
+            try:
+                with self.transaction() as cursor:
+                    future.set_result(fn(cursor))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        return writer.submit(fn)
+
+    def write(self, fn):
+        """Runs fn(cursor) inside a write transaction and returns its result (blocking until committed)."""
+        return self.submit_write(fn).result()
+
+
+class WriteQueue:
+    """
+    Single writer thread for a ConnectionPool. Callers enqueue fn(cursor) jobs and get Futures back.
+    The writer takes up to max_batch queued jobs, runs each under its own SAVEPOINT inside one
+    BEGIN IMMEDIATE transaction and commits once (group commit). A failing job is rolled back to its
+    savepoint and only its future gets the exception; the rest of the batch still commits.
+    Reads keep using the pool's per-thread connections and are never queued.
+    """
+
+    def __init__(self, pool, max_batch=GROUP_COMMIT_MAX_WRITES, wait_ms=GROUP_COMMIT_WAIT_MS):
+        self.pool = pool
+        self.max_batch = max(1, max_batch)
+        self.wait_seconds = max(0.0, wait_ms) / 1000
+        self._queue = queue.Queue()
+        self.batches = 0
+        self.writes = 0
+        self._thread = threading.Thread(target=self._run, name="sqlite-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def submit(self, fn):
+        future = Future()
+        self._queue.put((fn, future))
+        return future
+
+    def stop(self):
+        """Commits everything already queued, then ends the writer thread."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "writes": self.writes,
+            "average_batch": self.writes / self.batches if self.batches else 0.0,
+            "queued": self._queue.qsize(),
+        }
+
+    def _next_batch(self):
+        """Blocks for one job, then collects more until the batch is full or the wait window closes."""
+        first = self._queue.get()
+        if first is None:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + self.wait_seconds
+        while len(batch) < self.max_batch:
+            try:
+                remaining = deadline - time.monotonic()
+                job = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if job is None:
+                return batch, True
+            batch.append(job)
+        return batch, False
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch, stopping = self._next_batch()
+            batch = [(fn, future) for fn, future in batch if future.set_running_or_notify_cancel()]
+            if batch:
+                self._commit_batch(batch)
+
+    def _commit_batch(self, batch):
+        outcomes = []
+        try:
+            with self.pool.transaction() as cursor:
+                for fn, future in batch:
+                    cursor.execute("SAVEPOINT queued_write")
+                    try:
+                        outcomes.append((future, fn(cursor), None))
+                        cursor.execute("RELEASE queued_write")
+                    except Exception as e:
+                        cursor.execute("ROLLBACK TO queued_write")
+                        cursor.execute("RELEASE queued_write")
+                        outcomes.append((future, None, e))
+        except Exception as e:
+            # COMMIT (or BEGIN) itself failed: nothing in this batch was written
+            print(f"ERROR: Group commit of {len(batch)} queued SQLite writes failed: {e}")
+            for fn, future in batch:
+                future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.writes += len(batch)
+        for future, result, error in outcomes:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
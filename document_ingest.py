@@ -0,0 +1,215 @@
+# document_ingest.py
+import hashlib
+import os
+import queue
+import socket
+import threading
+import uuid
+import vector_rag
+from data_manager import (add_document, update_document, get_document, get_documents, delete_document, claim_document,
+                          get_unclaimed_document_ids, document_file_in_use, UPLOADS_DIR, DOCUMENT_CLAIM_LEASE)
+from embedding_cache import EMBEDDING_BATCH_SIZE
+
+UPLOAD_MAX_BYTES = int(os.getenv("EDUMATE_UPLOAD_MAX_MB", "50")) * 1024 * 1024 # Textbooks run well past the agents' 10MB limit
+SUPPORTED_EXTENSIONS = (".pdf", ".docx")
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}" # Claims documents for this process's worker
+
+_queue = queue.Queue() # document ids waiting for the worker
+_worker = None
+_worker_lock = threading.Lock()
+
+
+class ClaimLostError(Exception):
+    """The document was deleted during ingestion, or another worker took it over after this one's claim lapsed."""
+
+
+def extract_text(path, extension):
+    """Extracts the text of a PDF or DOCX file (one paragraph per PDF page or DOCX paragraph)."""
+    if extension == ".pdf":
+        from PyPDF2 import PdfReader
+        return "\n\n".join((page.extract_text() or "").strip() for page in PdfReader(path).pages).strip()
+    if extension == ".docx":
+        from docx import Document
+        return "\n\n".join(paragraph.text.strip() for paragraph in Document(path).paragraphs if paragraph.text.strip())
+    raise ValueError(f"Unsupported file type: {extension}")
+
+
+def queue_document(user_id, filename, data):
+    """
+    Saves an uploaded PDF/DOCX and queues it for background ingestion into the user's searchable knowledge base.
+    Re-uploading a file the user already has (same bytes) does nothing.
+    Returns {"success", "document", "duplicate"} or {"success": False, "error"}.
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    if extension not in SUPPORTED_EXTENSIONS:
+        return {"success": False, "error": f"Unsupported file type '{extension}'. Upload a PDF or DOCX file."}
+    if len(data) > UPLOAD_MAX_BYTES:
+        return {"success": False, "error": f"File is larger than {UPLOAD_MAX_BYTES // (1024 * 1024)}MB."}
+
+    file_hash = hashlib.sha256(data).hexdigest()
+    result = add_document(user_id, file_hash, filename)
+    if not result["success"]:
+        return result
+    document = result["document"]
+    if not result["created"] and document["status"] != "failed":
+        print(f"DEBUG: Upload '{filename}' of user {user_id} is a duplicate of document {document['id']}; skipped.")
+        return {"success": True, "document": document, "duplicate": True}
+    if not result["created"]: # Retry a failed ingestion
+        update_document(document["id"], status="queued", chunks_done=0, chunks_total=0, error=None)
+
+    try:
+        # Another user may have uploaded the same file: its extracted text is reused as is
+        if not os.path.exists(vector_rag.upload_text_path(file_hash)):
+            os.makedirs(UPLOADS_DIR, exist_ok=True)
+            upload_path = os.path.join(UPLOADS_DIR, f"{file_hash}{extension}")
+            with open(upload_path + ".tmp", "wb") as f:
+                f.write(data)
+            os.replace(upload_path + ".tmp", upload_path)
+    except OSError as e:
+        print(f"ERROR: Failed to save upload '{filename}' for user {user_id}: {e}")
+        update_document(document["id"], status="failed", error=str(e))
+        return {"success": False, "error": str(e)}
+
+    start_ingestion_worker()
+    _queue.put(document["id"])
+    return {"success": True, "document": get_document(document["id"]), "duplicate": False}
+
+
+def _stored_file_paths(file_hash):
+    return (vector_rag.upload_text_path(file_hash),
+            *(os.path.join(UPLOADS_DIR, f"{file_hash}{extension}") for extension in SUPPORTED_EXTENSIONS))
+
+
+def _remove_unused_files(file_hash):
+    """Removes an upload's stored file and extracted text once no document (of any user) refers to them."""
+    if document_file_in_use(file_hash):
+        return
+    for path in _stored_file_paths(file_hash):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _ingest(document_id):
+    """
+    Extracts, chunks, embeds (in batches, reporting progress) and indexes one queued document, if this
+    worker can claim it: every process re-queues unfinished documents, but only one ingests each.
+    """
+    document = claim_document(document_id, WORKER_ID)
+    if document is None:
+        return # Deleted, already handled (e.g. queued twice) or being ingested by another worker
+    file_hash = document["file_hash"]
+
+    def report(**fields):
+        # Progress updates renew the claim; they fail once the document is deleted or taken over
+        if not update_document(document_id, claimed_by=WORKER_ID, **fields):
+            raise ClaimLostError(file_hash)
+
+    text_path = vector_rag.upload_text_path(file_hash)
+    extension = os.path.splitext(document["filename"])[1].lower()
+    upload_path = os.path.join(UPLOADS_DIR, f"{file_hash}{extension}")
+
+    if not os.path.exists(text_path):
+        report(status="extracting")
+        text = extract_text(upload_path, extension)
+        if not text.strip():
+            raise ValueError("No text content found in the document (scanned PDFs need OCR first).")
+        with open(text_path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(text_path + ".tmp", text_path)
+    else:
+        with open(text_path, "r", encoding="utf-8") as f:
+            text = f.read()
+    if os.path.exists(upload_path):
+        os.remove(upload_path) # Only the extracted text is kept
+
+    chunks = vector_rag.document_chunks(document, text)
+    chunk_ids = list(chunks)
+    report(status="embedding", chunks_done=0, chunks_total=len(chunk_ids))
+    # Embed in batches through the embedding cache, so progress can be reported and indexing below is cache hits only
+    for start in range(0, len(chunk_ids), EMBEDDING_BATCH_SIZE):
+        batch = chunk_ids[start:start + EMBEDDING_BATCH_SIZE]
+        vector_rag.embedding_cache.embed([chunks[chunk_id][0] for chunk_id in batch], [chunks[chunk_id][1] for chunk_id in batch])
+        report(chunks_done=start + len(batch))
+
+    report(status="indexing")
+    vector_rag.initialize_vector_db() # No-op after the first call in this process
+    if vector_rag.index_document(document, chunks) is None:
+        raise ClaimLostError(file_hash) # Deleted while embedding (re-checked under the index lock)
+    report(status="ready")
+
+
+def _queue_unclaimed():
+    for document_id in get_unclaimed_document_ids():
+        _queue.put(document_id)
+
+
+def _run_worker():
+    while True:
+        try:
+            document_id = _queue.get(timeout=DOCUMENT_CLAIM_LEASE.total_seconds())
+        except queue.Empty:
+            _queue_unclaimed() # Idle: take over documents whose worker (in any process) stopped renewing its claim
+            continue
+        _process(document_id)
+
+
+def _process(document_id):
+    try:
+        _ingest(document_id)
+    except ClaimLostError as e:
+        print(f"DEBUG: Stopped ingesting document {document_id}: it was deleted or taken over by another worker.")
+        try:
+            _remove_unused_files(e.args[0]) # Text extracted after a concurrent remove_document looked for it
+        except Exception as cleanup_error:
+            print(f"ERROR: Failed to remove the stored files of deleted document {document_id}: {cleanup_error}")
+    except Exception as e:
+        print(f"ERROR: Failed to ingest document {document_id}: {e}")
+        try:
+            update_document(document_id, claimed_by=WORKER_ID, status="failed", error=str(e))
+        except Exception as update_error:
+            print(f"ERROR: Failed to mark document {document_id} as failed: {update_error}")
+
+
+def start_ingestion_worker():
+    """
+    Starts the background ingestion thread (once per process) and queues the unfinished documents no
+    worker holds (left by a previous run); processes that queue the same document race to claim it.
+    """
+    global _worker
+    with _worker_lock:
+        if _worker is not None:
+            return
+        _worker = threading.Thread(target=_run_worker, name="document-ingest", daemon=True)
+        _worker.start()
+    _queue_unclaimed()
+
+
+def get_user_documents(user_id):
+    """Returns the user's uploaded documents with ingestion progress ("progress" from 0.0 to 1.0), newest first."""
+    documents = get_documents(user_id)
+    for document in documents:
+        if document["status"] == "ready":
+            document["progress"] = 1.0
+        elif document["chunks_total"]:
+            document["progress"] = document["chunks_done"] / document["chunks_total"]
+        else:
+            document["progress"] = 0.0
+    return documents
+
+
+def remove_document(user_id, document_id):
+    """Deletes an uploaded document and its chunks; its stored text is removed once no user has the file."""
+    result = delete_document(user_id, document_id)
+    if not result["success"]:
+        return result
+    try:
+        vector_rag.drop_document(document_id)
+        if not result["hash_in_use"]:
+            for path in _stored_file_paths(result["file_hash"]):
+                if os.path.exists(path):
+                    os.remove(path)
+    except Exception as e:
+        print(f"ERROR: Failed to remove chunks of document {document_id}: {e}")
+        return {"success": False, "error": str(e)}
+    return {"success": True}
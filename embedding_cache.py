@@ -0,0 +1,211 @@
+# embedding_cache.py
+import hashlib
+import mmap
+import os
+import threading
+import time
+from array import array
+
+from db_pool import ConnectionPool
+
+# --- Tunables (override through environment variables if needed) ---
+EMBEDDING_CACHE_DIR = os.getenv("EDUMATE_EMBEDDING_CACHE_DIR", os.path.join("data", "embedding_cache"))
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EDUMATE_EMBEDDING_CACHE_MAX_ENTRIES", "100000"))  # Rows kept before LRU eviction
+EMBEDDING_BATCH_SIZE = int(os.getenv("EDUMATE_EMBEDDING_BATCH_SIZE", "64"))  # Texts per call to the embedding model
+TOUCH_INTERVAL_SECONDS = 60  # last_used is refreshed at most this often per entry, so hits rarely write
+
+TAG_BYTES = 8  # Each row starts with the first bytes of its content hash, checked on every read
+SQL_VARIABLE_CHUNK = 500
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Content hash -> embedding vector, shared by every process (and replica) using the same directory.
+
+    Vectors are float32 rows in one memory-mapped file (vectors.f32). An SQLite index (index.db) maps
+    each content hash to its row number and when it was last used; once max_entries rows are taken the
+    least recently used rows are reused. Every row is tagged with its hash, so a row overwritten by
+    another process between index lookup and read counts as a miss instead of returning a wrong vector.
+    Keep one directory per embedding model.
+    """
+
+    def __init__(self, directory, embed_fn, max_entries=EMBEDDING_CACHE_MAX_ENTRIES, batch_size=EMBEDDING_BATCH_SIZE):
+        self.directory = directory
+        self.embed_fn = embed_fn  # list of texts -> list of vectors
+        self.max_entries = max(1, max_entries)
+        self.batch_size = max(1, batch_size)
+        self._lock = threading.Lock()
+        self._map = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self.index = ConnectionPool(os.path.join(directory, "index.db"), write_queue=False)
+        with self.index.transaction() as cursor:
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    content_hash TEXT PRIMARY KEY,
+                    slot INTEGER NOT NULL UNIQUE, -- Row number in vectors.f32
+                    last_used REAL NOT NULL
+                ) WITHOUT ROWID
+            """)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_entries_last_used ON entries (last_used)")
+            cursor.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            cursor.execute("SELECT value FROM meta WHERE key = 'dim'")
+            row = cursor.fetchone()
+        self.dim = int(row[0]) if row else None
+        self._file = open(os.path.join(directory, "vectors.f32"), "a+b")
+
+    # --- Vector file ---
+
+    def _row_bytes(self):
+        return TAG_BYTES + self.dim * 4
+
+    def _mapped(self, min_size):
+        """Returns a mapping covering at least min_size bytes, remapping if the file grew (here or elsewhere)."""
+        if self._map is None or len(self._map) < min_size:
+            size = os.fstat(self._file.fileno()).st_size
+            if size < min_size:
+                return None
+            if self._map is not None:
+                self._map.close()
+            self._map = mmap.mmap(self._file.fileno(), size)
+        return self._map
+
+    def _read_row(self, digest, slot):
+        offset = slot * self._row_bytes()
+        mapped = self._mapped(offset + self._row_bytes())
+        if mapped is None or mapped[offset:offset + TAG_BYTES] != bytes.fromhex(digest)[:TAG_BYTES]:
+            return None
+        vector = array("f")
+        vector.frombytes(mapped[offset + TAG_BYTES:offset + self._row_bytes()])
+        return vector.tolist()
+
+    def _write_rows(self, rows):
+        """rows: [(digest, slot, vector)]. Grows the file geometrically (up to max_entries rows) as needed."""
+        needed = (max(slot for _, slot, _ in rows) + 1) * self._row_bytes()
+        size = os.fstat(self._file.fileno()).st_size
+        if size < needed:
+            os.ftruncate(self._file.fileno(), max(needed, min(size * 2, self.max_entries * self._row_bytes())))
+        mapped = self._mapped(needed)
+        for digest, slot, vector in rows:
+            offset = slot * self._row_bytes()
+            mapped[offset:offset + self._row_bytes()] = bytes.fromhex(digest)[:TAG_BYTES] + array("f", vector).tobytes()
+        mapped.flush()
+
+    # --- Lookups ---
+
+    def get_many(self, digests):
+        """Returns {content_hash: vector} for the hashes that are cached."""
+        found = {}
+        if self.dim is None or not digests:
+            return found
+        digests = list(digests)
+        rows = []
+        with self.index.read() as cursor:
+            for i in range(0, len(digests), SQL_VARIABLE_CHUNK):
+                part = digests[i:i + SQL_VARIABLE_CHUNK]
+                cursor.execute(f"SELECT content_hash, slot, last_used FROM entries WHERE content_hash IN ({','.join('?' * len(part))})", part)
+                rows.extend(cursor.fetchall())
+        now = time.time()
+        touched = []
+        with self._lock:
+            for digest, slot, last_used in rows:
+                vector = self._read_row(digest, slot)
+                if vector is not None:
+                    found[digest] = vector
+                    if now - last_used > TOUCH_INTERVAL_SECONDS:
+                        touched.append((now, digest))
+        if touched:
+            self.index.write(lambda cursor: cursor.executemany("UPDATE entries SET last_used = ? WHERE content_hash = ?", touched))
+        return found
+
+    def put_many(self, vectors):
+        """Stores {content_hash: vector}, evicting the least recently used rows if the cache is full."""
+        if not vectors:
+            return
+        if self.dim is None:
+            self.dim = len(next(iter(vectors.values())))
+            self.index.write(lambda cursor: cursor.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('dim', ?)", (str(self.dim),)))
+        if any(len(vector) != self.dim for vector in vectors.values()):
+            print(f"WARNING: Embedding dimension does not match the cache in {self.directory} ({self.dim}); not caching.")
+            return
+
+        def _store(cursor):
+            # The write transaction serializes slot allocation across processes sharing the directory
+            digests = list(vectors)
+            present = set()
+            for i in range(0, len(digests), SQL_VARIABLE_CHUNK):
+                part = digests[i:i + SQL_VARIABLE_CHUNK]
+                cursor.execute(f"SELECT content_hash FROM entries WHERE content_hash IN ({','.join('?' * len(part))})", part)
+                present.update(row[0] for row in cursor.fetchall())
+            new = [digest for digest in digests if digest not in present][:self.max_entries]
+            if not new:
+                return 0
+            # Slots are handed out contiguously and evicted slots are reused, so MAX(slot) + 1 is the first unused row
+            cursor.execute("SELECT COALESCE(MAX(slot) + 1, 0) FROM entries")
+            next_slot = cursor.fetchone()[0]
+            slots = list(range(next_slot, min(next_slot + len(new), self.max_entries)))
+            evicted = 0
+            if len(slots) < len(new):
+                cursor.execute("SELECT content_hash, slot FROM entries ORDER BY last_used LIMIT ?", (len(new) - len(slots),))
+                victims = cursor.fetchall()
+                cursor.executemany("DELETE FROM entries WHERE content_hash = ?", [(digest,) for digest, _ in victims])
+                slots.extend(slot for _, slot in victims)
+                evicted = len(victims)
+            rows = [(digest, slot, vectors[digest]) for digest, slot in zip(new, slots)]
+            with self._lock:
+                self._write_rows(rows) # Vectors land before the index rows that point at them commit
+            now = time.time()
+            cursor.executemany("INSERT INTO entries (content_hash, slot, last_used) VALUES (?, ?, ?)",
+                               [(digest, slot, now) for digest, slot, _ in rows])
+            return evicted
+
+        self.evictions += self.index.write(_store)
+
+    def embed(self, texts, digests=None):
+        """
+        Returns one vector per text. Cached vectors are read from disk; only the misses are sent to the
+        embedding model, in batches of batch_size, and then stored. digests may pass precomputed content hashes.
+        """
+        digests = list(digests) if digests is not None else [content_hash(text) for text in texts]
+        texts_by_digest = dict(zip(digests, texts))
+        try:
+            found = self.get_many(texts_by_digest)
+        except Exception as e:
+            print(f"WARNING: Embedding cache lookup failed, embedding everything: {e}")
+            found = {}
+        missing = [digest for digest in texts_by_digest if digest not in found]
+        self.hits += len(texts_by_digest) - len(missing)
+        self.misses += len(missing)
+        for i in range(0, len(missing), self.batch_size):
+            batch = missing[i:i + self.batch_size]
+            vectors = {digest: [float(x) for x in vector]
+                       for digest, vector in zip(batch, self.embed_fn([texts_by_digest[digest] for digest in batch]))}
+            found.update(vectors)
+            try:
+                self.put_many(vectors)
+            except Exception as e:
+                print(f"WARNING: Failed to store {len(vectors)} embeddings in the cache: {e}")
+        return [found[digest] for digest in digests]
+
+    def stats(self):
+        """Returns hit/miss/eviction counters of this process plus the cache's shared size."""
+        with self.index.read() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM entries")
+            entries = cursor.fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "file_bytes": os.fstat(self._file.fileno()).st_size,
+        }
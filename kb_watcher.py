@@ -0,0 +1,91 @@
+# kb_watcher.py
+import os
+import threading
+import time
+import vector_rag
+
+KB_WATCH_ENABLED = os.getenv("EDUMATE_KB_WATCH", "0") == "1" # Opt-in: live reindex of knowledge_base/ edits
+KB_WATCH_INTERVAL_SECONDS = float(os.getenv("EDUMATE_KB_WATCH_INTERVAL_SECONDS", "2"))
+# A file is reindexed once it has stopped changing for this long (editors and copies write in several steps)
+KB_WATCH_DEBOUNCE_SECONDS = float(os.getenv("EDUMATE_KB_WATCH_DEBOUNCE_SECONDS", "3"))
+
+_watcher = None
+_watcher_lock = threading.Lock()
+
+
+def _scan(directory):
+    """Returns {filename: (mtime_ns, size)} for the .txt files in directory."""
+    snapshot = {}
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(".txt") and entry.is_file():
+                    stat = entry.stat()
+                    snapshot[entry.name] = (stat.st_mtime_ns, stat.st_size)
+    except FileNotFoundError:
+        pass
+    return snapshot
+
+
+class KnowledgeBaseWatcher:
+    """
+    Polls knowledge_base/ for added, edited and deleted .txt files (mtime and size; no OS file events or
+    external services) and reindexes each changed file on its own through vector_rag.reindex_knowledge_file,
+    once it has been stable for debounce_seconds.
+    """
+
+    def __init__(self, directory=vector_rag.KNOWLEDGE_BASE_DIR, interval_seconds=KB_WATCH_INTERVAL_SECONDS,
+                 debounce_seconds=KB_WATCH_DEBOUNCE_SECONDS, reindex_file=vector_rag.reindex_knowledge_file):
+        self.directory = directory
+        self.interval_seconds = interval_seconds
+        self.debounce_seconds = debounce_seconds
+        self.reindex_file = reindex_file
+        self.reindexed = 0
+        self._snapshot = _scan(directory)
+        self._pending = {} # filename -> monotonic time of its last observed change
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="kb-watcher", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def poll(self):
+        """One scan: records changes, then reindexes files whose last change is older than the debounce window."""
+        now = time.monotonic()
+        snapshot = _scan(self.directory)
+        for filename in snapshot.keys() | self._snapshot.keys():
+            if snapshot.get(filename) != self._snapshot.get(filename):
+                self._pending[filename] = now
+        self._snapshot = snapshot
+
+        for filename, changed_at in list(self._pending.items()):
+            if now - changed_at < self.debounce_seconds:
+                continue
+            del self._pending[filename]
+            try:
+                self.reindex_file(filename)
+                self.reindexed += 1
+            except Exception as e:
+                print(f"ERROR: Failed to reindex knowledge base file {filename}: {e}")
+
+    def _run(self):
+        while not self._stop.wait(self.interval_seconds):
+            self.poll()
+
+
+def start_knowledge_base_watcher():
+    """Starts the knowledge_base/ watcher thread once per process if EDUMATE_KB_WATCH=1. Returns it (or None)."""
+    global _watcher
+    if not KB_WATCH_ENABLED:
+        return None
+    with _watcher_lock:
+        if _watcher is None:
+            _watcher = KnowledgeBaseWatcher().start()
+            print(f"DEBUG: Watching {vector_rag.KNOWLEDGE_BASE_DIR}/ for changes every {KB_WATCH_INTERVAL_SECONDS}s.")
+        return _watcher
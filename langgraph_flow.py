@@ -1,6 +1,6 @@
 # langgraph_flow.py
 import streamlit as st
-from data_manager import get_tasks # This now gets tasks from local SQLite
+from data_manager import query_tasks # Filtered task queries against local SQLite
 from datetime import datetime, timedelta
 
 def run_agent(student_name="Student"):
@@ -14,23 +14,10 @@ def run_agent(student_name="Student"):
     if not user_id:
         return "Reminder system not fully initialized. Please refresh the app."
 
-    # Retrieve tasks for the current user from the data manager (which uses SQLite)
-    tasks = get_tasks(user_id) # Pass only user_id
-
+    # Ask SQLite only for pending tasks due today or in the next two days, soonest first
     today = datetime.now().date()
-    urgent_tasks = []
-    # Iterate through tasks to find those that are pending and due within the next 2 days
-    for task in tasks:
-        try:
-            if not task.get("completed", False): # Only consider tasks that are not yet completed
-                due_date = datetime.strptime(task["due_date"], "%Y-%m-%d").date()
-                # Check if due date is today or in the next two days
-                if today <= due_date <= today + timedelta(days=2):
-                    urgent_tasks.append(task)
-        except ValueError:
-            # Print an error for tasks with invalid date formats, but continue processing others
-            print(f"WARNING: Skipping task due to invalid date format: {task}")
-            continue
+    urgent_tasks = query_tasks(user_id, status="pending", due_from=today, due_to=today + timedelta(days=2),
+                               order_by="due_date", limit=None)["tasks"]
 
     if urgent_tasks:
         # Construct a friendly reminder message with urgent tasks listed
@@ -2,6 +2,7 @@
 import streamlit as st
 import os
 import json
+from datetime import datetime
 
 from dotenv import load_dotenv
 
@@ -26,6 +27,15 @@ from _pages import chatbot_page
 from _pages import admin_page
 from _pages import roadmap_page
 from _pages import agents_tools_page # NEW: Import the unified agents tools page
+from data_manager import search, resume_session_from_nonce, revoke_session_hash, RESUME_NONCE_TTL
+from session_store import PAGE_SESSION_KEYS, hydrate_session_state, sync_session_state, detach_session_state
+from document_ingest import start_ingestion_worker
+from kb_watcher import start_knowledge_base_watcher
+
+# Background ingestion of uploaded documents (once per process; resumes uploads a restart interrupted)
+start_ingestion_worker()
+# Live reindex of edited knowledge_base/ files (only with EDUMATE_KB_WATCH=1)
+start_knowledge_base_watcher()
 
 # --- Session State Initialization ---
 if 'is_logged_in' not in st.session_state:
@@ -42,9 +52,6 @@ if 'chatbot_messages' not in st.session_state: # Ensure chat history is initiali
 if 'app_id' not in st.session_state: 
     st.session_state.app_id = os.getenv("__app_id", "default-app-id")
 
-# Initialize quiz history (needed by TrackerAgent and QuizAgent)
-if 'quiz_history' not in st.session_state:
-    st.session_state.quiz_history = []
 # Initialize for PlannerAgent
 if 'current_study_plan' not in st.session_state:
     st.session_state.current_study_plan = None
@@ -52,6 +59,33 @@ if 'plan_duration' not in st.session_state:
     st.session_state.plan_duration = None
 
 
+# Resume a session after a refresh/reconnect from the one-time nonce in the URL (no password check needed).
+# The nonce is consumed and replaced, and is also rotated halfway through its lifetime while the user is active;
+# a rotation that fails means the session was revoked (e.g. logged out elsewhere).
+if st.query_params.get("resume") and (not st.session_state.is_logged_in or
+                                      datetime.now() - st.session_state.get("resume_nonce_issued_at", datetime.min) > RESUME_NONCE_TTL / 2):
+    resumed = resume_session_from_nonce(st.query_params["resume"])
+    if resumed["success"]:
+        st.session_state.is_logged_in = True
+        if st.session_state.user_id != resumed["user_id"]:
+            st.session_state.current_page = "Dashboard"
+            # Another user's chat/plan/quiz state must not be shown to (or saved under) this one
+            detach_session_state(st.session_state)
+            st.session_state.chatbot_messages = []
+            st.session_state.current_study_plan = None
+            st.session_state.plan_duration = None
+        st.session_state.user_id = resumed["user_id"]
+        st.session_state.session_token_hash = resumed["token_hash"]
+        st.session_state.resume_nonce_issued_at = datetime.now()
+        st.query_params["resume"] = resumed["nonce"]
+    else:
+        del st.query_params["resume"]
+        if st.session_state.is_logged_in: # Revoked or expired while this tab was open
+            st.session_state.is_logged_in = False
+            st.session_state.user_id = None
+            st.session_state.current_page = "Login"
+            detach_session_state(st.session_state)
+
 # --- Main Application Logic ---
 
 # Sidebar for navigation
@@ -75,20 +109,41 @@ if st.session_state.is_logged_in:
     if st.sidebar.button("⚙️ Admin", key="nav_admin"):
         st.session_state.current_page = "Admin"
     
+    # Full-text search over tasks, subjects, topics, summaries, flashcards and chat messages (SQLite FTS5)
+    search_query = st.sidebar.text_input("🔎 Search", key="sidebar_search", placeholder="Tasks, topics, notes...")
+    if search_query.strip():
+        search_icons = {"task": "📝", "subject": "📚", "topic": "📖", "summary": "📄", "flashcards": "🧠", "chat_message": "💬"}
+        results = search(st.session_state.user_id, search_query, limit=10)
+        if results:
+            for hit in results:
+                st.sidebar.markdown(f"{search_icons.get(hit['kind'], '•')} **{hit['title'][:60]}**")
+                if hit['snippet'].strip():
+                    st.sidebar.caption(hit['snippet'])
+        else:
+            st.sidebar.caption("No matches found.")
+
     # Logout functionality for local session
     if st.sidebar.button("🚪 Logout", key="nav_logout"):
+        if st.session_state.get("session_token_hash"):
+            revoke_session_hash(st.session_state.session_token_hash)
+            st.session_state.session_token_hash = None
+        st.query_params.clear()
         st.session_state.is_logged_in = False
         st.session_state.user_id = None
         st.session_state.is_guest = False
         st.session_state.current_page = "Login"
         st.session_state.urgent_reminder_displayed = False 
+        detach_session_state(st.session_state) # Stored chat/plan/quiz state stays for the next login
         st.session_state.chatbot_messages = [] 
-        st.session_state.quiz_history = [] 
         st.session_state.current_study_plan = None 
         st.session_state.plan_duration = None 
         st.success("You have been logged out. 👋")
         st.rerun()
 
+    # Lazily load this page's persisted state (chat, study plan, quiz/flashcard progress) from the shared store
+    hydrate_session_state(st.session_state, st.session_state.user_id,
+                          PAGE_SESSION_KEYS.get(st.session_state.current_page, ()))
+
     # Render the selected page, passing user_id
     if st.session_state.current_page == "Dashboard":
         render_student_dashboard(st.session_state.user_id, st.session_state.is_guest, st.session_state.app_id)
@@ -100,6 +155,9 @@ if st.session_state.is_logged_in:
         chatbot_page.render_chatbot_page(st.session_state.user_id)
     elif st.session_state.current_page == "Admin":
         admin_page.render_admin_page(st.session_state.user_id)
+
+    # Queue whatever changed this run; the store writes it behind in batches
+    sync_session_state(st.session_state, st.session_state.user_id)
 else:
     # Render login page if not logged in
     login_page.render_login_page()
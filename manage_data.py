@@ -0,0 +1,50 @@
+# manage_data.py
+"""
+Admin command line for backing up and restoring EduMate user data (NDJSON, gzip when the path ends in .gz).
+
+Usage:
+    python manage_data.py export backup.ndjson.gz              # every user
+    python manage_data.py export alice.ndjson --user alice     # one user
+    python manage_data.py import backup.ndjson.gz
+"""
+import argparse
+import sys
+
+from data_manager import export_user, export_all_users, import_user, open_export_file
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Back up or restore EduMate user data.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="Write users' data to an NDJSON file")
+    export_parser.add_argument("path", help="Output file (.gz for gzip compression)")
+    export_parser.add_argument("--user", help="Only export this username")
+    import_parser = subparsers.add_parser("import", help="Upsert users' data from an NDJSON file")
+    import_parser.add_argument("path", help="Input file written by 'export'")
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        lines = export_user(args.user) if args.user else export_all_users()
+        count = 0
+        try:
+            with open_export_file(args.path, "w") as out:
+                for line in lines:
+                    out.write(line)
+                    count += 1
+        except Exception as e:
+            print(f"ERROR: Export failed: {e}")
+            return 1
+        print(f"Exported {count - 1} records to {args.path}")
+        return 0
+
+    with open_export_file(args.path, "r") as stream:
+        result = import_user(stream)
+    if not result["success"]:
+        print(f"ERROR: Import stopped after {result['records']} records: {result['error']}")
+        return 1
+    print(f"Imported {result['records']} records for {len(result['users'])} user(s) from {args.path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+# password_hashing.py
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# --- Tunables (override through environment variables if needed) ---
+SCRYPT_N = int(os.getenv("EDUMATE_SCRYPT_N", str(2 ** 14)))  # CPU/memory work factor (power of two)
+SCRYPT_R = int(os.getenv("EDUMATE_SCRYPT_R", "8"))
+SCRYPT_P = int(os.getenv("EDUMATE_SCRYPT_P", "1"))
+PBKDF2_ITERATIONS = int(os.getenv("EDUMATE_PBKDF2_ITERATIONS", "600000"))  # Used only where hashlib has no scrypt
+KDF_WORKERS = int(os.getenv("EDUMATE_KDF_WORKERS", str(min(2, os.cpu_count() or 1))))
+KDF_MAX_PENDING = int(os.getenv("EDUMATE_KDF_MAX_PENDING", "32"))  # Hash jobs queued or running before logins are turned away
+KDF_TIMEOUT_SECONDS = float(os.getenv("EDUMATE_KDF_TIMEOUT_SECONDS", "10"))
+
+HAS_SCRYPT = hasattr(hashlib, "scrypt")
+
+
+class KdfBusyError(Exception):
+    """Raised when too many password hashes are already queued (e.g. a login storm)."""
+
+
+def _b64(data):
+    return base64.b64encode(data).decode("ascii")
+
+
+def hash_password(password):
+    """
+    Returns a self-describing hash string: "scrypt$N$r$p$salt$hash" (or "pbkdf2_sha256$iterations$salt$hash"
+    if this Python's hashlib lacks scrypt). The work factor is stored with the hash, so it can be raised later.
+    """
+    salt = secrets.token_bytes(16)
+    if HAS_SCRYPT:
+        digest = hashlib.scrypt(password.encode("utf-8"), salt=salt, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P,
+                                maxmem=256 * SCRYPT_N * SCRYPT_R, dklen=32)
+        return f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${_b64(salt)}${_b64(digest)}"
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, PBKDF2_ITERATIONS)
+    return f"pbkdf2_sha256${PBKDF2_ITERATIONS}${_b64(salt)}${_b64(digest)}"
+
+
+def _dummy_password_hash():
+    """A well-formed hash with the current work factor that no password matches (random salt and digest)."""
+    salt, digest = _b64(secrets.token_bytes(16)), _b64(secrets.token_bytes(32))
+    if HAS_SCRYPT:
+        return f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${salt}${digest}"
+    return f"pbkdf2_sha256${PBKDF2_ITERATIONS}${salt}${digest}"
+
+
+# Verified in place of a stored hash when the username does not exist, so that login costs the same
+# KDF time either way and response times do not reveal which usernames are registered
+DUMMY_PASSWORD_HASH = _dummy_password_hash()
+
+
+def is_password_hash(stored):
+    return bool(stored) and stored.startswith(("scrypt$", "pbkdf2_sha256$"))
+
+
+def verify_password(password, stored):
+    """
+    Checks a password against a stored value. Returns (matches, needs_rehash).
+    needs_rehash is True for legacy plaintext rows and for hashes made with a different work factor.
+    """
+    if not stored:
+        return False, False
+    try:
+        if stored.startswith("scrypt$"):
+            _, n, r, p, salt, expected = stored.split("$")
+            n, r, p = int(n), int(r), int(p)
+            digest = hashlib.scrypt(password.encode("utf-8"), salt=base64.b64decode(salt), n=n, r=r, p=p,
+                                    maxmem=256 * n * r, dklen=32)
+            outdated = not HAS_SCRYPT or (n, r, p) != (SCRYPT_N, SCRYPT_R, SCRYPT_P)
+            return hmac.compare_digest(digest, base64.b64decode(expected)), outdated
+        if stored.startswith("pbkdf2_sha256$"):
+            _, iterations, salt, expected = stored.split("$")
+            digest = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), base64.b64decode(salt), int(iterations))
+            outdated = HAS_SCRYPT or int(iterations) != PBKDF2_ITERATIONS
+            return hmac.compare_digest(digest, base64.b64decode(expected)), outdated
+    except (ValueError, TypeError) as e:
+        print(f"WARNING: Unreadable password hash: {e}")
+        return False, False
+    # Legacy plaintext row: compare in constant time, then upgrade
+    return hmac.compare_digest(password.encode("utf-8"), stored.encode("utf-8")), True
+
+
+# --- Bounded KDF pool ---
+# Hashing runs on a few dedicated threads so concurrent logins cannot occupy every core, and
+# callers beyond KDF_MAX_PENDING are turned away immediately instead of piling up.
+_kdf_pool = ThreadPoolExecutor(max_workers=max(1, KDF_WORKERS), thread_name_prefix="kdf")
+_kdf_slots = threading.BoundedSemaphore(max(1, KDF_MAX_PENDING))
+
+
+def run_kdf(fn, *args):
+    """Runs hash_password/verify_password on the bounded pool and waits for the result."""
+    if not _kdf_slots.acquire(blocking=False):
+        raise KdfBusyError("Too many login attempts in progress. Please try again in a moment.")
+    try:
+        future = _kdf_pool.submit(fn, *args)
+    except BaseException:
+        _kdf_slots.release()
+        raise
+    future.add_done_callback(lambda _: _kdf_slots.release())
+    return future.result(timeout=KDF_TIMEOUT_SECONDS)
@@ -0,0 +1,114 @@
+# read_cache.py
+import functools
+import os
+import threading
+from collections import OrderedDict
+
+READ_CACHE_MAX_ENTRIES = int(os.getenv("EDUMATE_READ_CACHE_MAX_ENTRIES", "2048"))  # 0 disables the cache
+
+
+class UserReadCache:
+    """
+    Process-wide LRU cache for per-user reads.
+
+    Keys are (user_id, user's version, function name, arguments). Any write for a user bumps that
+    user's version, so every older entry stops matching at once and simply ages out of the LRU.
+    A user's version is forgotten once none of their entries are cached and none of their reads are in
+    flight, so the bookkeeping stays bounded by the LRU rather than by every user ever seen.
+    Cached values are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self, max_entries=READ_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._entry_counts = {} # user_id -> number of their entries in _entries
+        self._readers = {} # user_id -> reads computing a value right now
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def cached(self, func):
+        """Decorator for functions whose first argument is the user_id. Exceptions are never cached."""
+        @functools.wraps(func)
+        def wrapper(user_id, *args, **kwargs):
+            if self.max_entries <= 0:
+                return func(user_id, *args, **kwargs)
+            try:
+                call_key = (func.__name__, args, tuple(sorted(kwargs.items())))
+                hash(call_key)
+            except TypeError:
+                return func(user_id, *args, **kwargs)  # Unhashable arguments: bypass the cache
+
+            with self._lock:
+                version = self._versions.get(user_id, 0)
+                key = (user_id, version) + call_key
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return self._entries[key]
+                self.misses += 1
+                self._readers[user_id] = self._readers.get(user_id, 0) + 1
+
+            try:
+                value = func(user_id, *args, **kwargs)
+            except BaseException:
+                with self._lock:
+                    self._release_reader(user_id)
+                raise
+
+            with self._lock:
+                # Only store if no write bumped the version while we were reading
+                if self._versions.get(user_id, 0) == version:
+                    if key not in self._entries:
+                        self._entry_counts[user_id] = self._entry_counts.get(user_id, 0) + 1
+                    self._entries[key] = value
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        evicted_key, _ = self._entries.popitem(last=False)
+                        self.evictions += 1
+                        self._entry_counts[evicted_key[0]] -= 1
+                        self._forget_if_idle(evicted_key[0])
+                self._release_reader(user_id)
+            return value
+        return wrapper
+
+    def _release_reader(self, user_id):
+        self._readers[user_id] -= 1
+        if self._readers[user_id] == 0:
+            del self._readers[user_id]
+            self._forget_if_idle(user_id)
+
+    def _forget_if_idle(self, user_id):
+        """Drops a user's bookkeeping once nothing cached or in flight depends on their version."""
+        if self._entry_counts.get(user_id, 0) == 0 and user_id not in self._readers:
+            self._entry_counts.pop(user_id, None)
+            self._versions.pop(user_id, None)
+
+    def invalidate(self, user_id):
+        """Drops every cached read for a user by bumping their version counter."""
+        with self._lock:
+            if user_id in self._entry_counts or user_id in self._readers: # Otherwise nothing depends on it
+                self._versions[user_id] = self._versions.get(user_id, 0) + 1
+
+    def clear(self):
+        """Drops every cached read for every user."""
+        with self._lock:
+            self._entries.clear()
+            self._entry_counts.clear()
+            # Only reads still in flight need a new version (so they do not store what they read)
+            self._versions = {user_id: self._versions.get(user_id, 0) + 1 for user_id in self._readers}
+
+    def stats(self):
+        """Returns hit/miss/eviction counters and the current size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
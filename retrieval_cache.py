@@ -0,0 +1,114 @@
+# retrieval_cache.py
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from bm25 import STOPWORDS
+
+RETRIEVAL_CACHE_MAX_ENTRIES = int(os.getenv("EDUMATE_RETRIEVAL_CACHE_MAX_ENTRIES", "1024"))  # 0 disables the cache
+RETRIEVAL_CACHE_TTL_SECONDS = float(os.getenv("EDUMATE_RETRIEVAL_CACHE_TTL_SECONDS", "600"))
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def normalize_query(query):
+    """Lowercased words without stopwords or punctuation: "What is Miller indices?" -> "miller indices"."""
+    words = _WORD_RE.findall(query.lower())
+    return " ".join(word for word in words if word not in STOPWORDS) or " ".join(words)
+
+
+class RetrievalCache:
+    """
+    Process-wide LRU + TTL cache of retrieval results.
+
+    bump() (on any reindex or syllabus change) drops every entry and advances the generation, so a result
+    computed while the index was changing is never stored. Each entry remembers how long it took to compute,
+    so hits can report the latency they saved. Cached values are shared and must be treated as read-only.
+    """
+
+    def __init__(self, max_entries=RETRIEVAL_CACHE_MAX_ENTRIES, ttl_seconds=RETRIEVAL_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries = OrderedDict() # key -> (value, stored_at, compute_seconds)
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.saved_seconds = 0.0
+
+    def bump(self):
+        """Invalidates every cached result (the index changed)."""
+        with self._lock:
+            self._entries.clear()
+            self.generation += 1
+
+    def get_or_compute(self, key, compute):
+        """Returns the cached value for key, or compute() (stored unless the generation changed meanwhile)."""
+        return self.get_or_compute_many([key], lambda missing: [compute()])[0]
+
+    def get_or_compute_many(self, keys, compute_missing):
+        """
+        Batched lookup: compute_missing(missing_keys) -> values is called once with the distinct keys not
+        in the cache. Returns one value per key, in order.
+        """
+        if self.max_entries <= 0:
+            distinct = list(dict.fromkeys(keys))
+            values = dict(zip(distinct, compute_missing(distinct)))
+            return [values[key] for key in keys]
+        now = time.monotonic()
+        found = {}
+        missing = {} # Ordered set of distinct keys to compute
+        with self._lock:
+            generation = self.generation
+            for key in keys:
+                if key in found or key in missing:
+                    continue
+                entry = self._entries.get(key)
+                if entry is not None:
+                    value, stored_at, compute_seconds = entry
+                    if now - stored_at <= self.ttl_seconds:
+                        self._entries.move_to_end(key)
+                        self.hits += 1
+                        self.saved_seconds += compute_seconds
+                        found[key] = value
+                        continue
+                    del self._entries[key]
+                    self.expirations += 1
+                self.misses += 1
+                missing[key] = None
+
+        if missing:
+            t0 = time.perf_counter()
+            missing = list(missing)
+            values = compute_missing(missing)
+            compute_seconds = (time.perf_counter() - t0) / len(missing) # A batch's cost is shared by its keys
+            found.update(zip(missing, values))
+            with self._lock:
+                if self.generation == generation:
+                    stored_at = time.monotonic()
+                    for key in missing:
+                        self._entries[key] = (found[key], stored_at, compute_seconds)
+                        self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+                        self.evictions += 1
+        return [found[key] for key in keys]
+
+    def stats(self):
+        """Returns hit/miss/eviction/expiration counters, the hit rate and the latency hits saved."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "saved_ms": self.saved_seconds * 1000,
+                "entries": len(self._entries),
+                "generation": self.generation,
+            }
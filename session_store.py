@@ -0,0 +1,180 @@
+# session_store.py
+import abc
+import atexit
+import json
+import os
+import threading
+import time
+
+from data_manager import load_session_values, save_session_values, delete_session_values
+
+# st.session_state keys that follow the user across app processes and restarts
+PERSISTED_SESSION_KEYS = (
+    "chatbot_messages",
+    "current_study_plan",
+    "plan_duration",
+    "selected_ai_tool",
+    "quiz_topic_tool",
+    "quiz_questions_tool",
+    "current_score_data_tool",
+    "current_flashcards_tool",
+    "flashcards_tool_source",
+    "flashcards_tool_reviewed",
+)
+SESSION_STORE_BACKEND = os.getenv("EDUMATE_SESSION_STORE", "sqlite")
+SESSION_FLUSH_INTERVAL_SECONDS = float(os.getenv("EDUMATE_SESSION_FLUSH_MS", "1000")) / 1000
+# Keys each page reads, so a page only loads the state it uses
+PAGE_SESSION_KEYS = {
+    "Chatbot": ("chatbot_messages",),
+    "AITools": tuple(key for key in PERSISTED_SESSION_KEYS if key != "chatbot_messages"),
+}
+_SNAPSHOT_KEY = "_persisted_session_snapshot" # Last stored JSON per key, kept in st.session_state
+
+
+class SessionStore(abc.ABC):
+    """
+    Where per-user session state lives. Values are JSON text. Subclass and pass a factory to
+    register_session_store() to back the app with another shared store (e.g. Redis).
+    """
+
+    @abc.abstractmethod
+    def load(self, user_id, keys):
+        """Returns {key: value} for the keys that are stored for this user."""
+
+    @abc.abstractmethod
+    def save(self, entries):
+        """Stores [(user_id, key, value_json)] (one batch)."""
+
+    @abc.abstractmethod
+    def delete(self, user_id, keys=None):
+        """Removes the given keys (all of them if keys is None) for this user."""
+
+
+class SQLiteSessionStore(SessionStore):
+    """Default store: the user_session_state table in the app's SQLite database."""
+
+    def load(self, user_id, keys):
+        return load_session_values(user_id, keys)
+
+    def save(self, entries):
+        save_session_values(entries)
+
+    def delete(self, user_id, keys=None):
+        delete_session_values(user_id, keys)
+
+
+class WriteBehindSessionStore(SessionStore):
+    """
+    Buffers saves in memory and writes them to the wrapped store in one batch per flush interval.
+    Repeated saves of the same key between flushes collapse into one write. Reads flush first,
+    so a process always sees its own writes.
+    """
+
+    def __init__(self, store, interval=SESSION_FLUSH_INTERVAL_SECONDS):
+        self.store = store
+        self.interval = interval
+        self._pending = {} # (user_id, key) -> value_json
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock() # Serializes writes to the wrapped store (flushes and deletes)
+        self._thread = threading.Thread(target=self._run, name="session-write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def load(self, user_id, keys):
+        self.flush()
+        return self.store.load(user_id, keys)
+
+    def save(self, entries):
+        with self._lock:
+            for user_id, key, value_json in entries:
+                self._pending[(user_id, key)] = value_json
+
+    def delete(self, user_id, keys=None):
+        # Waits for an in-flight flush, which could otherwise write the deleted values back after us
+        with self._write_lock:
+            with self._lock:
+                for pending_user, pending_key in list(self._pending):
+                    if pending_user == user_id and (keys is None or pending_key in keys):
+                        del self._pending[(pending_user, pending_key)]
+            self.store.delete(user_id, keys)
+
+    def flush(self):
+        with self._write_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return
+            try:
+                self.store.save([(user_id, key, value_json) for (user_id, key), value_json in pending.items()])
+            except Exception as e:
+                print(f"ERROR: Failed to flush {len(pending)} session state entries: {e}")
+                with self._lock:
+                    # Keep them for the next flush unless a newer value arrived meanwhile
+                    for entry, value_json in pending.items():
+                        self._pending.setdefault(entry, value_json)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.flush()
+
+
+_BACKENDS = {"sqlite": SQLiteSessionStore}
+_store = None
+_store_lock = threading.Lock()
+
+
+def register_session_store(name, factory):
+    """Makes a SessionStore factory selectable with EDUMATE_SESSION_STORE=<name>."""
+    _BACKENDS[name] = factory
+
+
+def get_session_store():
+    """Returns the process-wide store (the configured backend behind a write-behind buffer)."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            if SESSION_STORE_BACKEND not in _BACKENDS:
+                raise ValueError(f"Unknown session store backend: {SESSION_STORE_BACKEND}")
+            _store = WriteBehindSessionStore(_BACKENDS[SESSION_STORE_BACKEND]())
+        return _store
+
+
+def hydrate_session_state(state, user_id, keys=PERSISTED_SESSION_KEYS):
+    """
+    Lazily fills persisted keys that this Streamlit session has not loaded yet (one store read for
+    the missing keys; later calls for the same keys cost nothing).
+    """
+    snapshot = state.setdefault(_SNAPSHOT_KEY, {})
+    missing = [key for key in keys if key not in snapshot]
+    if not missing:
+        return
+    stored = get_session_store().load(user_id, missing)
+    for key in missing:
+        if key in stored:
+            state[key] = stored[key]
+        # Remember what the store holds, so sync only writes real changes
+        snapshot[key] = json.dumps(stored[key], sort_keys=True, default=str) if key in stored else None
+
+
+def sync_session_state(state, user_id):
+    """Queues every hydrated key whose value changed during this run for a write-behind save."""
+    snapshot = state.get(_SNAPSHOT_KEY, {})
+    changed = []
+    for key, stored_json in snapshot.items():
+        if key not in state:
+            continue
+        value_json = json.dumps(state[key], sort_keys=True, default=str)
+        if value_json != stored_json:
+            changed.append((user_id, key, value_json))
+            snapshot[key] = value_json
+    if changed:
+        get_session_store().save(changed)
+
+
+def detach_session_state(state):
+    """Drops persisted keys from this Streamlit session (e.g. on logout) without touching the stored copy."""
+    get_session_store().flush()
+    for key in PERSISTED_SESSION_KEYS:
+        state.pop(key, None)
+    state.pop(_SNAPSHOT_KEY, None)
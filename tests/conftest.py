@@ -0,0 +1,21 @@
+# tests/conftest.py
+import os
+import sys
+import tempfile
+import uuid
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+# data_manager and vector_rag open data/ relative to the working directory at import time:
+# run the whole session in a scratch directory so the real app database is never touched
+os.chdir(tempfile.mkdtemp(prefix="edumate-tests-"))
+
+
+@pytest.fixture
+def user_id():
+    """A freshly signed-up user (unique per test, so tests share the module-level database safely)."""
+    import data_manager
+    username = f"user_{uuid.uuid4().hex[:12]}"
+    assert data_manager.signup_user_local(username, "correct horse battery")["success"]
+    return username
@@ -0,0 +1,64 @@
+# tests/test_document_ingest.py
+import os
+import uuid
+from datetime import timedelta
+
+import pytest
+
+import data_manager
+import document_ingest
+import vector_rag
+from data_manager import add_document, claim_document, get_unclaimed_document_ids, update_document
+from document_ingest import remove_document
+
+TEXT = "Snell's law relates the angles of incidence and refraction. Total internal reflection needs a critical angle."
+
+
+@pytest.fixture
+def document(user_id):
+    return add_document(user_id, uuid.uuid4().hex, "optics.pdf")["document"]
+
+
+def _stored_chunk_ids(document_id):
+    return vector_rag.get_store().get(where={"document_id": document_id})["ids"]
+
+
+def test_indexed_document_is_dropped_on_remove(document):
+    stats = vector_rag.index_document(document, vector_rag.document_chunks(document, TEXT))
+    assert stats["added"] > 0 and _stored_chunk_ids(document["id"])
+
+    assert remove_document(document["user_id"], document["id"])["success"]
+    assert _stored_chunk_ids(document["id"]) == []
+
+
+def test_document_removed_before_indexing_is_not_indexed(document):
+    chunks = vector_rag.document_chunks(document, TEXT) # Embedded, then the user deletes the upload
+    assert remove_document(document["user_id"], document["id"])["success"]
+
+    assert vector_rag.index_document(document, chunks) is None
+    assert _stored_chunk_ids(document["id"]) == []
+    assert f"{vector_rag.UPLOAD_SOURCE_PREFIX}{document['id']}" not in vector_rag._load_manifest()["sources"]
+
+
+def test_only_one_worker_claims_a_document_until_its_claim_lapses(document, monkeypatch):
+    assert claim_document(document["id"], "worker-a")["claimed_by"] == "worker-a"
+    assert claim_document(document["id"], "worker-b") is None
+    assert document["id"] not in get_unclaimed_document_ids()
+    assert update_document(document["id"], claimed_by="worker-b", chunks_done=1) is False
+
+    monkeypatch.setattr(data_manager, "DOCUMENT_CLAIM_LEASE", timedelta(seconds=-1)) # worker-a stopped renewing
+    assert document["id"] in get_unclaimed_document_ids()
+    assert claim_document(document["id"], "worker-b")["claimed_by"] == "worker-b"
+    assert update_document(document["id"], claimed_by="worker-a", chunks_done=1) is False
+
+
+def test_text_extracted_after_a_concurrent_remove_is_deleted(document, monkeypatch):
+    def extract_then_removed(path, extension): # The user deletes the upload while it is being extracted
+        assert remove_document(document["user_id"], document["id"])["success"]
+        return TEXT
+
+    monkeypatch.setattr(document_ingest, "extract_text", extract_then_removed)
+    os.makedirs(data_manager.UPLOADS_DIR, exist_ok=True)
+    document_ingest._process(document["id"])
+    assert not os.path.exists(vector_rag.upload_text_path(document["file_hash"]))
+    assert _stored_chunk_ids(document["id"]) == []
@@ -0,0 +1,92 @@
+# tests/test_export_import.py
+import json
+
+import pytest
+
+from data_manager import (EXPORT_ID_TABLES, add_subject, add_task, archive_completed_tasks, db, export_user, get_all_subjects,
+                          get_quiz_history, import_user, mark_task_completed, query_tasks, save_artifact, save_quiz_attempt)
+
+REFERENCES = {record_type: references for record_type, _, _, _, _, references in EXPORT_ID_TABLES}
+
+
+@pytest.fixture
+def history(user_id):
+    """A user with a subject, linked live and archived tasks, a graded quiz and a saved artifact."""
+    add_subject(user_id, "Physics", ["Optics", "Waves"])
+    done_id = add_task(user_id, "Lens problems", "2024-01-15", "Physics", "Optics")["id"]
+    add_task(user_id, "Wave equation", "2024-01-20", "Physics", "Waves")
+    mark_task_completed(user_id, done_id)
+    archive_completed_tasks(older_than_days=0)
+    save_quiz_attempt(user_id, "Optics", {
+        "score_percentage": 50.0, "grade": "C", "total_questions": 2, "correct_answers": 1,
+        "detailed_results": [
+            {"question_num": 1, "question": "Focal length?", "user_answer": "f", "correct_answer": "f", "is_correct": True},
+            {"question_num": 2, "question": "Snell's law?", "user_answer": "x", "correct_answer": "n1 sin", "is_correct": False},
+        ],
+    })
+    save_artifact(user_id, "summary", "Light bends at interfaces.", title="Refraction")
+    return user_id
+
+
+def _records(lines):
+    return [record for record in map(json.loads, lines) if record["type"] != "export"]
+
+
+def _normalized(lines):
+    """
+    Export records with ids replaced by their position among records of the same type (references
+    resolved the same way) and the username blanked, so exports of the same data compare equal.
+    """
+    records = _records(lines)
+    positions, counts = {}, {}
+    for record in records:
+        if "id" in record:
+            positions[(record["type"], record["id"])] = counts.get(record["type"], 0)
+            counts[record["type"]] = counts.get(record["type"], 0) + 1
+    for record in records:
+        if "id" in record:
+            record["id"] = positions[(record["type"], record["id"])]
+        for column, referenced_type in REFERENCES.get(record["type"], {}).items():
+            if record[column] is not None:
+                record[column] = positions[(referenced_type, record[column])]
+        for column in ("user_id", "username"):
+            if column in record:
+                record[column] = "<user>"
+    return records
+
+
+def test_round_trip_into_the_same_database_is_idempotent(history):
+    exported = list(export_user(history))
+    assert {record["type"] for record in _records(exported)} >= {"user", "subject", "topic", "task", "archived_task",
+                                                                  "quiz_attempt", "quiz_question_result", "artifact"}
+    for _ in range(2):
+        result = import_user(exported)
+        assert result["success"] and result["users"] == [history]
+        assert _records(export_user(history)) == _records(exported)
+
+
+def test_import_under_colliding_ids_remaps_them_and_their_references(history):
+    exported = list(export_user(history))
+    # The same export restored as another user: every subject, topic, task and quiz id is already taken
+    other = f"{history}_copy"
+    renamed = [line.replace(json.dumps(history), json.dumps(other)) for line in exported]
+
+    result = import_user(renamed)
+    assert result["success"] and result["users"] == [other]
+
+    copied = list(export_user(other))
+    assert _normalized(copied) == _normalized(exported)
+    for record_type in ("subject", "topic", "task", "archived_task", "quiz_attempt", "quiz_question_result", "artifact"):
+        original_ids = {record["id"] for record in _records(exported) if record["type"] == record_type}
+        copied_ids = {record["id"] for record in _records(copied) if record["type"] == record_type}
+        assert original_ids and original_ids.isdisjoint(copied_ids), record_type
+
+    # The original user's data is untouched, and the copy's rows point at the copy's own parents
+    assert _records(export_user(history)) == _records(exported)
+    assert get_all_subjects(other)[0]["topics"] == ["Optics", "Waves"]
+    topic_ids = set(get_all_subjects(other)[0]["topic_ids"])
+    linked = query_tasks(other, include_archived=True)["tasks"]
+    assert len(linked) == 2 and all(task["topic_id"] in topic_ids for task in linked)
+    with db.read() as cursor:
+        cursor.execute("SELECT COUNT(*) FROM quiz_question_results WHERE attempt_id = ?", (get_quiz_history(other)[0]["id"],))
+        assert cursor.fetchone()[0] == 2
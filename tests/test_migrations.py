@@ -0,0 +1,95 @@
+# tests/test_migrations.py
+import sqlite3
+
+import pytest
+
+from db_migrations import LATEST_VERSION, apply_migrations, get_schema_version
+from db_pool import ConnectionPool
+
+# The schema edumate_offline.db had before migrations existed (created by the original init_sqlite_db)
+BASELINE_SCHEMA = """
+    CREATE TABLE users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE,
+        password TEXT,
+        created_at TEXT
+    );
+    CREATE TABLE tasks (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT,
+        task TEXT,
+        due_date TEXT,
+        completed INTEGER,
+        created_at TEXT,
+        subject_name TEXT,
+        topic_name TEXT,
+        FOREIGN KEY (user_id) REFERENCES users(username)
+    );
+    CREATE TABLE subjects (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT,
+        name TEXT,
+        topics TEXT,
+        created_at TEXT,
+        FOREIGN KEY (user_id) REFERENCES users(username)
+    );
+"""
+
+
+@pytest.fixture
+def baseline_pool(tmp_path):
+    path = str(tmp_path / "baseline.db")
+    conn = sqlite3.connect(path)
+    conn.executescript(BASELINE_SCHEMA)
+    conn.execute("INSERT INTO users (username, password, created_at) VALUES ('alice', 'plaintext', '2023-09-01T10:00:00')")
+    conn.executemany("INSERT INTO subjects (user_id, name, topics, created_at) VALUES (?, ?, ?, ?)", [
+        ("alice", "Physics", '["Optics", "Waves"]', "2023-09-01T10:00:00"),
+        ("alice", "Maths", "not json", "2023-09-01T10:00:00"),
+    ])
+    conn.executemany("INSERT INTO tasks (user_id, task, due_date, completed, created_at, subject_name, topic_name) "
+                     "VALUES (?, ?, ?, ?, ?, ?, ?)", [
+        ("alice", "Lens problems", "15/01/2024", 0, "2023-09-02T09:00:00", "Physics", "Waves"),
+        ("alice", "Revise", "someday", 1, "2023-09-03T09:00:00", None, None),
+        ("alice", "Exam", "2024-02-01", 0, "2023-09-04T09:00:00", "Physics", "Thermodynamics"),
+    ])
+    conn.commit()
+    conn.close()
+    pool = ConnectionPool(path, write_queue=False)
+    yield pool
+    pool.close_all()
+
+
+def test_baseline_database_upgrades_to_latest(baseline_pool):
+    assert get_schema_version(baseline_pool) == 0
+    assert apply_migrations(baseline_pool) == list(range(1, LATEST_VERSION + 1))
+    assert get_schema_version(baseline_pool) == LATEST_VERSION
+
+    with baseline_pool.read() as cursor:
+        cursor.execute("SELECT s.name, t.name, t.position FROM topics t JOIN subjects s ON s.id = t.subject_id "
+                       "ORDER BY t.id")
+        assert cursor.fetchall() == [("Physics", "Optics", 0), ("Physics", "Waves", 1)]
+        cursor.execute("SELECT COUNT(*) FROM subjects WHERE topics IS NOT NULL")
+        assert cursor.fetchone()[0] == 0
+
+        cursor.execute("SELECT t.task, t.due_date, tp.name, t.completed_at IS NOT NULL FROM tasks t "
+                       "LEFT JOIN topics tp ON tp.id = t.topic_id ORDER BY t.id")
+        assert cursor.fetchall() == [
+            ("Lens problems", "2024-01-15", "Waves", 0),
+            ("Revise", "someday", None, 1), # Unparseable dates are left for query_tasks to page in the NULL tier
+            ("Exam", "2024-02-01", None, 0), # Topic the subject does not have
+        ]
+
+        cursor.execute("SELECT title, kind FROM search_index WHERE search_index MATCH 'lens'")
+        assert cursor.fetchall() == [("Lens problems", "task")]
+        cursor.execute("SELECT password, seeded_at IS NOT NULL FROM users WHERE username = 'alice'")
+        assert cursor.fetchone() == ("plaintext", 1) # Hashed on the next login; never re-seeded
+
+
+def test_migrations_are_applied_once(baseline_pool):
+    apply_migrations(baseline_pool, target_version=3)
+    assert get_schema_version(baseline_pool) == 3
+    assert apply_migrations(baseline_pool) == list(range(4, LATEST_VERSION + 1))
+    assert apply_migrations(baseline_pool) == []
+    with baseline_pool.read() as cursor:
+        cursor.execute("SELECT COUNT(*) FROM topics")
+        assert cursor.fetchone()[0] == 2
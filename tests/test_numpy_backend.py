@@ -0,0 +1,117 @@
+# tests/test_numpy_backend.py
+import json
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import vector_backends
+from vector_backends import NumpyBackend, metadata_matches
+
+DIM = 8
+WHERES = [
+    {"scope": "shared"},
+    {"$or": [{"scope": "shared"}, {"user_id": "u1"}]},
+    {"$and": [{"scope": "user"}, {"user_id": {"$ne": "u2"}}]},
+    {"user_id": {"$in": ["u0", "u3"]}},
+    {"kind": {"$nin": [1, 2]}},
+]
+
+
+def _chunks(start, end, seed=0):
+    rng = np.random.default_rng(seed)
+    ids = [f"chunk_{i}" for i in range(start, end)]
+    metadatas = [{"scope": "shared", "kind": i % 3} if i % 2 else {"scope": "user", "user_id": f"u{i % 4}", "kind": i % 3}
+                 for i in range(start, end)]
+    return ids, rng.standard_normal((end - start, DIM)), [f"text {i}" for i in range(start, end)], metadatas
+
+
+def _expected_top(vectors, metadatas, query, where, k):
+    """Brute-force ranking over {id: vector} / {id: metadata}."""
+    ids = [chunk_id for chunk_id in vectors if not where or metadata_matches(metadatas[chunk_id], where)]
+    scores = [float(np.dot(vectors[chunk_id], query) / np.linalg.norm(vectors[chunk_id]) / np.linalg.norm(query))
+              for chunk_id in ids]
+    return [chunk_id for _, chunk_id in sorted(zip(scores, ids), reverse=True)[:k]]
+
+
+@pytest.fixture
+def small_matrix(monkeypatch):
+    # Small enough that a few dozen chunks grow the matrix and trigger compactions
+    monkeypatch.setattr(vector_backends, "NUMPY_INITIAL_CAPACITY", 16)
+    monkeypatch.setattr(vector_backends, "NUMPY_COMPACT_MIN_DEAD_ROWS", 8)
+    monkeypatch.setattr(vector_backends, "NUMPY_QUERY_BLOCK_ROWS", 16)
+
+
+def test_queries_and_filters_match_brute_force_through_upserts_and_deletes(tmp_path, small_matrix):
+    backend = NumpyBackend(str(tmp_path))
+    vectors, metadatas = {}, {}
+
+    def apply_upsert(start, end, seed):
+        ids, embeddings, documents, chunk_metadatas = _chunks(start, end, seed)
+        backend.upsert(ids, embeddings, documents, chunk_metadatas)
+        vectors.update(zip(ids, embeddings))
+        metadatas.update(zip(ids, chunk_metadatas))
+
+    apply_upsert(0, 40, seed=1)
+    apply_upsert(20, 50, seed=2) # Replaces 20 vectors, leaving dead rows behind
+    backend.delete([f"chunk_{i}" for i in range(0, 30)] + ["unknown"])
+    for chunk_id in [f"chunk_{i}" for i in range(0, 30)]:
+        del vectors[chunk_id], metadatas[chunk_id]
+    backend.update_metadata(["chunk_31", "chunk_33"], [{"scope": "user", "user_id": "u3", "kind": 0}] * 2)
+    metadatas["chunk_31"] = metadatas["chunk_33"] = {"scope": "user", "user_id": "u3", "kind": 0}
+
+    assert backend.count() == len(vectors) == 20
+    query = np.random.default_rng(3).standard_normal(DIM)
+    for where in [None] + WHERES:
+        result = backend.query([query], n_results=5, where=where)
+        assert result["ids"][0] == _expected_top(vectors, metadatas, query, where, 5), where
+        assert [metadatas[chunk_id] for chunk_id in result["ids"][0]] == result["metadatas"][0]
+        assert sorted(backend.get(where=where)["ids"]) == sorted(
+            chunk_id for chunk_id in vectors if not where or metadata_matches(metadatas[chunk_id], where))
+    assert backend.get(ids=["chunk_45", "chunk_3"], include_documents=True) == {
+        "ids": ["chunk_45"], "metadatas": [metadatas["chunk_45"]], "documents": ["text 45"]}
+
+    reopened = NumpyBackend(str(tmp_path))
+    assert reopened.count() == 20
+    assert reopened.query([query], 5)["ids"] == backend.query([query], 5)["ids"]
+
+
+def test_small_changes_append_without_rewriting_the_matrix(tmp_path):
+    backend = NumpyBackend(str(tmp_path))
+    backend.upsert(*_chunks(0, 100))
+    generation, vectors_file = backend._generation, backend.matrix.filename
+    for i in range(100, 110):
+        backend.upsert(*_chunks(i, i + 1, seed=i))
+    backend.delete(["chunk_0", "chunk_1"])
+    backend.upsert(*_chunks(5, 6, seed=99)) # Re-embedded: new row, old one dead
+    assert (backend._generation, backend.matrix.filename) == (generation, vectors_file)
+    assert backend.count() == 108 and backend._rows_used == 111
+
+
+def test_other_instances_replay_changes_and_survive_compaction(tmp_path, small_matrix):
+    writer, reader = NumpyBackend(str(tmp_path)), NumpyBackend(str(tmp_path))
+    writer.upsert(*_chunks(0, 10))
+    assert reader.count() == 10
+    old_matrix = reader.matrix
+
+    for round_number in range(6): # Every round grows or compacts into a new generation
+        writer.upsert(*_chunks(0, 10 + round_number * 10, seed=round_number))
+        writer.delete([f"chunk_{i}" for i in range(0, round_number * 5)])
+    assert writer._generation >= 3 and not os.path.exists(old_matrix.filename)
+
+    query = np.random.default_rng(4).standard_normal(DIM)
+    assert reader.count() == writer.count()
+    assert reader.query([query], 5, where={"scope": "shared"}) == writer.query([query], 5, where={"scope": "shared"})
+    assert sorted(reader.get()["ids"]) == sorted(writer.get()["ids"])
+
+
+def test_records_json_layout_is_imported(tmp_path):
+    ids, embeddings, documents, metadatas = _chunks(0, 5)
+    np.save(tmp_path / "vectors-old.npy", embeddings.astype(np.float32))
+    (tmp_path / "records.json").write_text(json.dumps(
+        {"vectors_file": "vectors-old.npy", "ids": ids, "documents": documents, "metadatas": metadatas}))
+
+    backend = NumpyBackend(str(tmp_path))
+    assert backend.get(include_documents=True) == {"ids": ids, "metadatas": metadatas, "documents": documents}
+    assert not (tmp_path / "records.json").exists() and not (tmp_path / "vectors-old.npy").exists()
@@ -0,0 +1,55 @@
+# tests/test_read_cache.py
+import threading
+
+from read_cache import UserReadCache
+
+
+def test_versions_are_pruned_with_their_users_last_entry():
+    cache = UserReadCache(max_entries=4)
+    load = cache.cached(lambda user_id: user_id.upper())
+    for i in range(100):
+        user_id = f"user{i}"
+        load(user_id)
+        cache.invalidate(user_id)
+        cache.invalidate(f"never-read-{i}")
+    assert len(cache._entries) == 4
+    assert len(cache._versions) <= 4 and len(cache._entry_counts) <= 4 and not cache._readers
+
+
+def test_invalidation_during_a_read_is_not_lost_when_the_version_is_pruned():
+    cache = UserReadCache(max_entries=1)
+    rows = {"alice": "old", "bob": "other"}
+    reading, finish = threading.Event(), threading.Event()
+
+    @cache.cached
+    def load(user_id, slow=False):
+        value = rows[user_id]
+        if slow:
+            reading.set()
+            finish.wait()
+        return value
+
+    reader = threading.Thread(target=load, args=("alice", True), daemon=True)
+    reader.start()
+    reading.wait()
+    rows["alice"] = "new"
+    cache.invalidate("alice")
+    load("alice") # Cached under the new version, then evicted below while the slow read is in flight
+    load("bob")
+    finish.set()
+    reader.join()
+    assert load("alice", True) == "new" and load("alice") == "new"
+
+
+def test_clear_and_invalidate_drop_cached_values():
+    cache = UserReadCache()
+    rows = {"alice": 1}
+    load = cache.cached(lambda user_id: rows[user_id])
+    assert load("alice") == 1
+    rows["alice"] = 2
+    assert load("alice") == 1
+    cache.invalidate("alice")
+    assert load("alice") == 2
+    rows["alice"] = 3
+    cache.clear()
+    assert load("alice") == 3 and cache.stats()["entries"] == 1
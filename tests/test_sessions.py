@@ -0,0 +1,120 @@
+# tests/test_sessions.py
+import threading
+from datetime import datetime, timedelta
+
+import data_manager
+from data_manager import (create_resume_nonce, create_session_token, db, resume_session, resume_session_from_nonce,
+                          revoke_session, revoke_session_hash, session_token_hash)
+from session_store import SessionStore, WriteBehindSessionStore
+
+
+def _tamper(token, part, value):
+    parts = token.split(".")
+    parts[part] = value
+    return ".".join(parts)
+
+
+def test_login_token_resumes(user_id):
+    token = data_manager.login_user_local(user_id, "correct horse battery")["session_token"]
+    assert resume_session(token) == {"success": True, "user_id": user_id}
+
+
+def test_tampered_tokens_are_rejected(user_id):
+    token = create_session_token(user_id)
+    other = create_session_token("someone_else")
+    signature = token.rsplit(".", 1)[1]
+    assert not resume_session(_tamper(token, 3, "0" * len(signature)))["success"] # Forged signature
+    assert not resume_session(_tamper(token, 1, "9999999999"))["success"] # Extended expiry
+    assert not resume_session(_tamper(token, 0, other.split(".")[0]))["success"] # Someone else's user part
+    assert not resume_session(token[:-1])["success"]
+    assert not resume_session("not-a-token")["success"]
+    assert resume_session(token)["success"]
+
+
+def test_revoked_token_is_rejected(user_id):
+    token = create_session_token(user_id)
+    assert resume_session(token)["success"]
+    assert revoke_session(token)["success"]
+    assert not resume_session(token)["success"]
+
+
+def test_revocation_by_another_process_takes_effect(user_id):
+    token = create_session_token(user_id)
+    assert resume_session(token)["success"]
+    # Another app process or replica logs the token out: only the shared sessions table changes
+    db.write(lambda cursor: cursor.execute("DELETE FROM sessions WHERE token_hash = ?", (session_token_hash(token),)))
+    assert not resume_session(token)["success"]
+
+
+def test_resume_nonce_is_one_time_and_rotates(user_id):
+    token = create_session_token(user_id)
+    issued = create_resume_nonce(token)
+    assert issued["success"] and issued["token_hash"] == session_token_hash(token)
+    assert token not in issued["nonce"]
+
+    resumed = resume_session_from_nonce(issued["nonce"])
+    assert resumed["success"] and resumed["user_id"] == user_id
+    assert resumed["nonce"] != issued["nonce"]
+    assert not resume_session_from_nonce(issued["nonce"])["success"] # Already used
+    assert resume_session_from_nonce(resumed["nonce"])["success"]
+
+
+def test_resume_nonce_dies_with_its_session(user_id):
+    token = create_session_token(user_id)
+    nonce = create_resume_nonce(token)["nonce"]
+    revoke_session_hash(session_token_hash(token))
+    assert not resume_session_from_nonce(nonce)["success"]
+    assert not create_resume_nonce(token)["success"]
+
+
+def test_expired_resume_nonce_is_rejected(user_id):
+    token = create_session_token(user_id)
+    nonce = create_resume_nonce(token)["nonce"]
+    past = (datetime.now() - timedelta(minutes=1)).isoformat()
+    db.write(lambda cursor: cursor.execute("UPDATE session_resume_nonces SET expires_at = ? WHERE token_hash = ?",
+                                           (past, session_token_hash(token))))
+    assert not resume_session_from_nonce(nonce)["success"]
+
+
+def test_unknown_username_costs_a_password_check(user_id, monkeypatch):
+    verified = []
+    monkeypatch.setattr(data_manager, "verify_password", lambda password, stored: verified.append(stored) or (False, False))
+    assert not data_manager.login_user_local(f"{user_id}_unknown", "correct horse battery")["success"]
+    assert not data_manager.login_user_local(user_id, "wrong password")["success"]
+    assert verified[0] == data_manager.DUMMY_PASSWORD_HASH and verified[1] != verified[0]
+
+
+class _SlowStore(SessionStore):
+    """In-memory store whose saves block until released."""
+
+    def __init__(self):
+        self.values, self.saving, self.release = {}, threading.Event(), threading.Event()
+
+    def load(self, user_id, keys):
+        return {key: self.values[(user_id, key)] for key in keys if (user_id, key) in self.values}
+
+    def save(self, entries):
+        self.saving.set()
+        self.release.wait(5)
+        self.values.update(((user_id, key), value_json) for user_id, key, value_json in entries)
+
+    def delete(self, user_id, keys=None):
+        for entry in [entry for entry in self.values if entry[0] == user_id and (keys is None or entry[1] in keys)]:
+            del self.values[entry]
+
+
+def test_delete_waits_for_an_in_flight_flush():
+    slow = _SlowStore()
+    store = WriteBehindSessionStore(slow, interval=3600)
+    store.save([("u1", "chatbot_messages", "[]")])
+    flusher = threading.Thread(target=store.flush)
+    flusher.start()
+    assert slow.saving.wait(5)
+    deleter = threading.Thread(target=store.delete, args=("u1",))
+    deleter.start()
+    deleter.join(0.1)
+    assert deleter.is_alive() # Blocked behind the flush, not racing it
+    slow.release.set()
+    flusher.join(5)
+    deleter.join(5)
+    assert slow.values == {}
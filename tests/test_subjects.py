@@ -0,0 +1,55 @@
+# tests/test_subjects.py
+from data_manager import (add_subject, add_subjects_bulk, add_task, archive_completed_tasks, db, delete_subject,
+                          get_all_subjects, get_topic_progress, mark_task_completed, query_tasks)
+
+
+def test_writes_for_unknown_user_are_not_rejected():
+    # Foreign keys are declared but not enforced, as in the original schema
+    assert add_task("ghost", "orphan task", "2024-01-01")["success"]
+
+
+def test_delete_subject_removes_its_topics_and_unlinks_tasks(user_id):
+    subject_id = add_subject(user_id, "Physics", ["Optics", "Waves"])["id"]
+    kept_id = add_subject(user_id, "Maths", ["Algebra"])["id"]
+    task_id = add_task(user_id, "Read chapter 3", "2024-01-01", "Physics", "Optics")["id"]
+    topic_id = query_tasks(user_id)["tasks"][0]["topic_id"]
+    assert topic_id is not None
+
+    assert delete_subject(user_id, subject_id)["success"]
+
+    assert [subject["id"] for subject in get_all_subjects(user_id)] == [kept_id]
+    with db.read() as cursor:
+        assert cursor.execute("SELECT COUNT(*) FROM topics WHERE subject_id = ?", (subject_id,)).fetchone()[0] == 0
+    task = query_tasks(user_id)["tasks"][0]
+    assert (task["id"], task["topic_id"], task["topic_name"]) == (task_id, None, "Optics")
+
+
+def test_delete_subject_of_another_user_is_a_no_op(user_id):
+    subject_id = add_subject(user_id, "Physics", ["Optics"])["id"]
+    assert delete_subject("someone else", subject_id)["success"]
+    assert get_all_subjects(user_id)[0]["topics"] == ["Optics"]
+
+
+def test_bulk_subject_ids_match_their_topics_after_deletes(user_id):
+    # Deleting the newest subject leaves the AUTOINCREMENT sequence ahead of max(id)
+    delete_subject(user_id, add_subject(user_id, "Scratch", [])["id"])
+    result = add_subjects_bulk(user_id, [{"name": "Physics", "topics": ["Optics"]},
+                                         {"name": "Maths", "topics": ["Algebra", "Calculus"]}])
+    assert result["success"]
+    by_id = {subject["id"]: subject for subject in get_all_subjects(user_id)}
+    assert [(by_id[i]["name"], by_id[i]["topics"]) for i in result["ids"]] == [("Physics", ["Optics"]),
+                                                                               ("Maths", ["Algebra", "Calculus"])]
+
+
+def test_readded_subject_relinks_its_orphaned_tasks(user_id):
+    subject_id = add_subject(user_id, "Physics", ["Optics", "Waves"])["id"]
+    add_task(user_id, "Lens problems", "2024-01-01", "Physics", "Optics")
+    mark_task_completed(user_id, add_task(user_id, "Read chapter 3", "2024-01-02", "Physics", "Optics")["id"])
+    archive_completed_tasks(older_than_days=0)
+    delete_subject(user_id, subject_id) # Unlinks the live and the archived task
+    add_subject(user_id, "Physics", ["Optics", "Waves"])
+
+    progress = get_topic_progress(user_id, include_archived=True)[0]
+    assert [(topic["name"], topic["completed"]) for topic in progress["topics"]] == [("Optics", True), ("Waves", False)]
+    optics_id = progress["topics"][0]["id"]
+    assert [task["topic_id"] for task in query_tasks(user_id, include_archived=True)["tasks"]] == [optics_id, optics_id]
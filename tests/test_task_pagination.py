@@ -0,0 +1,77 @@
+# tests/test_task_pagination.py
+import pytest
+
+import data_manager
+from data_manager import add_task, db, mark_tasks_completed_bulk, query_tasks
+
+
+def _page_through(user_id, **kwargs):
+    """Follows next_cursor until the last page; returns the task ids in page order."""
+    ids, cursor = [], None
+    while True:
+        page = query_tasks(user_id, after=cursor, **kwargs)
+        ids.extend(task["id"] for task in page["tasks"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return ids
+
+
+def test_due_date_pages_cover_null_due_dates(user_id):
+    due_dates = ["2024-03-01", None, "2024-01-15", None, "2024-02-10", "2024-01-15"]
+    ids = [add_task(user_id, f"task {i}", due)["id"] for i, due in enumerate(due_dates)]
+
+    for page_size in (1, 2, 4, 10):
+        paged = _page_through(user_id, order_by="due_date", limit=page_size)
+        # Chronological, ties broken by id, tasks without a due date last
+        assert paged == [ids[2], ids[5], ids[4], ids[0], ids[1], ids[3]]
+
+
+def test_cursor_ending_on_null_tier_resumes_within_it(user_id):
+    ids = [add_task(user_id, f"task {i}", due)["id"] for i, due in enumerate(["2024-05-01", None, None, None])]
+    first = query_tasks(user_id, order_by="due_date", limit=2)
+    assert [task["id"] for task in first["tasks"]] == ids[:2]
+    assert first["next_cursor"] == (None, ids[1])
+    rest = query_tasks(user_id, order_by="due_date", limit=10, after=first["next_cursor"])
+    assert [task["id"] for task in rest["tasks"]] == ids[2:]
+
+
+def test_malformed_due_dates_are_rejected_or_normalized(user_id):
+    result = add_task(user_id, "bad date", "next tuesday-ish")
+    assert not result["success"]
+    assert add_task(user_id, "european date", "15/01/2024")["success"]
+    assert add_task(user_id, "blank date", "")["success"]
+    assert [task["due_date"] for task in query_tasks(user_id, order_by="due_date", limit=None)["tasks"]] == ["2024-01-15", None]
+
+
+def test_legacy_malformed_due_dates_still_page_completely(user_id):
+    # Rows written before due dates were validated (migration v4 leaves unparseable values as they are)
+    ids = [add_task(user_id, f"task {i}", due)["id"] for i, due in enumerate(["2024-01-01", None, "2024-02-01"])]
+    db.write(lambda cursor: cursor.execute("UPDATE tasks SET due_date = 'someday' WHERE id = ?", (ids[2],)))
+    data_manager.cache.invalidate(user_id)
+    paged = _page_through(user_id, order_by="due_date", limit=1)
+    assert sorted(paged) == sorted(ids)
+    assert paged[-1] == ids[1]
+
+
+@pytest.mark.parametrize("order_by", ["created_at", "due_date"])
+def test_status_filter_and_paging_agree_with_unpaged_query(user_id, order_by):
+    ids = [add_task(user_id, f"task {i}", None if i % 3 == 0 else f"2024-01-{i + 1:02d}")["id"] for i in range(9)]
+    data_manager.mark_task_completed(user_id, ids[4])
+    unpaged = [task["id"] for task in query_tasks(user_id, status="pending", order_by=order_by, limit=None)["tasks"]]
+    assert len(unpaged) == 8 and ids[4] not in unpaged
+    assert _page_through(user_id, status="pending", order_by=order_by, limit=3) == unpaged
+
+
+def test_bulk_completion_counts_and_journals_only_newly_completed_tasks(user_id):
+    ids = [add_task(user_id, f"task {i}", "2024-01-01")["id"] for i in range(3)]
+    other_id = add_task("someone else", "not mine", "2024-01-01")["id"]
+    assert mark_tasks_completed_bulk(user_id, ids[:1])["count"] == 1
+
+    result = mark_tasks_completed_bulk(user_id, ids + [ids[1], other_id, 10 ** 9])
+    assert result == {"success": True, "count": 2}
+    assert all(task["completed"] for task in query_tasks(user_id)["tasks"])
+    assert not query_tasks("someone else")["tasks"][0]["completed"]
+    with db.read() as cursor:
+        cursor.execute("SELECT ref FROM activity_events WHERE user_id = ? AND event_type = 'task_completed' ORDER BY id",
+                       (user_id,))
+        assert [int(row[0]) for row in cursor.fetchall()] == ids
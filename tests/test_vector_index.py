@@ -0,0 +1,101 @@
+# tests/test_vector_index.py
+import json
+import os
+import subprocess
+import sys
+import threading
+import uuid
+
+import pytest
+
+import vector_rag
+
+REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def _run_python(code):
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join([REPO_DIR, os.environ.get("PYTHONPATH", "")])}
+    return subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True)
+
+
+def test_importing_ingestion_does_not_open_the_vector_store():
+    result = _run_python("import sys, document_ingest, vector_rag; "
+                         "assert vector_rag._store is None and 'chromadb' not in sys.modules")
+    assert result.returncode == 0, result.stderr
+
+
+def test_concurrent_initialization_syncs_once(monkeypatch):
+    syncs = []
+    monkeypatch.setattr(vector_rag, "_initialized", False)
+    monkeypatch.setattr(vector_rag, "_sync_all_sources", lambda: syncs.append(threading.get_ident()))
+    threads = [threading.Thread(target=vector_rag.initialize_vector_db) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(syncs) == 1 and vector_rag._initialized
+
+
+@pytest.mark.skipif(vector_rag.fcntl is None, reason="manifest lock file needs fcntl")
+def test_manifest_updates_are_locked_across_processes():
+    probe = ("import fcntl, sys; f = open(sys.argv[1], 'a')\n"
+             "try:\n    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)\nexcept BlockingIOError:\n    sys.exit(3)")
+    lock_path = os.path.abspath(vector_rag.MANIFEST_PATH + ".lock")
+    with vector_rag._index_update():
+        held = subprocess.run([sys.executable, "-c", probe, lock_path])
+    released = subprocess.run([sys.executable, "-c", probe, lock_path])
+    assert (held.returncode, released.returncode) == (3, 0)
+
+
+def test_failed_initialization_is_retried(monkeypatch):
+    attempts = []
+
+    def failing_sync():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise OSError("store unavailable")
+
+    monkeypatch.setattr(vector_rag, "_initialized", False)
+    monkeypatch.setattr(vector_rag, "_sync_all_sources", failing_sync)
+    vector_rag.initialize_vector_db()
+    assert not vector_rag._initialized
+    vector_rag.initialize_vector_db()
+    assert len(attempts) == 2 and vector_rag._initialized
+
+
+def test_context_lookup_reports_an_unavailable_store(monkeypatch):
+    def unavailable():
+        raise OSError("store unavailable")
+
+    monkeypatch.setattr(vector_rag, "_initialized", True)
+    monkeypatch.setattr(vector_rag, "get_store", unavailable)
+    assert "retrieval error" in vector_rag.get_relevant_context("Snell's law")
+
+
+def _change_from_another_process(user_id, text):
+    """What another app process's index update leaves behind: a chunk in the shared store and a newer manifest."""
+    chunk_id = f"other_{uuid.uuid4().hex[:12]}"
+    metadata = {"scope": vector_rag.USER_SCOPE, "user_id": user_id, "source": f"other/{chunk_id}", "content_hash": chunk_id}
+    with vector_rag._index_update():
+        vector_rag.get_store().upsert([chunk_id], vector_rag.embedding_cache.embed([text]), [text], [metadata])
+        manifest = vector_rag._load_manifest()
+        manifest["sources"][metadata["source"]] = {"hash": chunk_id, "chunks": {chunk_id: [chunk_id, None]}}
+        manifest["generation"] = manifest.get("generation", 0) + 1
+        with open(vector_rag.MANIFEST_PATH, "w", encoding="utf-8") as f: # Not _save_manifest: that marks it seen here
+            json.dump(manifest, f)
+    return chunk_id
+
+
+def test_keyword_index_follows_changes_from_other_processes(user_id):
+    vector_rag.initialize_vector_db()
+    chunk_id = _change_from_another_process(user_id, "Quasicrystals diffract electrons with fivefold symmetry.")
+    hits = vector_rag.retrieve("quasicrystals fivefold", user_id=user_id, mode="keyword")
+    assert [hit["id"] for hit in hits] == [chunk_id]
+
+
+def test_cached_results_are_dropped_after_changes_from_other_processes(user_id):
+    vector_rag.initialize_vector_db()
+    assert vector_rag.retrieve("penrose tilings aperiodic", user_id=user_id, mode="keyword") == []
+    chunk_id = _change_from_another_process(user_id, "Penrose tilings are aperiodic.")
+    hits = vector_rag.retrieve("penrose tilings aperiodic", user_id=user_id, mode="keyword")
+    assert [hit["id"] for hit in hits] == [chunk_id]
@@ -0,0 +1,41 @@
+# tests/test_write_queue.py
+import threading
+import uuid
+
+import pytest
+
+import data_manager
+from data_manager import db
+
+
+@pytest.fixture
+def write_threads(monkeypatch):
+    """Runs data_manager's writes through the write queue; yields the names of the threads that opened transactions."""
+    names = []
+    transaction = db.transaction
+
+    def recording_transaction():
+        names.append(threading.current_thread().name)
+        return transaction()
+
+    monkeypatch.setattr(db, "transaction", recording_transaction)
+    started = db._writer is None
+    db.start_write_queue()
+    yield names
+    if started:
+        db.stop_write_queue()
+
+
+def test_every_writer_goes_through_the_write_queue(write_threads):
+    username = f"queued_{uuid.uuid4().hex[:12]}"
+    assert data_manager.signup_user_local(username, "correct horse battery")["success"]
+    subject_id = data_manager.add_subject(username, "Physics", ["Optics"])["id"]
+    assert data_manager.add_subjects_bulk(username, [{"name": "Maths", "topics": ["Algebra"]}])["success"]
+    assert data_manager.delete_subject(username, subject_id)["success"]
+    data_manager.seed_default_subjects_for_user(username)
+    data_manager.purge_expired_sessions()
+    data_manager.compact_activity_journal()
+    data_manager.archive_completed_tasks()
+    assert data_manager.import_user(list(data_manager.export_user(username)))["success"]
+
+    assert write_threads and set(write_threads) == {"sqlite-writer"}
@@ -0,0 +1,533 @@
+# vector_backends.py
+import abc
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+
+from db_pool import ConnectionPool
+
+# Which engine vector_rag stores chunk vectors in: "chroma" (chromadb) or "numpy" (built-in, memory-mapped)
+VECTOR_BACKEND = os.getenv("EDUMATE_VECTOR_BACKEND", "chroma")
+NUMPY_QUERY_BLOCK_ROWS = int(os.getenv("EDUMATE_NUMPY_QUERY_BLOCK_ROWS", "65536"))  # Matrix rows scored per matmul
+NUMPY_GATHER_MAX_FRACTION = 0.2  # Filters matching fewer rows than this fraction gather them instead of masking a full scan
+NUMPY_INITIAL_CAPACITY = 1024  # Rows preallocated for the first matrix; capacity doubles whenever it fills up
+NUMPY_COMPACT_MIN_DEAD_ROWS = 1024  # Dead rows are compacted away once there are more than this and than live rows
+NUMPY_CHANGE_LOG_VERSIONS = 1000  # Versions kept in row_changes; processes further behind reload the live rows instead
+NUMPY_META_KEYS = ("version", "generation", "dim", "rows_used", "capacity", "log_start")
+
+SQL_VARIABLE_CHUNK = 500
+
+
+class VectorBackend(abc.ABC):
+    """
+    Where vector_rag keeps chunk vectors, texts and metadata. Embeddings are always passed in (computed
+    through the embedding cache), so a backend never runs a model. Subclass and pass a factory to
+    register_vector_backend() to plug in another engine.
+    """
+
+    @abc.abstractmethod
+    def count(self):
+        """Number of stored chunks."""
+
+    @abc.abstractmethod
+    def upsert(self, ids, embeddings, documents, metadatas):
+        """Adds or replaces chunks by id."""
+
+    @abc.abstractmethod
+    def update_metadata(self, ids, metadatas):
+        """Replaces the metadata of existing ids without touching their vectors."""
+
+    @abc.abstractmethod
+    def delete(self, ids):
+        """Removes the chunks with these ids (unknown ids are ignored)."""
+
+    @abc.abstractmethod
+    def get(self, ids=None, where=None, include_documents=False):
+        """Returns {"ids", "metadatas"} (plus "documents" if asked) of the stored chunks matching ids/where."""
+
+    @abc.abstractmethod
+    def query(self, embeddings, n_results, where=None):
+        """
+        Nearest chunks for each query vector. Returns Chroma's layout: {"ids", "documents", "metadatas",
+        "distances"}, each a list with one ranked list per query vector.
+        """
+
+
+class ChromaBackend(VectorBackend):
+    """chromadb PersistentClient collection (imported on first use; it is a heavy import)."""
+
+    def __init__(self, path, name="knowledge_base"):
+        import chromadb
+        self.client = chromadb.PersistentClient(path=path)
+        self.collection = self.client.get_or_create_collection(name=name)
+
+    def count(self):
+        return self.collection.count()
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        self.collection.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def update_metadata(self, ids, metadatas):
+        self.collection.update(ids=ids, metadatas=metadatas)
+
+    def delete(self, ids):
+        self.collection.delete(ids=ids)
+
+    def get(self, ids=None, where=None, include_documents=False):
+        include = ["metadatas", "documents"] if include_documents else ["metadatas"]
+        return self.collection.get(ids=ids, where=where, include=include)
+
+    def query(self, embeddings, n_results, where=None):
+        return self.collection.query(query_embeddings=embeddings, n_results=n_results, where=where,
+                                     include=["documents", "metadatas", "distances"])
+
+
+def metadata_matches(metadata, where):
+    """Evaluates the subset of Chroma's where syntax vector_rag uses ($and/$or, $eq/$ne/$in/$nin, equality) on one metadata dict."""
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(metadata_matches(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(metadata_matches(metadata, clause) for clause in condition):
+                return False
+        else:
+            value = metadata.get(key)
+            operator, operand = next(iter(condition.items())) if isinstance(condition, dict) else ("$eq", condition)
+            if operator == "$eq" and value != operand:
+                return False
+            if operator == "$ne" and value == operand:
+                return False
+            if operator == "$in" and value not in operand:
+                return False
+            if operator == "$nin" and value in operand:
+                return False
+    return True
+
+
+class NumpyBackend(VectorBackend):
+    """
+    Built-in engine for large knowledge bases: L2-normalized float32 embeddings in a preallocated .npy
+    matrix opened with mmap, ids, texts and metadata in an SQLite index (index.db) that also keeps an
+    inverted index of scalar metadata values for where filters. A query is a blocked matrix multiply over
+    the live (filtered) rows with an argpartition top-k per block; distances are cosine distances.
+
+    Rows are append-only: an upsert writes its vectors past the last used row, and a delete (or a
+    re-upserted id) only drops the chunk's row from the index, leaving a dead row that queries mask out.
+    A change therefore costs O(changed chunks), and other processes catch up by replaying row_changes
+    instead of reloading everything. The matrix is rewritten only to grow it or, once dead rows outnumber
+    live ones, to compact it: the copy goes to a new vectors-<generation>.npy, is renamed into place and is
+    published by one index commit. A generation's file is removed only once two newer ones exist, and a
+    reader that still loses the file it was about to open retries on the current one.
+    """
+
+    def __init__(self, path):
+        import numpy
+        self.np = numpy
+        self.path = path
+        self._lock = threading.RLock()
+        os.makedirs(path, exist_ok=True)
+        self.index = ConnectionPool(os.path.join(path, "index.db"), write_queue=False)
+        with self.index.transaction() as cursor:
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS chunks (
+                    id TEXT PRIMARY KEY,
+                    row INTEGER NOT NULL UNIQUE, -- Row in the current vectors file
+                    document TEXT,
+                    metadata TEXT NOT NULL -- JSON
+                ) WITHOUT ROWID
+            """)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS chunk_fields (
+                    key TEXT NOT NULL,
+                    value NOT NULL, -- Scalar metadata value, compared with its own type
+                    id TEXT NOT NULL,
+                    PRIMARY KEY (key, value, id)
+                ) WITHOUT ROWID
+            """)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_chunk_fields_id ON chunk_fields (id)")
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS row_changes (
+                    version INTEGER NOT NULL, -- Version whose commit made the row live or dead
+                    row INTEGER NOT NULL,
+                    alive INTEGER NOT NULL
+                )
+            """)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_row_changes_version ON row_changes (version)")
+            cursor.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            cursor.executemany("INSERT OR IGNORE INTO meta (key, value) VALUES (?, 0)", [(key,) for key in NUMPY_META_KEYS])
+        self._version = None # Index version the in-memory state below reflects
+        self._generation = None
+        self.matrix = None # Read-only memmap of the current generation (None while the index is empty)
+        self._writable = None # Writable memmap of the same file, opened on the first write
+        self._alive = numpy.zeros(0, dtype=bool) # Row -> holds a live chunk (sized to the matrix capacity)
+        self._rows_used = 0
+        self._count = 0
+        self._masks = {} # where filter (as JSON) -> boolean row mask, dropped after every change
+        self._import_records_json()
+
+    # --- Storage ---
+
+    def _vectors_path(self, generation):
+        return os.path.join(self.path, f"vectors-{generation}.npy")
+
+    def _read_meta(self, cursor):
+        cursor.execute("SELECT key, value FROM meta")
+        return dict(cursor.fetchall())
+
+    def _open_matrix(self, meta):
+        self.matrix = self.np.load(self._vectors_path(meta["generation"]), mmap_mode="r") if meta["capacity"] else None
+        self._writable = None
+        self._generation = meta["generation"]
+
+    def _writable_matrix(self):
+        if self._writable is None:
+            self._writable = self.np.load(self._vectors_path(self._generation), mmap_mode="r+")
+        return self._writable
+
+    def _sync(self, cursor, meta):
+        """Brings the in-memory state up to meta (read through cursor, in the same transaction)."""
+        if meta["version"] == self._version:
+            return
+        np = self.np
+        if meta["generation"] != self._generation:
+            self._open_matrix(meta)
+            self._version = None # Rows were renumbered; the change log does not span generations
+        if self._version is not None and self._version >= meta["log_start"]:
+            cursor.execute("SELECT row, alive FROM row_changes WHERE version > ? ORDER BY version", (self._version,))
+            for row, alive in cursor:
+                self._alive[row] = bool(alive)
+        else:
+            self._alive = np.zeros(meta["capacity"], dtype=bool)
+            cursor.execute("SELECT row FROM chunks")
+            self._alive[np.fromiter((row for (row,) in cursor), dtype=np.int64)] = True
+        self._rows_used = meta["rows_used"]
+        self._count = int(np.count_nonzero(self._alive[:self._rows_used]))
+        self._version = meta["version"]
+        self._masks = {}
+
+    def _reading(self, fn):
+        """Returns fn(cursor), run in one read transaction with the in-memory state synced to it."""
+        for attempt in range(3):
+            with self._lock, self.index.read() as cursor:
+                cursor.execute("BEGIN") # One snapshot for the version, the filters and the rows fetched
+                try:
+                    self._sync(cursor, self._read_meta(cursor))
+                    return fn(cursor)
+                except FileNotFoundError:
+                    # A writer removed the generation we were about to open; the next snapshot names a newer one
+                    if attempt == 2:
+                        raise
+                finally:
+                    cursor.execute("COMMIT")
+
+    @contextmanager
+    def _change(self):
+        """
+        Yields (cursor, meta) in a write transaction with the in-memory state synced to the latest
+        version. The caller updates both; the version is bumped on commit.
+        """
+        with self._lock:
+            try:
+                with self.index.transaction() as cursor:
+                    meta = self._read_meta(cursor)
+                    self._sync(cursor, meta)
+                    generation = meta["generation"]
+                    yield cursor, meta
+                    meta["version"] += 1
+                    if meta["version"] - meta["log_start"] > NUMPY_CHANGE_LOG_VERSIONS:
+                        meta["log_start"] = meta["version"] - NUMPY_CHANGE_LOG_VERSIONS
+                        cursor.execute("DELETE FROM row_changes WHERE version <= ?", (meta["log_start"],))
+                    cursor.executemany("UPDATE meta SET value = ? WHERE key = ?", [(value, key) for key, value in meta.items()])
+            except BaseException:
+                self._version = None # The in-memory state may be ahead of what was rolled back
+                raise
+            self._version = meta["version"]
+            self._rows_used = meta["rows_used"]
+            self._masks = {}
+            if meta["generation"] != generation:
+                self._remove_old_generations(meta["generation"])
+
+    def _mark(self, cursor, meta, rows, alive):
+        """Marks rows live or dead, in memory and in the change log other processes replay."""
+        rows = list(rows)
+        self._alive[rows] = alive
+        self._count += len(rows) if alive else -len(rows)
+        cursor.executemany("INSERT INTO row_changes (version, row, alive) VALUES (?, ?, ?)",
+                           [(meta["version"] + 1, row, int(alive)) for row in rows])
+
+    def _rewrite(self, cursor, meta, extra_rows=0):
+        """
+        Copies the live rows, renumbered from 0, into the next generation of the matrix with room for at
+        least extra_rows more (capacity doubles as needed). Runs inside the write transaction.
+        """
+        np = self.np
+        live = np.flatnonzero(self._alive[:meta["rows_used"]])
+        capacity = max(meta["capacity"], NUMPY_INITIAL_CAPACITY)
+        while capacity < len(live) + extra_rows:
+            capacity *= 2
+        generation = meta["generation"] + 1
+        path = self._vectors_path(generation)
+        out = np.lib.format.open_memmap(path + ".tmp", mode="w+", dtype=np.float32, shape=(capacity, meta["dim"]))
+        for start in range(0, len(live), NUMPY_QUERY_BLOCK_ROWS):
+            block = live[start:start + NUMPY_QUERY_BLOCK_ROWS]
+            out[start:start + len(block)] = self.matrix[block]
+        out.flush()
+        del out
+        os.replace(path + ".tmp", path)
+        # Renumbering in row order only ever moves a chunk to a row no other chunk holds (row is UNIQUE)
+        cursor.execute("SELECT id FROM chunks ORDER BY row")
+        cursor.executemany("UPDATE chunks SET row = ? WHERE id = ?",
+                           [(row, chunk_id) for row, (chunk_id,) in enumerate(cursor.fetchall())])
+        cursor.execute("DELETE FROM row_changes")
+        meta.update(generation=generation, capacity=capacity, rows_used=len(live), log_start=meta["version"] + 1)
+        self._open_matrix(meta)
+        self._alive = np.zeros(capacity, dtype=bool)
+        self._alive[:len(live)] = True
+        self._rows_used = len(live)
+        self._count = len(live)
+
+    def _maybe_compact(self, cursor, meta):
+        if meta["rows_used"] - self._count > max(self._count, NUMPY_COMPACT_MIN_DEAD_ROWS):
+            self._rewrite(cursor, meta)
+
+    def _remove_old_generations(self, generation):
+        for name in os.listdir(self.path):
+            match = re.fullmatch(r"vectors-(\d+)\.npy", name)
+            if match and int(match.group(1)) < generation - 1:
+                try:
+                    os.remove(os.path.join(self.path, name))
+                except OSError as e:
+                    print(f"WARNING: Could not remove old vector matrix {name}: {e}")
+
+    def _import_records_json(self):
+        """One-time upgrade from the former layout: one .npy matrix plus a records.json sidecar."""
+        records_path = os.path.join(self.path, "records.json")
+        try:
+            with open(records_path, "r", encoding="utf-8") as f:
+                records = json.load(f)
+            matrix = self.np.load(os.path.join(self.path, records["vectors_file"]), mmap_mode="r")
+        except FileNotFoundError:
+            return
+        for start in range(0, len(records["ids"]), NUMPY_QUERY_BLOCK_ROWS):
+            end = start + NUMPY_QUERY_BLOCK_ROWS
+            self.upsert(records["ids"][start:end], matrix[start:end], records["documents"][start:end], records["metadatas"][start:end])
+        for name in ("records.json", records["vectors_file"]):
+            try:
+                os.remove(os.path.join(self.path, name))
+            except OSError as e:
+                print(f"WARNING: Could not remove {name} after moving it into the index: {e}")
+        print(f"DEBUG: Moved {len(records['ids'])} chunks from records.json into {self.path}.")
+
+    def _normalized(self, embeddings):
+        np = self.np
+        vectors = np.array(embeddings, dtype=np.float32, ndmin=2) # Own copy, normalized in place
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        vectors /= norms
+        return vectors
+
+    def _rows_of(self, cursor, ids):
+        """{id: row} for the stored ones among ids."""
+        ids = list(ids)
+        rows = {}
+        for i in range(0, len(ids), SQL_VARIABLE_CHUNK):
+            part = ids[i:i + SQL_VARIABLE_CHUNK]
+            cursor.execute(f"SELECT id, row FROM chunks WHERE id IN ({','.join('?' * len(part))})", part)
+            rows.update(cursor.fetchall())
+        return rows
+
+    def _chunks_at(self, cursor, rows):
+        """{row: (id, document, metadata)} for these rows."""
+        chunks = {}
+        for i in range(0, len(rows), SQL_VARIABLE_CHUNK):
+            part = rows[i:i + SQL_VARIABLE_CHUNK]
+            cursor.execute(f"SELECT row, id, document, metadata FROM chunks WHERE row IN ({','.join('?' * len(part))})", part)
+            chunks.update((row, (chunk_id, document, json.loads(metadata))) for row, chunk_id, document, metadata in cursor)
+        return chunks
+
+    def _set_fields(self, cursor, pairs):
+        """Replaces the inverted-index entries of these (id, metadata) pairs."""
+        cursor.executemany("DELETE FROM chunk_fields WHERE id = ?", [(chunk_id,) for chunk_id, _ in pairs])
+        cursor.executemany("INSERT OR IGNORE INTO chunk_fields (key, value, id) VALUES (?, ?, ?)",
+                           [(key, value, chunk_id) for chunk_id, metadata in pairs for key, value in metadata.items()
+                            if isinstance(value, (str, int, float))])
+
+    def _rows_matching(self, cursor, where):
+        """Boolean mask of the live rows matching where (cached per filter until the index changes)."""
+        key = json.dumps(where, sort_keys=True)
+        mask = self._masks.get(key)
+        if mask is None:
+            mask = self._where_mask(cursor, where)
+            self._masks[key] = mask
+        return mask
+
+    def _where_mask(self, cursor, where):
+        """Evaluates where like metadata_matches does, but as row masks built from the chunk_fields index."""
+        np = self.np
+        mask = self._alive[:self._rows_used].copy()
+        for key, condition in where.items():
+            if key == "$and":
+                for clause in condition:
+                    mask &= self._where_mask(cursor, clause)
+            elif key == "$or":
+                matched = np.zeros_like(mask)
+                for clause in condition:
+                    matched |= self._where_mask(cursor, clause)
+                mask &= matched
+            else:
+                operator, operand = next(iter(condition.items())) if isinstance(condition, dict) else ("$eq", condition)
+                values = list(operand) if operator in ("$in", "$nin") else [operand]
+                matched = np.zeros_like(mask)
+                for i in range(0, len(values), SQL_VARIABLE_CHUNK):
+                    part = values[i:i + SQL_VARIABLE_CHUNK]
+                    cursor.execute("SELECT c.row FROM chunk_fields f JOIN chunks c ON c.id = f.id "
+                                   f"WHERE f.key = ? AND f.value IN ({','.join('?' * len(part))})", [key, *part])
+                    matched[[row for (row,) in cursor]] = True
+                mask &= matched if operator in ("$eq", "$in") else ~matched
+        return mask
+
+    # --- VectorBackend ---
+
+    def count(self):
+        return self._reading(lambda cursor: self._count)
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        vectors = self._normalized(embeddings)
+        indexes = list({chunk_id: index for index, chunk_id in enumerate(ids)}.values()) # A repeated id keeps its last entry
+        with self._change() as (cursor, meta):
+            if meta["dim"] and meta["dim"] != vectors.shape[1]:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match the index in {self.path} ({meta['dim']})")
+            meta["dim"] = vectors.shape[1]
+            if meta["rows_used"] + len(indexes) > meta["capacity"]:
+                self._rewrite(cursor, meta, extra_rows=len(indexes))
+            start = meta["rows_used"]
+            new_rows = range(start, start + len(indexes))
+            matrix = self._writable_matrix()
+            matrix[start:start + len(indexes)] = vectors[indexes]
+            matrix.flush() # Vectors land before the index rows that point at them commit
+            # Replaced ids move to their new row; the old one stays behind dead (a reader may be scoring it)
+            replaced = self._rows_of(cursor, (ids[index] for index in indexes))
+            cursor.executemany("INSERT INTO chunks (id, row, document, metadata) VALUES (?, ?, ?, ?) "
+                               "ON CONFLICT (id) DO UPDATE SET row = excluded.row, document = excluded.document, "
+                               "metadata = excluded.metadata",
+                               [(ids[index], row, documents[index], json.dumps(metadatas[index]))
+                                for index, row in zip(indexes, new_rows)])
+            self._set_fields(cursor, [(ids[index], metadatas[index]) for index in indexes])
+            self._mark(cursor, meta, replaced.values(), alive=False)
+            self._mark(cursor, meta, new_rows, alive=True)
+            meta["rows_used"] = start + len(indexes)
+            self._maybe_compact(cursor, meta)
+
+    def update_metadata(self, ids, metadatas):
+        with self._change() as (cursor, meta):
+            stored = self._rows_of(cursor, ids)
+            pairs = [(chunk_id, metadata) for chunk_id, metadata in zip(ids, metadatas) if chunk_id in stored]
+            cursor.executemany("UPDATE chunks SET metadata = ? WHERE id = ?",
+                               [(json.dumps(metadata), chunk_id) for chunk_id, metadata in pairs])
+            self._set_fields(cursor, pairs)
+
+    def delete(self, ids):
+        with self._change() as (cursor, meta):
+            doomed = self._rows_of(cursor, ids)
+            cursor.executemany("DELETE FROM chunks WHERE id = ?", [(chunk_id,) for chunk_id in doomed])
+            cursor.executemany("DELETE FROM chunk_fields WHERE id = ?", [(chunk_id,) for chunk_id in doomed])
+            self._mark(cursor, meta, doomed.values(), alive=False)
+            self._maybe_compact(cursor, meta)
+
+    def get(self, ids=None, where=None, include_documents=False):
+        return self._reading(lambda cursor: self._get(cursor, ids, where, include_documents))
+
+    def _get(self, cursor, ids, where, include_documents):
+        if ids is not None:
+            ids = list(ids)
+            stored = {}
+            for i in range(0, len(ids), SQL_VARIABLE_CHUNK):
+                part = ids[i:i + SQL_VARIABLE_CHUNK]
+                cursor.execute(f"SELECT id, document, metadata FROM chunks WHERE id IN ({','.join('?' * len(part))})", part)
+                stored.update((chunk_id, (chunk_id, document, json.loads(metadata))) for chunk_id, document, metadata in cursor)
+            chunks = [stored[chunk_id] for chunk_id in ids if chunk_id in stored]
+            if where:
+                chunks = [chunk for chunk in chunks if metadata_matches(chunk[2], where)]
+        elif where:
+            rows = self.np.flatnonzero(self._rows_matching(cursor, where)).tolist()
+            stored = self._chunks_at(cursor, rows)
+            chunks = [stored[row] for row in rows]
+        else:
+            cursor.execute("SELECT id, document, metadata FROM chunks ORDER BY row")
+            chunks = [(chunk_id, document, json.loads(metadata)) for chunk_id, document, metadata in cursor]
+        result = {"ids": [chunk[0] for chunk in chunks], "metadatas": [chunk[2] for chunk in chunks]}
+        if include_documents:
+            result["documents"] = [chunk[1] for chunk in chunks]
+        return result
+
+    def query(self, embeddings, n_results, where=None):
+        queries = self._normalized(embeddings)
+        return self._reading(lambda cursor: self._query(cursor, queries, n_results, where))
+
+    def _query(self, cursor, queries, n_results, where):
+        np = self.np
+        total_rows = self._rows_used
+        if where:
+            mask = self._rows_matching(cursor, where)
+            selected = int(mask.sum())
+        else:
+            selected = self._count
+            mask = self._alive[:total_rows] if selected < total_rows else None # Dead rows are masked out too
+        k = min(n_results, selected)
+        # Sparse filters gather just the matching rows; dense ones scan contiguous blocks and mask the
+        # rest out, which avoids copying most of the matrix
+        candidates = np.flatnonzero(mask) if mask is not None and selected < total_rows * NUMPY_GATHER_MAX_FRACTION else None
+        scan_rows = len(candidates) if candidates is not None else total_rows
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+        # Score the matrix in blocks, keeping only each block's top k, so memory stays bounded
+        for start in range(0, scan_rows if k else 0, NUMPY_QUERY_BLOCK_ROWS):
+            if candidates is None:
+                end = min(start + NUMPY_QUERY_BLOCK_ROWS, total_rows)
+                rows = np.arange(start, end)
+                scores = queries @ self.matrix[start:end].T
+                if mask is not None:
+                    scores[:, ~mask[start:end]] = -np.inf
+            else:
+                rows = candidates[start:start + NUMPY_QUERY_BLOCK_ROWS]
+                scores = queries @ self.matrix[rows].T
+            if scores.shape[1] > k:
+                top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                scores = np.take_along_axis(scores, top, axis=1)
+                block_rows = rows[top]
+            else:
+                block_rows = np.broadcast_to(rows, scores.shape)
+            best_scores = np.concatenate([best_scores, scores], axis=1)
+            best_rows = np.concatenate([best_rows, block_rows], axis=1)
+            if best_scores.shape[1] > k:
+                top = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+                best_scores = np.take_along_axis(best_scores, top, axis=1)
+                best_rows = np.take_along_axis(best_rows, top, axis=1)
+        order = np.argsort(-best_scores, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        best_rows = np.take_along_axis(best_rows, order, axis=1).tolist()
+        chunks = self._chunks_at(cursor, sorted({row for rows in best_rows for row in rows}))
+        return {
+            "ids": [[chunks[row][0] for row in rows] for rows in best_rows],
+            "documents": [[chunks[row][1] for row in rows] for rows in best_rows],
+            "metadatas": [[chunks[row][2] for row in rows] for rows in best_rows],
+            "distances": [[float(1.0 - score) for score in scores] for scores in best_scores],
+        }
+
+
+_BACKENDS = {"chroma": ChromaBackend, "numpy": NumpyBackend}
+
+
+def register_vector_backend(name, factory):
+    """Makes a VectorBackend factory (called with the storage path) selectable with EDUMATE_VECTOR_BACKEND=<name>."""
+    _BACKENDS[name] = factory
+
+
+def open_vector_backend(path, name=VECTOR_BACKEND):
+    """Opens the configured backend over the given storage directory."""
+    if name not in _BACKENDS:
+        raise ValueError(f"Unknown vector backend: {name}")
+    return _BACKENDS[name](path)
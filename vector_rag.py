@@ -1,132 +1,664 @@
-import chromadb
+import hashlib
+import json
 import os
-from data_manager import get_all_subjects # This will now fetch subjects from SQLite
+import threading
+from contextlib import contextmanager
+try:
+    import fcntl
+except ImportError: # Windows: only the in-process index lock applies
+    fcntl = None
+from chunking import chunk_text # Sentence-aligned, token-bounded chunks with overlap
+from embedding_cache import EmbeddingCache, EMBEDDING_CACHE_DIR
+from vector_backends import open_vector_backend, metadata_matches, VECTOR_BACKEND # chroma (default) or the built-in numpy engine
+from bm25 import BM25Index
+from retrieval_cache import RetrievalCache, normalize_query
+from data_manager import get_all_topics, register_syllabus_listener # Topics joined with their subjects, straight from SQLite
+from data_manager import get_document, get_documents, UPLOADS_DIR
 
-client = chromadb.Client()
-collection = client.get_or_create_collection(name="knowledge_base")
+KNOWLEDGE_BASE_DIR = "knowledge_base"
+VECTOR_DB_PATH = os.getenv("EDUMATE_VECTOR_DB_PATH", os.path.join("data", "chroma" if VECTOR_BACKEND == "chroma" else f"vectors_{VECTOR_BACKEND}"))
+MANIFEST_PATH = os.path.join(VECTOR_DB_PATH, "manifest.json")
+SYLLABUS_SOURCE_PREFIX = "syllabus/" # Manifest source per user: "syllabus/<user_id>"
+UPLOAD_SOURCE_PREFIX = "upload/" # Manifest source per uploaded document: "upload/<document id>"
+INDEXABLE_DOCUMENT_STATUSES = ("embedding", "indexing", "ready") # Uploads whose text has been extracted
+SHARED_SCOPE = "shared" # Chunk metadata "scope": knowledge_base/ files, visible to every user
+USER_SCOPE = "user" # Syllabus chunks, visible only to the user_id in their metadata
+RETRIEVAL_MODE = os.getenv("EDUMATE_RETRIEVAL_MODE", "hybrid") # "hybrid", "vector" or "keyword"
+RETRIEVAL_CANDIDATES = int(os.getenv("EDUMATE_RETRIEVAL_CANDIDATES", "20")) # Hits taken from each retriever before fusion
+RRF_K = int(os.getenv("EDUMATE_RRF_K", "60")) # Reciprocal-rank fusion constant: higher flattens the rank weighting
+NO_CONTEXT_MESSAGE = "No relevant context found in the syllabus or knowledge base."
+INDEX_VERSION = 3 # Bump when chunk metadata changes; existing chunks are re-tagged without re-embedding
 
-# Modified: initialize_vector_db no longer accepts db_instance and app_id
-def initialize_vector_db():
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+
+
+
+class _ReadWriteLock:
+    """Any number of readers or one writer; a waiting writer holds back new readers so it is not starved."""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writing = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self):
+        with self._condition:
+            while self._writing or self._writers_waiting:
+                self._condition.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._condition:
+            self._writers_waiting += 1
+            while self._writing or self._readers:
+                self._condition.wait()
+            self._writers_waiting -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writing = False
+                self._condition.notify_all()
+
+
+_index_lock = threading.Lock() # One index update at a time (embedding included)
+# Queries read under this lock and each source's store + keyword index changes are applied under its write
+# side, so a query sees a file's old chunks or its new ones, never a half-updated mix
+_swap_lock = _ReadWriteLock()
+_model_lock = threading.Lock()
+_store_lock = threading.Lock()
+_store = None
+_initialized = False
+_index_generation = None # Manifest generation the in-memory keyword index reflects
+_manifest_stat = None # (inode, mtime, size) of the manifest last checked for changes by other processes
+_embedding_function = None
+
+
+def get_store():
+    """
+    The on-disk vector store, opened on first use (chromadb is a heavy import, and pages that only queue
+    uploads never need it). A new app process opens the existing embeddings instead of re-embedding everything.
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = open_vector_backend(VECTOR_DB_PATH)
+    return _store
+
+
+def _embed_with_model(texts):
+    """
+    Runs the embedding model, loaded on the first cache miss: Chroma's ONNX all-MiniLM-L6-v2, or the same
+    model through sentence-transformers when chromadb is not installed (numpy backend).
+    """
+    global _embedding_function
+    with _model_lock:
+        if _embedding_function is None:
+            try:
+                from chromadb.utils import embedding_functions
+                _embedding_function = embedding_functions.DefaultEmbeddingFunction()
+            except ImportError:
+                from sentence_transformers import SentenceTransformer
+                model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+                _embedding_function = lambda batch: model.encode(list(batch))
+    return _embedding_function(texts)
+
+
+# Keyword (BM25) index over the same chunks as the vector store, kept in step with it in _sync_source
+keyword_index = BM25Index()
+
+# Every document and query vector goes through the on-disk embedding cache,
+# so a chunk or query seen before (in any process sharing data/) is never embedded twice
+embedding_cache = EmbeddingCache(os.path.join(EMBEDDING_CACHE_DIR, EMBEDDING_MODEL_NAME), _embed_with_model)
+
+# Results of retrieve() for repeated (normalized) questions; its generation is the index generation,
+# bumped whenever the store or keyword index changes (here or, see _catch_up, in another process)
+# so no stale result is served
+retrieval_cache = RetrievalCache()
+
+
+def _sha256(data):
+    return hashlib.sha256(data if isinstance(data, bytes) else data.encode("utf-8")).hexdigest()
+
+
+def _load_manifest():
+    """
+    Manifest of what the vector store holds: {"version", "generation", "sources": {source: {"hash": <source
+    content hash>, "chunks": {chunk_id: <chunk content hash>}}}}. generation counts the changes made to the
+    store, so processes sharing VECTOR_DB_PATH notice each other's. Returns an empty manifest if missing or unreadable.
+    """
+    try:
+        with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if isinstance(manifest.get("sources"), dict):
+            return manifest
+    except FileNotFoundError:
+        pass
+    except (ValueError, OSError) as e:
+        print(f"WARNING: Ignoring unreadable vector index manifest {MANIFEST_PATH}: {e}")
+    return {"version": INDEX_VERSION, "generation": 0, "sources": {}}
+
+
+@contextmanager
+def _index_update():
+    """
+    Held around every manifest read-modify-write: _index_lock in this process, plus an exclusive lock on
+    manifest.lock so app processes sharing VECTOR_DB_PATH do not overwrite each other's manifest updates.
+    """
+    with _index_lock:
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(VECTOR_DB_PATH, exist_ok=True)
+        with open(MANIFEST_PATH + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _save_manifest(manifest):
+    global _index_generation, _manifest_stat
+    # Write-then-rename so a crash never leaves a half-written manifest
+    tmp_path = MANIFEST_PATH + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, MANIFEST_PATH)
+    # This process applied its own changes to the keyword index as it made them
+    _index_generation = manifest.get("generation", 0)
+    stat = os.stat(MANIFEST_PATH)
+    _manifest_stat = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+def _index_changed(manifest):
+    """Records a change to the store: advances the manifest generation and drops cached results."""
+    manifest["generation"] = manifest.get("generation", 0) + 1
+    retrieval_cache.bump()
+
+
+def _catch_up(manifest):
+    """
+    Rebuilds the keyword index from the store and drops cached results unless they already reflect
+    manifest's generation (another process sharing VECTOR_DB_PATH changed the store, or the index was
+    never built). Caller holds _index_lock.
+    """
+    global keyword_index, _index_generation
+    generation = manifest.get("generation", 0)
+    if generation == _index_generation:
+        return
+    # Built aside, so queries keep using the old index meanwhile
+    rebuilt = BM25Index()
+    stored = get_store().get(include_documents=True)
+    for chunk_id, document, metadata in zip(stored["ids"], stored["documents"], stored["metadatas"]):
+        rebuilt.add(chunk_id, document, metadata)
+    with _swap_lock.write():
+        keyword_index = rebuilt
+    retrieval_cache.bump() # Results cached here predate the other process's change
+    _index_generation = generation
+
+
+def _follow_other_processes():
+    """
+    Called before retrieving: catches up with index changes other processes made (see _catch_up).
+    Costs one stat() of the manifest while nothing changed.
+    """
+    global _manifest_stat
+    try:
+        stat = os.stat(MANIFEST_PATH)
+    except OSError:
+        return
+    key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    if key == _manifest_stat:
+        return
+    # An update running in this process catches up itself before changing anything; don't wait for it
+    if not _index_lock.acquire(blocking=False):
+        return
+    try:
+        _catch_up(_load_manifest())
+        _manifest_stat = key
+    finally:
+        _index_lock.release()
+
+
+def _chunk_ids(prefix, chunks, metadata=None):
+    """
+    Content-addressed chunk ids for chunking.chunk_text() output: an unchanged chunk keeps its id (and
+    embedding) however the text around it moves; only its offset metadata is updated. Repeated identical
+    chunks get an occurrence suffix.
+    Returns {chunk_id: (text, content_hash, metadata)}.
+    """
+    seen = {}
+    ids = {}
+    for index, chunk in enumerate(chunks):
+        chunk_hash = _sha256(chunk["text"])
+        occurrence = seen.get(chunk_hash, 0)
+        seen[chunk_hash] = occurrence + 1
+        chunk_id = f"{prefix}_{chunk_hash[:16]}" + (f"_{occurrence}" if occurrence else "")
+        # Character offsets into the decoded source file
+        ids[chunk_id] = (chunk["text"], chunk_hash, {**(metadata or {}), "chunk_index": index,
+                                                       "start_offset": chunk["start"], "end_offset": chunk["end"]})
+    return ids
+
+
+def _syllabus_source(user_id, topics):
+    """Source entry for one user's syllabus: one chunk per topic, tagged with its owner, subject and topic."""
+    documents = {}
+    for topic in topics:
+        text = f"Subject: {topic['subject_name']}, Topic: {topic['name']}."
+        # Topic row ids are unique across users, unlike subject/topic names
+        documents[f"syllabus_{topic['id']}"] = (text, _sha256(text), {
+            "scope": USER_SCOPE, "user_id": user_id,
+            "subject_id": topic["subject_id"], "subject": topic["subject_name"],
+            "topic_id": topic["id"], "topic": topic["name"]})
+    source_hash = _sha256(json.dumps({doc_id: doc[0] for doc_id, doc in documents.items()}, sort_keys=True))
+    return (f"{SYLLABUS_SOURCE_PREFIX}{user_id}", source_hash, lambda: documents)
+
+
+def upload_text_path(file_hash):
+    """Extracted text of an uploaded document (written by document_ingest), shared by every upload of the same file."""
+    return os.path.join(UPLOADS_DIR, f"{file_hash}.txt")
+
+
+def document_chunks(document, text):
+    """Chunks of an uploaded document's text: {chunk_id: (text, hash, metadata)}, visible only to its owner."""
+    return _chunk_ids(f"doc{document['id']}", chunk_text(text), {
+        "scope": USER_SCOPE, "user_id": document["user_id"],
+        "document_id": document["id"], "filename": document["filename"]})
+
+
+def _upload_source(document, chunks=None):
+    """Source entry for one uploaded document; chunks are read from its extracted text unless given."""
+    def load_chunks():
+        if chunks is not None:
+            return chunks
+        with open(upload_text_path(document["file_hash"]), "r", encoding="utf-8") as f:
+            return document_chunks(document, f.read())
+    return (f"{UPLOAD_SOURCE_PREFIX}{document['id']}", document["file_hash"], load_chunks)
+
+
+def _current_sources():
+    """Yields (source, content hash, loader) for everything that should be indexed. loader() -> {chunk_id: (text, hash, metadata)}."""
+    # --- Syllabus topics from SQLite (via data_manager), one source per user ---
+    try:
+        # One indexed join over topics/subjects for every user; no per-subject JSON parsing
+        topics_by_user = {}
+        for topic in get_all_topics():
+            topics_by_user.setdefault(topic["user_id"], []).append(topic)
+        for user_id, topics in topics_by_user.items():
+            yield _syllabus_source(user_id, topics)
+    except Exception as e:
+        print(f"ERROR: Failed to fetch topics from SQLite DB for RAG indexing: {e}")
+
+    # --- Uploaded PDF/DOCX documents, scoped to their owner ---
+    for document in get_documents(statuses=INDEXABLE_DOCUMENT_STATUSES):
+        if os.path.exists(upload_text_path(document["file_hash"])):
+            yield _upload_source(document)
+        else:
+            print(f"WARNING: Extracted text of document {document['id']} ('{document['filename']}') is missing; it is not indexed.")
+
+    # --- Local knowledge base files (e.g., history.txt, physics.txt), shared by every user ---
+    if not os.path.exists(KNOWLEDGE_BASE_DIR):
+        print(f"WARNING: '{KNOWLEDGE_BASE_DIR}' directory not found at {os.path.abspath(KNOWLEDGE_BASE_DIR)}. RAG will be limited to syllabus only.")
+        return
+    for filename in sorted(os.listdir(KNOWLEDGE_BASE_DIR)):
+        if filename.endswith(".txt"):
+            yield _knowledge_file_source(filename)
+
+
+def _knowledge_file_source(filename):
+    """Source entry for one knowledge_base/ .txt file, shared by every user."""
+    with open(os.path.join(KNOWLEDGE_BASE_DIR, filename), "rb") as f:
+        raw = f.read()
+    prefix = f"kb_{filename[:-len('.txt')]}"
+    return (f"{KNOWLEDGE_BASE_DIR}/{filename}", _sha256(raw),
+            lambda: _chunk_ids(prefix, chunk_text(raw.decode("utf-8")), {"scope": SHARED_SCOPE}))
+
+
+def _load_checked_manifest():
     """
-    Initializes the ChromaDB vector database with content from SQLite subjects
-    and local knowledge base files.
-    This function is called once from main.py after app initialization.
+    Loads the manifest, rebuilding it from chunk metadata if it does not match the vector store, and brings
+    the keyword index up to date with it. Every index update starts here, under _index_update().
     """
-    # Only re-initialize if the collection is empty to avoid re-indexing on every Streamlit rerun
-    if collection.count() == 0:
-        print("DEBUG: Initializing/Re-initializing vector database with content...")
-        documents = []
-        ids = []
+    manifest = _load_manifest()
+    _catch_up(manifest)
+    manifest_chunks = sum(len(entry["chunks"]) for entry in manifest["sources"].values())
+    if manifest_chunks == get_store().count():
+        return manifest
+    # Manifest and store disagree (lost manifest, crash, manual edits): rebuild it from chunk
+    # metadata so stored embeddings are reused; every source gets re-diffed
+    print("WARNING: Vector index manifest does not match the vector store. Rebuilding the manifest.")
+    stored = get_store().get()
+    # Unknown layout: re-tag every chunk's metadata
+    manifest = {"version": None, "generation": manifest.get("generation", 0), "sources": {}}
+    untracked_ids = []
+    for chunk_id, metadata in zip(stored["ids"], stored["metadatas"]):
+        if not metadata or "source" not in metadata or "content_hash" not in metadata:
+            untracked_ids.append(chunk_id) # Indexed before the manifest existed
+            continue
+        entry = manifest["sources"].setdefault(metadata["source"], {"hash": None, "chunks": {}})
+        entry["chunks"][chunk_id] = [metadata["content_hash"], None]
+    if untracked_ids:
+        with _swap_lock.write():
+            get_store().delete(untracked_ids)
+            for chunk_id in untracked_ids:
+                keyword_index.remove(chunk_id)
+        _index_changed(manifest)
+    return manifest
+
+
+def _sync_source(manifest, source, source_hash, load_chunks, stats):
+    """Embeds the new or edited chunks of one source and deletes the ones it no longer has."""
+    entry = manifest["sources"].get(source)
+    stale_metadata = manifest.get("version") != INDEX_VERSION
+    if entry and entry["hash"] == source_hash and not stale_metadata:
+        stats["unchanged_sources"] += 1
+        return
 
-        # --- Index Syllabus topics from SQLite (via data_manager) ---
+    chunks = load_chunks()
+    # Manifest entries are [content hash, metadata hash] (a bare content hash in older manifests)
+    old_chunks = {chunk_id: value if isinstance(value, list) else [value, None]
+                  for chunk_id, value in (entry["chunks"] if entry else {}).items()}
+
+    def metadata_for(chunk_id):
+        _, chunk_hash, metadata = chunks[chunk_id]
+        return {**metadata, "source": source, "content_hash": chunk_hash}
+
+    metadata_hashes = {chunk_id: _sha256(json.dumps(metadata_for(chunk_id), sort_keys=True)) for chunk_id in chunks}
+    to_add = [chunk_id for chunk_id, chunk in chunks.items() if old_chunks.get(chunk_id, [None])[0] != chunk[1]]
+    to_delete = [chunk_id for chunk_id in old_chunks if chunk_id not in chunks]
+    # Same text, new metadata (moved offsets, older index layouts): update in place without re-embedding
+    added = set(to_add)
+    to_retag = [chunk_id for chunk_id in chunks if chunk_id not in added
+                and (stale_metadata or old_chunks[chunk_id][1] != metadata_hashes[chunk_id])]
+
+    documents = [chunks[chunk_id][0] for chunk_id in to_add]
+    # Embed before swapping: queries keep running against the old chunks meanwhile
+    embeddings = embedding_cache.embed(documents, [chunks[chunk_id][1] for chunk_id in to_add]) if to_add else None
+    if to_add or to_retag or to_delete:
+        with _swap_lock.write():
+            if to_add:
+                get_store().upsert(to_add, embeddings, documents, [metadata_for(chunk_id) for chunk_id in to_add])
+                for chunk_id, document in zip(to_add, documents):
+                    keyword_index.add(chunk_id, document, metadata_for(chunk_id))
+            if to_retag:
+                get_store().update_metadata(to_retag, [metadata_for(chunk_id) for chunk_id in to_retag])
+                for chunk_id in to_retag:
+                    keyword_index.set_metadata(chunk_id, metadata_for(chunk_id))
+            if to_delete:
+                get_store().delete(to_delete)
+                for chunk_id in to_delete:
+                    keyword_index.remove(chunk_id)
+        _index_changed(manifest)
+    manifest["sources"][source] = {"hash": source_hash, "chunks": {chunk_id: [chunk[1], metadata_hashes[chunk_id]] for chunk_id, chunk in chunks.items()}}
+    stats["added"] += len(to_add)
+    stats["deleted"] += len(to_delete)
+    stats["changed_sources"] += 1
+
+
+def _drop_source(manifest, source, stats):
+    entry = manifest["sources"].pop(source, None)
+    removed_ids = list(entry["chunks"]) if entry else []
+    if removed_ids:
+        with _swap_lock.write():
+            get_store().delete(removed_ids)
+            for chunk_id in removed_ids:
+                keyword_index.remove(chunk_id)
+        _index_changed(manifest)
+    stats["deleted"] += len(removed_ids)
+
+
+def reindex_knowledge_base():
+    """
+    Brings the persistent vector store in line with every user's syllabus and the knowledge_base/ files.
+    Sources whose content hash matches the manifest are skipped without chunking; for changed sources
+    only new or edited chunks are embedded and chunks that disappeared are deleted.
+    Returns {"added", "deleted", "unchanged_sources", "changed_sources"}.
+    """
+    with _index_update():
+        return _sync_all_sources()
+
+
+def _sync_all_sources():
+    """reindex_knowledge_base(), for callers already holding _index_update()."""
+    manifest = _load_checked_manifest()
+    stats = {"added": 0, "deleted": 0, "unchanged_sources": 0, "changed_sources": 0}
+    seen_sources = set()
+    for source, source_hash, load_chunks in _current_sources():
+        seen_sources.add(source)
+        _sync_source(manifest, source, source_hash, load_chunks, stats)
+    for source in [s for s in manifest["sources"] if s not in seen_sources]:
+        _drop_source(manifest, source, stats)
+
+    manifest["version"] = INDEX_VERSION
+    _save_manifest(manifest)
+    print(f"DEBUG: Vector index synced: {stats['added']} chunks embedded, {stats['deleted']} deleted, "
+          f"{stats['unchanged_sources']} sources unchanged ({get_store().count()} chunks total).")
+    return stats
+
+
+def reindex_knowledge_file(filename):
+    """
+    Re-syncs one knowledge_base/ file after it was added, edited or deleted (see kb_watcher): only its new or
+    edited chunks are embedded, and they replace the old ones in one swap.
+    Before the index is first opened in this process this is a no-op; initialize_vector_db() will diff it.
+    """
+    with _index_update():
+        if not _initialized:
+            return None
+        manifest = _load_checked_manifest()
+        stats = {"added": 0, "deleted": 0, "unchanged_sources": 0, "changed_sources": 0}
         try:
-            # get_all_subjects is now called without arguments, it fetches from SQLite
-            subjects_from_db = get_all_subjects()
-            if subjects_from_db:
-                for subject in subjects_from_db:
-                    topics = subject.get("topics", [])
-                    for topic in topics:
-                        # Construct a document string for the RAG
-                        doc_content = f"Subject: {subject['name']}, Topic: {topic}. Due: {subject.get('due_date', 'N/A')}"
-                        documents.append(doc_content)
-                        # Create a unique ID for syllabus topics, sanitizing name and topic for ID
-                        ids.append(f"syllabus_{subject['name'].replace(' ', '_').replace('.', '')}_{topic.replace(' ', '_').replace('.', '')}")
-                print(f"Indexed {len(subjects_from_db)} subjects and their topics from SQLite DB for RAG.")
-            else:
-                print("No subjects found in SQLite DB to index for RAG. Please ensure default syllabus is loaded.")
-        except Exception as e:
-            print(f"ERROR: Failed to fetch subjects from SQLite DB for RAG indexing: {e}")
-            print("Skipping SQLite syllabus indexing for RAG.")
-
-
-        # --- Index local knowledge base files (e.g., history.txt, physics.txt) ---
-        knowledge_base_dir = "knowledge_base"
-        if os.path.exists(knowledge_base_dir):
-            for filename in os.listdir(knowledge_base_dir):
-                if filename.endswith(".txt"):
-                    file_path = os.path.join(knowledge_base_dir, filename)
-                    with open(file_path, "r", encoding="utf-8") as f:
-                        content = f.read().strip()
-                    # Split content into paragraphs for better retrieval chunks
-                    paragraphs = content.split("\n\n")
-                    for p_idx, paragraph in enumerate(paragraphs):
-                        if paragraph.strip(): # Ensure paragraph is not empty
-                            documents.append(paragraph.strip())
-                            ids.append(f"kb_{filename.replace('.txt', '')}_{p_idx}")
-            print(f"Indexed {len([d for d in documents if d.startswith('kb_')])} paragraphs from local knowledge_base TXT files.")
+            source = _knowledge_file_source(filename)
+        except FileNotFoundError:
+            _drop_source(manifest, f"{KNOWLEDGE_BASE_DIR}/{filename}", stats)
         else:
-            print(f"WARNING: 'knowledge_base' directory not found at {os.path.abspath(knowledge_base_dir)}. RAG will be limited to syllabus only.")
+            _sync_source(manifest, *source, stats)
+        _save_manifest(manifest)
+    print(f"DEBUG: Knowledge base file {filename} synced: {stats['added']} chunks embedded, {stats['deleted']} deleted.")
+    return stats
 
-        # Ensure there are documents to upsert to avoid ChromaDB errors
-        if documents:
-            try:
-                collection.upsert(documents=documents, ids=ids)
-                print(f"Vector database initialized/updated with a total of {len(documents)} documents.")
-            except Exception as e:
-                print(f"ERROR: Failed to upsert documents to ChromaDB: {e}")
+
+def reindex_user_syllabus(user_id):
+    """
+    Re-syncs one user's syllabus chunks after their subjects change (registered with data_manager).
+    Before the index is first opened in this process this is a no-op; initialize_vector_db() will diff it.
+    """
+    with _index_update():
+        if not _initialized:
+            return None
+        manifest = _load_checked_manifest()
+        stats = {"added": 0, "deleted": 0, "unchanged_sources": 0, "changed_sources": 0}
+        topics = get_all_topics(user_id)
+        if topics:
+            _sync_source(manifest, *_syllabus_source(user_id, topics), stats)
         else:
-            print("No documents found to upsert to ChromaDB collection. RAG will be empty.")
-    else:
-        print(f"DEBUG: ChromaDB already has {collection.count()} documents. Skipping re-initialization on rerun.")
+            _drop_source(manifest, f"{SYLLABUS_SOURCE_PREFIX}{user_id}", stats)
+        _save_manifest(manifest)
+    print(f"DEBUG: Syllabus vectors synced for user {user_id}: {stats['added']} embedded, {stats['deleted']} deleted.")
+    return stats
+
+
+def index_document(document, chunks):
+    """
+    Adds an uploaded document's chunks (see document_chunks) to the index in one step under the index lock,
+    so a query sees either none or all of them. Embeddings come from the embedding cache where present.
+    Returns None if the document was deleted meanwhile: checked under the lock drop_document takes, so a
+    concurrent remove either runs first and is seen here, or runs after and drops these chunks.
+    """
+    with _index_update():
+        if get_document(document["id"]) is None:
+            print(f"DEBUG: Document {document['id']} was deleted before indexing; skipped.")
+            return None
+        manifest = _load_checked_manifest()
+        stats = {"added": 0, "deleted": 0, "unchanged_sources": 0, "changed_sources": 0}
+        _sync_source(manifest, *_upload_source(document, chunks), stats)
+        _save_manifest(manifest)
+    print(f"DEBUG: Document {document['id']} ('{document['filename']}') indexed: {stats['added']} chunks embedded.")
+    return stats
 
 
-# IMPORTANT: The module-level call to initialize_vector_db() should NOT be here.
-# It is called explicitly from main.py after all app setup.
+def drop_document(document_id):
+    """Removes an uploaded document's chunks from the index."""
+    with _index_update():
+        manifest = _load_checked_manifest()
+        stats = {"added": 0, "deleted": 0, "unchanged_sources": 0, "changed_sources": 0}
+        _drop_source(manifest, f"{UPLOAD_SOURCE_PREFIX}{document_id}", stats)
+        _save_manifest(manifest)
+    return stats
 
 
-def get_relevant_context(query, num_results=3):
+def initialize_vector_db():
     """
-    Retrieves relevant context from the ChromaDB vector store based on the query.
-    Prioritizes detailed knowledge base documents over syllabus entries.
+    Opens the persistent vector index and syncs it incrementally (see reindex_knowledge_base).
+    Runs once per app process (until it succeeds); Streamlit reruns reuse the open store.
     """
-    if collection.count() == 0:
-        return "No relevant context found (knowledge base is empty or failed to initialize)."
+    global _initialized
+    if _initialized:
+        return
+    with _index_update():
+        if _initialized: # Another thread finished it while this one waited
+            return
+        try:
+            # The keyword index lives in memory: the sync first rebuilds it from what the store already holds
+            retrieval_cache.bump()
+            _sync_all_sources()
+            _initialized = True
+        except Exception as e:
+            # Left uninitialized, so the next call retries instead of serving a store that never opened
+            print(f"ERROR: Failed to sync the vector database: {e}")
+
+
+# Keep each user's syllabus vectors current as they add or delete subjects
+register_syllabus_listener(reindex_user_syllabus)
+
+
+def _scope_filter(user_id):
+    """Where filter (Chroma syntax): the shared knowledge base plus (if given) this user's own syllabus."""
+    if user_id is None:
+        return {"scope": SHARED_SCOPE}
+    return {"$or": [{"scope": SHARED_SCOPE}, {"user_id": user_id}]}
+
+
+def _where(user_id, filters=None):
+    """Scope filter ANDed with caller filters (Chroma where syntax; several keys mean all must match)."""
+    where = _scope_filter(user_id)
+    if not filters:
+        return where
+    # Chroma accepts one operator per where dict: split {"a": 1, "b": 2} into an $and of single-key clauses
+    return {"$and": [where] + [{key: value} for key, value in filters.items()]}
+
+
+def _resolve_options(k, mode, num_candidates, rrf_k):
+    mode = mode or RETRIEVAL_MODE
+    if mode not in ("hybrid", "vector", "keyword"):
+        raise ValueError(f"Unknown retrieval mode: {mode}")
+    return mode, max(k, num_candidates or RETRIEVAL_CANDIDATES), RRF_K if rrf_k is None else rrf_k
+
+
+def retrieve(query, k=3, user_id=None, mode=None, num_candidates=None, rrf_k=None):
+    """
+    Ranked chunks for a query from the shared knowledge base and the user's syllabus and uploaded documents.
+    mode: "vector" (embeddings), "keyword" (BM25) or "hybrid" (both, merged with reciprocal-rank fusion:
+    score = sum of 1 / (rrf_k + rank) over the retrievers that returned the chunk). num_candidates hits are
+    taken from each retriever before fusion. Defaults come from EDUMATE_RETRIEVAL_MODE / _CANDIDATES / EDUMATE_RRF_K.
+    Results are cached per normalized query (see retrieval_cache) until the index changes or they expire.
+    Returns [{"id", "document", "metadata", "score"}], best first (shared dicts: do not modify them).
+    """
+    return get_relevant_contexts([query], k, user_id=user_id, mode=mode, num_candidates=num_candidates, rrf_k=rrf_k)[0]
 
-    try:
-        # Perform the query against the ChromaDB collection
-        results = collection.query(query_texts=[query], n_results=num_results)
-
-        if results["documents"] and results["documents"][0]:
-            detailed_docs = []
-            syllabus_docs = []
-            # Extract significant words from the query to filter results
-            query_words = [word for word in query.lower().split() if len(word) > 2]
-
-            for i in range(len(results["documents"][0])):
-                doc = results["documents"][0][i]
-                doc_id = results["ids"][0][i]
-                is_relevant_to_query = False
-
-                if query_words:
-                    # Check if any significant query word is in the document
-                    for entity in query_words:
-                        if entity in doc.lower():
-                            is_relevant_to_query = True
-                            break
-                else: # If query is very short, consider all top docs potentially relevant
-                    is_relevant_to_query = True
-
-                if is_relevant_to_query:
-                    # Distinguish between syllabus and other knowledge base documents based on ID prefix
-                    if doc_id.startswith("syllabus_"):
-                        syllabus_docs.append(doc)
-                    else: # This covers other kb_*.txt files (history.txt, physics.txt etc.)
-                        detailed_docs.append(doc)
-
-            # Prioritize: detailed knowledge base content, then syllabus, then the overall top result
-            if detailed_docs:
-                # Join up to 2-3 detailed docs for richer context
-                return " ".join(detailed_docs[:2])
-            elif syllabus_docs:
-                # Join up to 2-3 syllabus docs if they are the only relevant ones found
-                return " ".join(syllabus_docs[:2])
-            
-            # Fallback: if no prioritized match, return the very first retrieved document as a last resort
-            return results["documents"][0][0]
 
+def get_relevant_contexts(queries, k=3, filters=None, user_id=None, mode=None, num_candidates=None, rrf_k=None):
+    """
+    Batched retrieve(): ranked chunks for each query, so callers (quiz, planner) can pack context themselves.
+    Uncached queries are embedded in one batch and searched with one multi-query vector search.
+    filters: extra where conditions on chunk metadata (e.g. {"subject": "Physics"}), on top of the user scope.
+    Returns one [{"id", "document", "metadata", "score"}] list per query, in order.
+    """
+    mode, num_candidates, rrf_k = _resolve_options(k, mode, num_candidates, rrf_k)
+    initialize_vector_db() # No-op after the first call in this process
+    _follow_other_processes()
+    where = _where(user_id, filters)
+    options = (k, user_id, json.dumps(filters, sort_keys=True) if filters else None, mode, num_candidates, rrf_k)
+    keys = [(normalize_query(query),) + options for query in queries]
+    first_query = {}
+    for key, query in zip(keys, queries):
+        first_query.setdefault(key, query)
+
+    def compute_missing(missing_keys):
+        return _retrieve_many([first_query[key] for key in missing_keys], k, where, mode, num_candidates, rrf_k)
+
+    return [list(hits) for hits in retrieval_cache.get_or_compute_many(keys, compute_missing)]
+
+
+def _retrieve_many(queries, k, where, mode, num_candidates, rrf_k):
+    embeddings = embedding_cache.embed(queries) if mode in ("hybrid", "vector") else None
+    with _swap_lock.read():
+        return _search(queries, embeddings, k, where, mode, num_candidates, rrf_k)
+
+
+def _search(queries, embeddings, k, where, mode, num_candidates, rrf_k):
+    fused = [{} for _ in queries] # per query: chunk id -> fused score
+    found = {} # chunk id -> (document, metadata)
+    if embeddings is not None:
+        results = get_store().query(embeddings, num_candidates, where=where)
+        for scores, ids, documents, metadatas in zip(fused, results["ids"], results["documents"], results["metadatas"]):
+            for rank, (chunk_id, document, metadata) in enumerate(zip(ids, documents, metadatas)):
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (rrf_k + rank + 1)
+                found[chunk_id] = (document, metadata)
+    if mode in ("hybrid", "keyword"):
+        allowed = lambda metadata: metadata_matches(metadata, where)
+        for scores, query in zip(fused, queries):
+            for rank, (chunk_id, _) in enumerate(keyword_index.search(query, num_candidates, allowed=allowed)):
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (rrf_k + rank + 1)
+
+    ranked = [sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k] for scores in fused]
+    missing = list(dict.fromkeys(chunk_id for hits in ranked for chunk_id, _ in hits if chunk_id not in found))
+    if missing: # Keyword-only hits: fetch their text from the store, once for the whole batch
+        stored = get_store().get(ids=missing, include_documents=True)
+        found.update(zip(stored["ids"], zip(stored["documents"], stored["metadatas"])))
+    return [[{"id": chunk_id, "document": found[chunk_id][0], "metadata": found[chunk_id][1], "score": score}
+             for chunk_id, score in hits if chunk_id in found] for hits in ranked]
+
+
+def get_relevant_context(query, num_results=3, user_id=None, mode=None, num_candidates=None, rrf_k=None):
+    """
+    Retrieves relevant context for the query (see retrieve() for mode/num_candidates/rrf_k) as one string.
+    Only the shared knowledge base and the given user's syllabus and uploaded documents are searched.
+    Detailed knowledge base and document chunks are placed before the user's terse syllabus entries.
+    """
+    initialize_vector_db() # No-op after the first call in this process
+    try:
+        if get_store().count() == 0:
+            return "No relevant context found (knowledge base is empty or failed to initialize)."
+        hits = retrieve(query, num_results, user_id, mode, num_candidates, rrf_k)
     except Exception as e:
         print(f"ERROR: Error during context retrieval: {e}")
         return "No relevant context found in the syllabus or knowledge base due to retrieval error."
+    if not hits:
+        return NO_CONTEXT_MESSAGE
+    # Stable sort: fused order within each group
+    hits.sort(key=lambda hit: hit["metadata"].get("source", "").startswith(SYLLABUS_SOURCE_PREFIX))
+    return " ".join(hit["document"] for hit in hits)
+
+
+def get_embedding_cache_stats():
+    """Returns hit/miss/eviction counters and the size of the on-disk embedding cache."""
+    return embedding_cache.stats()
 
-    return "No relevant context found in the syllabus or knowledge base." # Default fallback message
 
+def get_retrieval_cache_stats():
+    """Returns hit/miss/eviction/expiration counters, hit rate and saved latency (ms) of the retrieval result cache."""
+    return retrieval_cache.stats()